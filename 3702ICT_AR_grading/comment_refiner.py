@@ -1,9 +1,17 @@
 
 import json
 import os
+import sys
 from datetime import datetime
 import google.genai as genai
 from google.genai import types
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from rate_limiter import get_rate_limiter
+from token_budget import estimate_parts_tokens, fit_texts
+
+# Token budget for the comments in one batch refinement request; the refined
+# versions have to fit in max_output_tokens=4000 of the response
+REFINE_BATCH_COMMENT_TOKENS = 3000
 
 
 def refine_comment_tone(client: genai.Client, original_comment: str, component_name: str, score: float, course_level: str = "undergraduate"):
@@ -81,6 +89,8 @@ Please respond with ONLY the refined comment text, no additional formatting, exp
             print(f"   ⚠️ Comment too long ({len(original_comment)} chars), truncating for {component_name}")
             original_comment = original_comment[:max_comment_length] + "..."
             
+        get_rate_limiter().acquire(estimate_parts_tokens(prompt))
+            
         response = client.models.generate_content(
             model='gemini-2.0-flash-exp',
             contents=prompt,
@@ -290,11 +300,17 @@ COMMENTS TO REFINE:
 
 """
     
+    # The refined comments come back at about the same length, so together they
+    # must fit in the response; the longest comments are shortened first
+    comment_texts = fit_texts([comment_data['comment'] for comment_data in comments_list], REFINE_BATCH_COMMENT_TOKENS)
+    if comment_texts != [comment_data['comment'] for comment_data in comments_list]:
+        print(f"   ⚠️ Comments exceed {REFINE_BATCH_COMMENT_TOKENS} tokens, shortening the longest ones")
+    
     # Add each comment to the prompt
-    for i, comment_data in enumerate(comments_list, 1):
+    for i, (comment_data, comment_text) in enumerate(zip(comments_list, comment_texts), 1):
         prompt += f"""
 COMMENT {i} - {comment_data['component']} (Score: {comment_data['score']} points):
-"{comment_data['comment']}"
+"{comment_text}"
 
 """
     
@@ -312,57 +328,7 @@ REFINED COMMENT 2:
 Respond with ONLY the refined comments in this format, no additional explanations."""
 
     try:
-        # Handle very long prompts by truncating individual comments if necessary
-        max_total_length = 15000  # Conservative limit for total prompt length
-        if len(prompt) > max_total_length:
-            print(f"   ⚠️ Batch prompt too long ({len(prompt)} chars), truncating comments")
-            # Truncate individual comments proportionally
-            total_comment_length = sum(len(c['comment']) for c in comments_list)
-            max_comment_length = 1500 // len(comments_list)  # Distribute available space
-            
-            for comment_data in comments_list:
-                if len(comment_data['comment']) > max_comment_length:
-                    comment_data['comment'] = comment_data['comment'][:max_comment_length] + "..."
-            
-            # Rebuild prompt with truncated comments
-            prompt = f"""You are {professor_persona}. Your task is to refine multiple assessment comments to sound more natural, human-like, and professorial while preserving ALL technical content and maintaining the same evaluation levels.
-
-COURSE LEVEL: {course_level.title()}
-
-REFINEMENT GUIDELINES:
-{tone_guidance}
-
-ESSENTIAL REQUIREMENTS FOR ALL COMMENTS:
-1. **Mention technical content in a human way** - DO NOT include all specific technical details, examples, or findings. for example, DO NOT mention 'ABCPresentation.pdf', instead, refer to 'the presentation document' or 'the provided PDF'.
-2. **Maintain the same evaluation level** - Don't make comments more positive or negative than originals
-3. **Keep similar length** - Don't significantly shorten or lengthen comments
-4. **Sound like a human professor** - Use natural academic language, not robotic AI phrasing
-5. **Use conversational academic tone** - Replace phrases like "The documentation demonstrates..." with more natural alternatives
-6. **Add subtle personality** - Use varied sentence structures and natural transitions
-7. **Maintain professionalism** - Keep it academic and appropriate for formal assessment
-8. **Keep single paragraph format** - Each of the refined comments should be in the format of one single continuous paragraph without any additional formatting or metadata.
-
-COMMENTS TO REFINE:
-
-"""
-            for i, comment_data in enumerate(comments_list, 1):
-                prompt += f"""
-COMMENT {i} - {comment_data['component']} (Score: {comment_data['score']} points):
-"{comment_data['comment']}"
-
-"""
-            prompt += f"""
-Please respond with exactly {len(comments_list)} refined comments, numbered and separated clearly. Format your response as:
-
-REFINED COMMENT 1:
-[refined version of comment 1]
-
-REFINED COMMENT 2:
-[refined version of comment 2]
-
-[continue for all comments...]
-
-Respond with ONLY the refined comments in this format, no additional explanations."""
+        get_rate_limiter().acquire(estimate_parts_tokens(prompt))
         
         response = client.models.generate_content(
             model='gemini-2.0-flash-exp',
@@ -1,6 +1,5 @@
 import base64
 import os
-import cv2
 import numpy as np
 import google.genai as genai
 from google.genai import types
@@ -8,10 +7,24 @@ import json
 import os
 import shutil # For cleaning up dummy data
 from dotenv import load_dotenv
-import time  # For rate limiting
-import zipfile
 import csv
 from datetime import datetime
+import argparse
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from batch_engine import grade_groups_concurrently, run_in_parallel, write_json_atomic
+from code_extraction import iter_zip_code
+from code_selection import configure_code_selection, select_code_files
+from cohort_batch import DEFAULT_POLL_SECONDS, GeminiBatchEndpoint, get_batch_collector, run_cohort_batch
+from document_ingest import INGEST_VERSION, configure_document_ingest, document_images, ingest_documents, load_document
+from file_uploads import INLINE_LIMIT_BYTES, configure_file_uploads, estimate_document_tokens, get_upload_manager
+from job_ledger import configure_job_ledger, finish_group, group_job, plan_group
+from instrumentation import configure_instrumentation, count, group_timing, print_summary, span
+from rate_limiter import configure_rate_limiter, get_rate_limiter, response_token_count
+from response_cache import configure_response_cache, get_response_cache
+from retry_policy import PENDING_COMMENT, RequeueList, RetryExhaustedError, call_with_retry, run_component
+from token_budget import configure_token_budget, estimate_parts_tokens, pack_request, packing_settings
+from video_frames import IMAGE_FORMATS, SELECTION_MODES, configure_frame_encoding, configure_frame_selection, extract_video_frames, load_cached_frames
 from comment_refiner import refine_all_assessment_comments, batch_refine_existing_results
 from csv_exporter import export_refined_comments_to_csv, export_refined_comments_detailed_csv
 
@@ -31,12 +44,19 @@ MODEL_NAME = "gemini-2.5-flash-preview-05-20"
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 RESULTS_DIR = os.path.join(SCRIPT_DIR, "7009ICT_grading_results")
+CACHE_DIR = os.path.join(SCRIPT_DIR, ".response_cache")
+DOCUMENT_CACHE_DIR = os.path.join(SCRIPT_DIR, ".document_cache")
 
 # --- Helper Functions ---
 
 def extract_code_from_zip(zip_path):
     """
     Extracts code files from a ZIP archive and returns their contents.
+
+    The archive is streamed file by file within per-file and total byte
+    budgets; vendored folders (Library/, Packages/, ThirdParty/, ...) and
+    binary files are skipped, so large Unity projects no longer blow up the
+    request size.
     
     Args:
         zip_path (str): Path to the ZIP file
@@ -44,59 +64,41 @@ def extract_code_from_zip(zip_path):
     Returns:
         str: Combined content of all code files in the ZIP
     """
-    code_content = []
-    code_extensions = ['.cs', '.py', '.js', '.ts', '.cpp', '.c', '.h', '.java', '.kt', '.swift', '.css', '.html']
-    
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            for file_info in zip_ref.infolist():
-                if not file_info.is_dir():
-                    file_ext = os.path.splitext(file_info.filename)[1].lower()
-                    if file_ext in code_extensions:
-                        try:
-                            with zip_ref.open(file_info) as f:
-                                content = f.read().decode('utf-8', errors='ignore')
-                                code_content.append(f"// File: {file_info.filename}\n{content}\n\n")
-                        except Exception as e:
-                            print(f"Error reading {file_info.filename} from ZIP: {e}")
-        
-        if code_content:
-            return "".join(code_content)
-        else:
-            return f"ZIP file contains no readable code files. Archive: {os.path.basename(zip_path)}"
-            
+        with span("zip_read"):
+            code_content = "".join(iter_zip_code(zip_path))
+        count("zip_archive_bytes", os.path.getsize(zip_path))
+        count("zip_code_bytes", len(code_content.encode('utf-8')))
     except Exception as e:
         print(f"Error extracting ZIP file {zip_path}: {e}")
         return f"Error reading ZIP file: {os.path.basename(zip_path)}"
 
+    if code_content:
+        return code_content
+    return f"ZIP file contains no readable code files. Archive: {os.path.basename(zip_path)}"
+
 # --- Helper Functions ---
 
-def check_existing_video_frames(video_frames_dir):
+def check_existing_video_frames(video_frames_dir, video_file, frame_interval_seconds=20):
     """
-    Checks if video frames already exist in the specified directory.
+    Checks if valid video frames already exist in the specified directory.
+    
+    Frames are only reused if their manifest matches the current video file
+    and extraction settings; frames from a replaced video or different
+    settings are treated as missing.
     
     Args:
         video_frames_dir (str): Directory where video frames should be stored
+        video_file (str): Path to the video the frames must come from
+        frame_interval_seconds (int): Interval between frame captures
         
     Returns:
-        list: List of existing frame files if found, empty list otherwise
+        list: List of existing frame files in playback order if valid, empty list otherwise
     """
-    if not os.path.exists(video_frames_dir):
-        return []
-    
-    # Look for image files (frames)
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
-    existing_frames = []
-    
-    for file in os.listdir(video_frames_dir):
-        if any(file.lower().endswith(ext) for ext in image_extensions):
-            full_path = os.path.join(video_frames_dir, file)
-            if os.path.isfile(full_path):
-                existing_frames.append(full_path)
-    
+    existing_frames = load_cached_frames(video_file, video_frames_dir, frame_interval_seconds)
     if existing_frames:
         print(f"Found {len(existing_frames)} existing video frames in {video_frames_dir}")
-        return sorted(existing_frames)  # Sort to ensure consistent order
+        return existing_frames
     
     return []
 
@@ -116,34 +118,16 @@ def extract_frames_from_video(video_path, output_dir, frame_interval_seconds=20)
         print(f"Error: Video file not found at {video_path}")
         return []
 
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    
-    if fps == 0:
+    # Frames are downscaled and encoded in memory; the returned paths carry the
+    # encoded bytes so call_gemini_api does not read them back from disk
+    with span("frame_extraction"):
+        saved_images = extract_video_frames(video_path, output_dir, frame_interval_seconds)
+    if saved_images is None:
         print(f"Error: Could not read video properties for {video_path}. Is it a valid video file?")
         return []
-        
-    frame_interval = int(fps * frame_interval_seconds)
-    frame_count = 0
-    image_count = 0
-    saved_images = []
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        if frame_count % frame_interval == 0:
-            image_filename = os.path.join(output_dir, f"frame_{image_count}.jpg")
-            cv2.imwrite(image_filename, frame)
-            saved_images.append(image_filename)
-            image_count += 1
-        
-        frame_count += 1
 
-    cap.release()
-    print(f"Extracted {image_count} frames from {video_path} to {output_dir}")
+    count("frames_extracted", len(saved_images))
+    print(f"Extracted {len(saved_images)} frames from {video_path} to {output_dir}")
     return saved_images
 
 def extract_or_use_existing_frames(video_file, video_frames_dir, force_extract=False, frame_interval_seconds=20):
@@ -160,7 +144,7 @@ def extract_or_use_existing_frames(video_file, video_frames_dir, force_extract=F
         list: List of frame file paths, empty list if extraction fails
     """
     if not force_extract:
-        existing_frames = check_existing_video_frames(video_frames_dir)
+        existing_frames = check_existing_video_frames(video_frames_dir, video_file, frame_interval_seconds)
         if existing_frames:
             print(f"Found {len(existing_frames)} existing video frames, skipping extraction")
             return existing_frames
@@ -184,66 +168,114 @@ def call_gemini_api(client: genai.Client, prompt: str, files=None):
     print("\n--- Making a Call to the Gemini API ---")
     print(f"Prompt (first 100 chars): {prompt[:100]}...")
     
+    # Identical model + prompt + file contents, packed the same way, are answered from the
+    # on-disk cache. With the cache off (--no-cache) the files are not hashed at all
+    cache = get_response_cache()
+    cache_key = None
+    if cache.enabled:
+        cache_key = cache.make_key(MODEL_NAME, prompt, files,
+                                   config={"packing": packing_settings(), "document_ingest": INGEST_VERSION})
+    response_text = cache.get(cache_key)
+    if response_text is not None:
+        count("cache_hits")
+        print("💾 Using cached API response (no quota used)")
+    
     parts = [types.Part(text=prompt)]
+    # (category, part) pairs, packed into the request token budget below
+    attachments = []
+
+    with span("request_build"):
+        if files and response_text is None:
+            print(f"Sending Files: {files}")
+            for file_path in files:
+                if not os.path.exists(file_path):
+                    print(f"Warning: File not found for API call, skipping: {file_path}")
+                    continue
 
-    if files:
-        print(f"Sending Files: {files}")
-        for file_path in files:
-            if not os.path.exists(file_path):
-                print(f"Warning: File not found for API call, skipping: {file_path}")
-                continue
-
-            file_extension = os.path.splitext(file_path)[1].lower()
+                file_extension = os.path.splitext(file_path)[1].lower()
             
-            # Simple mime type mapping for common files handled by Gemini multimodal models
-            mime_type = None
-            if file_extension in ['.jpg', '.jpeg']:
-                mime_type = 'image/jpeg'
-            elif file_extension == '.png':
-                mime_type = 'image/png'
-            elif file_extension == '.gif':
-                mime_type = 'image/gif'
-            elif file_extension == '.py':
-                mime_type = 'text/x-python'
-            elif file_extension == '.cs':
-                mime_type = 'text/x-csharp'
-            elif file_extension == '.txt':
-                mime_type = 'text/plain'
-            elif file_extension == '.md': # Markdown files
-                mime_type = 'text/markdown'
-            # Add more specific text types as needed
-            # For general documents (PDF, DOCX), extracting text content is often needed
-            # rather than sending the raw binary file as a 'Part' unless the model
-            # explicitly supports those binary types for direct ingestion.
+                # Simple mime type mapping for common files handled by Gemini multimodal models
+                mime_type = None
+                if file_extension in ['.jpg', '.jpeg']:
+                    mime_type = 'image/jpeg'
+                elif file_extension == '.png':
+                    mime_type = 'image/png'
+                elif file_extension == '.gif':
+                    mime_type = 'image/gif'
+                elif file_extension == '.webp':
+                    mime_type = 'image/webp'
+                elif file_extension == '.py':
+                    mime_type = 'text/x-python'
+                elif file_extension == '.cs':
+                    mime_type = 'text/x-csharp'
+                elif file_extension == '.txt':
+                    mime_type = 'text/plain'
+                elif file_extension == '.md': # Markdown files
+                    mime_type = 'text/markdown'
+                # Add more specific text types as needed
+                # For general documents (PDF, DOCX), extracting text content is often needed
+                # rather than sending the raw binary file as a 'Part' unless the model
+                # explicitly supports those binary types for direct ingestion.
             
-            try:
-                if mime_type and 'image' in mime_type:
-                    with open(file_path, 'rb') as f:
-                        parts.append(types.Part(inline_data=types.Blob(data=f.read(), mime_type=mime_type)))
-                elif mime_type and 'text' in mime_type:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        parts.append(types.Part(text=f.read()))
-                elif file_extension == '.zip':
-                    # For zip files, extract and include code content
-                    code_content = extract_code_from_zip(file_path)
-                    parts.append(types.Part(text=code_content))
-                    print(f"Extracted code from ZIP: {os.path.basename(file_path)}")
-                elif file_extension in ['.pdf', '.docx', '.xlsx', '.pptx']:
-                    # For document files, include file info for the API to understand
-                    file_info = f"Document file: {os.path.basename(file_path)} (Type: {file_extension})"
-                    parts.append(types.Part(text=file_info))
-                    print(f"Including document info: {file_info}")
-                else:
-                    # Skip other binary files that can't be processed
-                    print(f"Skipping unsupported file: {file_path} (file type: {file_extension})")
+                try:
+                    # Documents already extracted to text and images (cached by content hash)
+                    document = load_document(file_path)
+
+                    if getattr(file_path, 'data', None) is not None:
+                        # Freshly extracted frame, already encoded in memory
+                        attachments.append(("frame", types.Part(inline_data=types.Blob(data=file_path.data, mime_type=file_path.mime_type))))
+                    elif mime_type and 'image' in mime_type:
+                        with open(file_path, 'rb') as f:
+                            attachments.append(("frame", types.Part(inline_data=types.Blob(data=f.read(), mime_type=mime_type))))
+                    elif mime_type and 'text' in mime_type:
+                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                            category = "document" if file_extension in ['.txt', '.md'] else "code"
+                            attachments.append((category, f.read()))
+                    elif document and document["text"]:
+                        attachments.append(("document", f"=== Document: {os.path.basename(file_path)} ===\n{document['text']}"))
+                        for data, image_mime_type in document_images(document):
+                            attachments.append(("document", types.Part(inline_data=types.Blob(data=data, mime_type=image_mime_type))))
+                        print(f"Including extracted document: {os.path.basename(file_path)} "
+                              f"({len(document['text'])} chars, {len(document['images'])} images)")
+                    elif file_extension == '.zip':
+                        # For zip files, extract and include code content
+                        code_content = extract_code_from_zip(file_path)
+                        attachments.append(("code", code_content))
+                        print(f"Extracted code from ZIP: {os.path.basename(file_path)}")
+                    elif file_extension == '.pdf' and (get_upload_manager().enabled or os.path.getsize(file_path) < INLINE_LIMIT_BYTES):
+                        # The model reads PDFs directly. Large ones are uploaded once through the
+                        # Files API and referenced by URI in every later request
+                        uploaded = get_upload_manager().get_part(client, file_path)
+                        if uploaded:
+                            attachments.append(("document", *uploaded))
+                        else:
+                            with open(file_path, 'rb') as f:
+                                attachments.append(("document", types.Part(inline_data=types.Blob(data=f.read(), mime_type='application/pdf')),
+                                                    estimate_document_tokens(file_path)))
+                        print(f"Including PDF document: {os.path.basename(file_path)}")
+                    elif file_extension in ['.pdf', '.docx', '.xlsx', '.pptx']:
+                        # For document files, include file info for the API to understand
+                        file_info = f"Document file: {os.path.basename(file_path)} (Type: {file_extension})"
+                        attachments.append(("document", file_info))
+                        print(f"Including document info: {file_info}")
+                    else:
+                        # Skip other binary files that can't be processed
+                        print(f"Skipping unsupported file: {file_path} (file type: {file_extension})")
+                        continue
+
+                except RetryExhaustedError:
+                    # A failed upload requeues the component like a failed API call
+                    raise
+                except Exception as e:
+                    print(f"Error processing file {file_path} for API: {e}")
                     continue
 
-            except Exception as e:
-                print(f"Error processing file {file_path} for API: {e}")
-                continue
+            # Size the request before sending it: documents first, then frames, then code
+            packed, _ = pack_request(prompt, attachments)
+            parts.extend(types.Part(text=part) if isinstance(part, str) else part for part in packed)
     
     # Check if we have any content to send
-    if len(parts) == 1:  # Only the prompt, no files were processed
+    if response_text is None and len(parts) == 1:  # Only the prompt, no files were processed
         print("Warning: No files were successfully processed for API call")
         if files:
             # Add a fallback message about the files
@@ -251,65 +283,91 @@ def call_gemini_api(client: genai.Client, prompt: str, files=None):
             fallback_text = f"Note: The following files were submitted but could not be processed directly: {file_list}"
             parts.append(types.Part(text=fallback_text))
     
+    # Cohort batch mode queues the request for the next batch job instead of sending it
+    collector = get_batch_collector()
+    if response_text is None and collector is not None:
+        return collector.defer(cache_key, prompt, parts)
+    
     try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=[types.Content(role="user", parts=parts)]
-        )
-        # Add a small delay to avoid hitting rate limits
-        time.sleep(1)
-        
-        # Assuming the model returns JSON directly as text if response_mime_type is set
-        response_text = response.text
-        if response_text:
-            print(f"Gemini API Raw Response (first 200 chars): {response_text[:200]}...")
+        if response_text is None:
+            # Wait for request/token quota instead of sleeping a fixed time after every call
+            limiter = get_rate_limiter()
+            estimated_tokens = estimate_parts_tokens(parts)
             
-            # Extract JSON from response (handle text before/after JSON)
-            try:
-                # Look for JSON block markers
-                if "```json" in response_text:
-                    # Extract content between ```json and ```
-                    start_idx = response_text.find("```json") + 7
-                    end_idx = response_text.find("```", start_idx)
-                    if end_idx != -1:
-                        response_text = response_text[start_idx:end_idx].strip()
-                    else:
-                        response_text = response_text[start_idx:].strip()
-                elif "{" in response_text and "}" in response_text:
-                    # Try to extract JSON object from text
-                    start_idx = response_text.find("{")
-                    end_idx = response_text.rfind("}") + 1
-                    response_text = response_text[start_idx:end_idx].strip()
-                
-                return json.loads(response_text)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, try to find a JSON array
+            count("request_bytes", sum(len(part.inline_data.data) if part.inline_data else len((part.text or "").encode('utf-8'))
+                                       for part in parts))
+            
+            def send_request():
+                with span("rate_limit_wait"):
+                    limiter.acquire(estimated_tokens)
+                with span("generate_content"):
+                    response = client.models.generate_content(
+                        model=MODEL_NAME,
+                        contents=[types.Content(role="user", parts=parts)]
+                    )
+                limiter.record_usage(estimated_tokens, response_token_count(response))
+                return response
+            
+            # Quota and server errors are retried with backoff; if they persist the
+            # RetryExhaustedError reaches the caller so the component can be requeued
+            with span("api_request"):
+                response = call_with_retry(send_request, description="Gemini API call")
+            
+            # Assuming the model returns JSON directly as text if response_mime_type is set
+            response_text = response.text
+            count("response_bytes", len((response_text or "").encode('utf-8')))
+        with span("response_parse"):
+            if response_text:
+                print(f"Gemini API Raw Response (first 200 chars): {response_text[:200]}...")
+            
+                # Extract JSON from response (handle text before/after JSON)
                 try:
-                    if "[" in response_text and "]" in response_text:
-                        start_idx = response_text.find("[")
-                        end_idx = response_text.rfind("]") + 1
+                    # Look for JSON block markers
+                    if "```json" in response_text:
+                        # Extract content between ```json and ```
+                        start_idx = response_text.find("```json") + 7
+                        end_idx = response_text.find("```", start_idx)
+                        if end_idx != -1:
+                            response_text = response_text[start_idx:end_idx].strip()
+                        else:
+                            response_text = response_text[start_idx:].strip()
+                    elif "{" in response_text and "}" in response_text:
+                        # Try to extract JSON object from text
+                        start_idx = response_text.find("{")
+                        end_idx = response_text.rfind("}") + 1
                         response_text = response_text[start_idx:end_idx].strip()
-                        return json.loads(response_text)
+                
+                    parsed = json.loads(response_text)
+                    cache.put(cache_key, response_text, MODEL_NAME)
+                    return parsed
                 except json.JSONDecodeError:
-                    pass
+                    # If JSON parsing fails, try to find a JSON array
+                    try:
+                        if "[" in response_text and "]" in response_text:
+                            start_idx = response_text.find("[")
+                            end_idx = response_text.rfind("]") + 1
+                            response_text = response_text[start_idx:end_idx].strip()
+                            parsed = json.loads(response_text)
+                            cache.put(cache_key, response_text, MODEL_NAME)
+                            return parsed
+                    except json.JSONDecodeError:
+                        pass
                 
-                # If all parsing fails, return error
-                print(f"Error decoding JSON from Gemini API response")
-                print(f"Response text: {response_text}")
-                return {"score": 0, "comment": f"API returned non-JSON or invalid JSON format"}
-        else:
-            print("Empty response from Gemini API")
-            return {"score": 0, "comment": "Empty response from API"}
+                    # If all parsing fails, return error
+                    print(f"Error decoding JSON from Gemini API response")
+                    print(f"Response text: {response_text}")
+                    return {"score": 0, "comment": f"API returned non-JSON or invalid JSON format"}
+            else:
+                print("Empty response from Gemini API")
+                return {"score": 0, "comment": "Empty response from API"}
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON from Gemini API response: {e}")
         print(f"Response text: {response_text}")
         return {"score": 0, "comment": f"API returned non-JSON or invalid JSON: {e}"}
+    except RetryExhaustedError:
+        raise
     except Exception as e:
         print(f"Error calling Gemini API: {e}")
-        if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-            print("⚠️  API quota exceeded. Waiting before retrying...")
-            time.sleep(30)  # Wait 30 seconds for quota to reset
-            return {"score": 0, "comment": "API quota exceeded - partial grading completed"}
         return {"score": 0, "comment": f"Gemini API call failed: {e}"}
 
 
@@ -422,14 +480,13 @@ def grade_individual_contribution(client: genai.Client, project_files: list, gro
             "evidence_found": ["Response format error - manual review needed"]
         }
 
-def grade_all_components(client: genai.Client, project_files: list, video_score_comment: dict, coding_score_comment: dict, group_name: str):
+def grade_all_components(client: genai.Client, project_files: list, video_score_comment: dict, coding_score_comment: dict, group_name: str,
+                         parallel: bool = False):
     """
     Performs grading of the remaining project components (excluding video and coding which are graded separately).
     Individual Contribution is assessed using a dedicated function for enhanced accuracy.
+    When `parallel` is set, that request is sent at the same time as the main component request.
     """
-    # Grade Individual Contribution using the dedicated function
-    individual_contribution_result = grade_individual_contribution(client, project_files, group_name)
-    
     prompt = f"""
     Assess the student's submission for a Unity AR project based on the provided files and the following assessments that have already been completed separately.
 
@@ -475,7 +532,15 @@ def grade_all_components(client: genai.Client, project_files: list, video_score_
     The output should be a JSON object containing a list of dictionaries, where each dictionary has 'component' (string), 'score' (integer or float), and 'comment' (string). Ensure you assess these 3 remaining components only.
     """
     
-    response_json = call_gemini_api(client, prompt, files=project_files)
+    # Grade Individual Contribution using the dedicated function
+    if parallel:
+        individual_contribution_result, response_json = run_in_parallel(
+            lambda: grade_individual_contribution(client, project_files, group_name),
+            lambda: call_gemini_api(client, prompt, files=project_files)
+        )
+    else:
+        individual_contribution_result = grade_individual_contribution(client, project_files, group_name)
+        response_json = call_gemini_api(client, prompt, files=project_files)
     
     # Ensure the response is a list as expected by the prompt
     if isinstance(response_json, list):
@@ -506,7 +571,8 @@ def grade_all_components(client: genai.Client, project_files: list, video_score_
         ]
 
 
-def grade_single_group(client: genai.Client, group_folder: str, group_name: str):
+def grade_single_group(client: genai.Client, group_folder: str, group_name: str, parallel_requests: bool = False,
+                       requeue: RequeueList = None, previous_results: dict = None):
     """
     Grades a single group and returns the assessment results.
     
@@ -514,10 +580,17 @@ def grade_single_group(client: genai.Client, group_folder: str, group_name: str)
         client: The Gemini API client
         group_folder: Path to the group's organized folder
         group_name: Name of the group (e.g., 'GC1', 'GC2')
+        parallel_requests: Whether to send independent grading requests at the same time
+        requeue: Shared list of components waiting for an API retry
+        previous_results: Saved results of an earlier run; only components queued for retry are graded again
     
     Returns:
         dict: Complete grading results for the group
     """
+    if requeue is None:
+        requeue = RequeueList(RESULTS_DIR)
+    pending_components = []
+
     print(f"\n{'='*60}")
     print(f"GRADING GROUP: {group_name}")
     print(f"Folder: {group_folder}")
@@ -528,83 +601,121 @@ def grade_single_group(client: genai.Client, group_folder: str, group_name: str)
     os.makedirs(video_frames_dir, exist_ok=True)
 
     # 1. Process Video
-    video_folder = os.path.join(group_folder, "videos")
-    video_file = None
-    if os.path.exists(video_folder):
-        video_files = [f for f in os.listdir(video_folder) if f.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.wmv'))]
-        if video_files:
-            video_file = os.path.join(video_folder, video_files[0])
-            print(f"Found video: {video_files[0]}")
-
-    if video_file and os.path.exists(video_file) and os.path.getsize(video_file) > 0:
-        print(f"Processing video: {video_file}")
+    def assess_video():
+        video_folder = os.path.join(group_folder, "videos")
+        video_file = None
+        if os.path.exists(video_folder):
+            video_files = [f for f in os.listdir(video_folder) if f.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.wmv'))]
+            if video_files:
+                video_file = os.path.join(video_folder, video_files[0])
+                print(f"Found video: {video_files[0]}")
+
+        if video_file and os.path.exists(video_file) and os.path.getsize(video_file) > 0:
+            print(f"Processing video: {video_file}")
         
-        # Extract frames or use existing ones
-        video_frames = extract_or_use_existing_frames(video_file, video_frames_dir)
+            # Extract frames or use existing ones
+            video_frames = extract_or_use_existing_frames(video_file, video_frames_dir)
         
-        if video_frames:
-            print(f"Using {len(video_frames)} frames for grading")
-            video_assessment = grade_video_presentation(client, video_frames)
+            if video_frames:
+                print(f"Using {len(video_frames)} frames for grading")
+                video_assessment = grade_video_presentation(client, video_frames)
+            else:
+                print("Failed to extract or find frames from video")
+                video_assessment = {"score": 0, "comment": "Failed to extract or find frames from video file."}
         else:
-            print("Failed to extract or find frames from video")
-            video_assessment = {"score": 0, "comment": "Failed to extract or find frames from video file."}
-    else:
-        print("No valid video file found")
-        video_assessment = {"score": 0, "comment": "No video submitted or video file is empty/invalid."}
+            print("No valid video file found")
+            video_assessment = {"score": 0, "comment": "No video submitted or video file is empty/invalid."}
+        return video_assessment
 
     # 2. Grade Code
-    code_folder = os.path.join(group_folder, "source_code")
-    code_files = []
-    if os.path.exists(code_folder):
-        all_items = os.listdir(code_folder)
-        print(f"Found items in source_code: {all_items}")
+    def assess_code():
+        code_folder = os.path.join(group_folder, "source_code")
+        code_files = []
+        if os.path.exists(code_folder):
+            all_items = os.listdir(code_folder)
+            print(f"Found items in source_code: {all_items}")
         
-        # Recursively find all code files in source_code directory and subdirectories
-        code_extensions = ['.cs', '.py', '.js', '.ts', '.cpp', '.c', '.h', '.java', '.kt', '.swift']
+            # Recursively find all code files in source_code directory and subdirectories
+            code_extensions = ['.cs', '.py', '.js', '.ts', '.cpp', '.c', '.h', '.java', '.kt', '.swift']
         
-        def find_code_files_recursively(directory):
-            """Recursively find all code files in directory and subdirectories."""
-            found_files = []
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_ext = os.path.splitext(file)[1].lower()
-                    # Include code files and zip files
-                    if file_ext in code_extensions or file.endswith('.zip'):
-                        found_files.append(file_path)
-            return found_files
+            def find_code_files_recursively(directory):
+                """Recursively find all code files in directory and subdirectories."""
+                found_files = []
+                for root, dirs, files in os.walk(directory):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        file_ext = os.path.splitext(file)[1].lower()
+                        # Include code files and zip files
+                        if file_ext in code_extensions or file.endswith('.zip'):
+                            found_files.append(file_path)
+                return found_files
         
-        code_files = find_code_files_recursively(code_folder)
-        print(f"Code files to analyze: {[os.path.relpath(f, code_folder) for f in code_files]}")
+            code_files = find_code_files_recursively(code_folder)
+            # Drop duplicate copies and SDK sources, then keep the most relevant files within the token budget
+            code_files = select_code_files(code_files, base_dir=code_folder)
+            print(f"Code files to analyze: {[os.path.relpath(f, code_folder) for f in code_files]}")
     
-    if code_files:
-        coding_assessment = grade_coding_quality(client, code_files)
+        if code_files:
+            coding_assessment = grade_coding_quality(client, code_files)
+        else:
+            print("No code files found")
+            coding_assessment = {"score": 0, "comment": "No code submitted."}
+        return coding_assessment
+
+    # Components whose API calls keep failing are queued for the next run
+    # instead of being saved as a real zero score
+    def grade_component(component, assess_fn, placeholder):
+        result, pending = run_component(requeue, group_name, component, assess_fn, placeholder, previous_results)
+        if pending:
+            pending_components.append(component)
+        return result
+
+    pending_assessment = {"score": 0, "comment": PENDING_COMMENT}
+
+    # Video and coding assessments are independent of each other; only the
+    # document assessment below needs both results
+    if parallel_requests:
+        print("Sending video and coding requests in parallel...")
+        video_assessment, coding_assessment = run_in_parallel(
+            lambda: grade_component("video_assessment", assess_video, pending_assessment),
+            lambda: grade_component("coding_assessment", assess_code, pending_assessment)
+        )
     else:
-        print("No code files found")
-        coding_assessment = {"score": 0, "comment": "No code submitted."}
+        video_assessment = grade_component("video_assessment", assess_video, pending_assessment)
+        coding_assessment = grade_component("coding_assessment", assess_code, pending_assessment)
 
     # 3. Grade All Other Components
-    document_folder = os.path.join(group_folder, "documents")
-    
-    other_files = []
-    if os.path.exists(document_folder):
-        doc_files = [os.path.join(document_folder, f) for f in os.listdir(document_folder) 
-                    if os.path.isfile(os.path.join(document_folder, f))]
-        other_files.extend(doc_files)
-        print(f"Document files found (including converted presentations): {[os.path.basename(f) for f in doc_files]}")
-
-    # Call the comprehensive grading function
-    if other_files:
-        final_grades = grade_all_components(client, other_files, video_assessment, coding_assessment, group_name)
-    else:
+    def assess_documents():
+        document_folder = os.path.join(group_folder, "documents")
+    
+        other_files = []
+        if os.path.exists(document_folder):
+            doc_files = [os.path.join(document_folder, f) for f in os.listdir(document_folder) 
+                        if os.path.isfile(os.path.join(document_folder, f))]
+            other_files.extend(doc_files)
+            print(f"Document files found (including converted presentations): {[os.path.basename(f) for f in doc_files]}")
+            # Extract the documents' text on all cores before the requests that use it
+            ingest_documents(doc_files)
+
+        # Call the comprehensive grading function
+        if other_files:
+            return grade_all_components(client, other_files, video_assessment, coding_assessment, group_name,
+                                        parallel=parallel_requests)
         print("No documents found")
-        final_grades = [
+        return [
             {"component": "Project Description, Design & Development Process", "score": 0, "comment": "No documents submitted."},
             {"component": "Individual Contribution", "score": 0, "comment": "No documents submitted."},
             {"component": "Testing & Validation", "score": 0, "comment": "No documents submitted."},
             {"component": "Supporting Asset Management", "score": 0, "comment": "No documents submitted."}
         ]
 
+    pending_documents = [
+        {"component": name, "score": 0, "comment": PENDING_COMMENT}
+        for name in ["Project Description, Design & Development Process", "Individual Contribution",
+                     "Testing & Validation", "Supporting Asset Management"]
+    ]
+    final_grades = grade_component("component_assessments", assess_documents, pending_documents)
+
     # Compile results
     total_score = 0
     
@@ -616,10 +727,13 @@ def grade_single_group(client: genai.Client, group_folder: str, group_name: str)
     display_components = []
     if isinstance(final_grades, list):
         for item in final_grades:
-            component_name = item.get('component', 'Unknown')[:46]
-            score = str(item.get('score', 'N/A'))[:5]
-            comment = item.get('comment', '')[:75]
-            print(f"| {component_name:<46} | {score:<5} | {comment:<75} |")
+            component_name = item.get('component', 'Unknown')
+            score = item.get('score', 0)  # Keep as numeric for calculation
+            comment = item.get('comment', '')
+            # Truncate only for display formatting, not for JSON storage
+            display_component_name = component_name[:46]
+            display_comment = comment[:75]
+            print(f"| {display_component_name:<46} | {str(score):<5} | {display_comment:<75} |")
             # Store full untruncated data in JSON
             display_components.append({"component": component_name, "score": score, "comment": comment})
             total_score += score
@@ -635,7 +749,7 @@ def grade_single_group(client: genai.Client, group_folder: str, group_name: str)
     # Keep video frames for future use (no cleanup)
     print(f"Video frames preserved in: {video_frames_dir}")
 
-    return {
+    results = {
         "group_name": group_name,
         "total_score": total_score,
         "video_assessment": video_assessment,
@@ -643,6 +757,10 @@ def grade_single_group(client: genai.Client, group_folder: str, group_name: str)
         "component_assessments": display_components,
         "timestamp": json.dumps({"graded_at": str(os.path.getctime(group_folder))})
     }
+    if pending_components:
+        results["pending_components"] = pending_components
+        print(f"⚠️  {group_name} has components queued for retry: {pending_components}")
+    return results
 
 
 def save_grading_results(group_name: str, results: dict):
@@ -653,8 +771,11 @@ def save_grading_results(group_name: str, results: dict):
     
     results_file = os.path.join(RESULTS_DIR, f"{group_name}_grading_results.json")
     
-    with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    # Write via a temp file + rename so concurrent batch workers never leave a partial file
+    with span("save_results"):
+        write_json_atomic(results_file, results)
+    count("results_bytes", os.path.getsize(results_file))
+    finish_group(group_name, results)
     
     print(f"Results saved to: {results_file}")
     return results_file
@@ -687,6 +808,8 @@ def display_grading_results(results: dict):
         print(f"| {component:<46} | {score:<5} | {comment:<75} |")
 
     print(f"\nTotal Score: {total_score}/100")
+    if results.get("pending_components"):
+        print(f"⚠️  Partial score - queued for retry on the next run: {results['pending_components']}")
 
 
 def generate_csv_report():
@@ -879,12 +1002,32 @@ def get_available_groups():
     return sorted(groups)
 
 
-def check_existing_results(group_name: str):
+def load_existing_results(group_name: str):
     """
-    Checks if grading results already exist for a group.
+    Loads previously saved grading results for a group.
+    
+    Returns:
+        dict or None: The saved results, or None if missing or unreadable
+    """
+    results_file = os.path.join(RESULTS_DIR, f"{group_name}_grading_results.json")
+    try:
+        with open(results_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️  Could not load existing results for {group_name}: {e}")
+        return None
+
+
+def plan_group_resume(group_name: str, requeue: RequeueList):
+    """
+    Decides from the job ledger and the saved results whether a group is skipped,
+    resumed (only unfinished components are graded) or graded from scratch.
+    
+    Returns:
+        tuple: (action, previous_results, redo) as returned by job_ledger.plan_group
     """
     results_file = os.path.join(RESULTS_DIR, f"{group_name}_grading_results.json")
-    return os.path.exists(results_file)
+    return plan_group(group_name, results_file, requeue.components_for(group_name))
 
 
 def choose_grading_mode():
@@ -931,10 +1074,110 @@ def choose_grading_mode():
             print("Invalid choice. Please enter 1, 2, 3, 4, 5, 6, or 7.")
 
 
+def parse_args(argv=None):
+    """
+    Parses command-line options for the grading session.
+    
+    Returns:
+        argparse.Namespace: Parsed options
+    """
+    parser = argparse.ArgumentParser(description="AR project grading system")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of groups graded concurrently in batch mode (default: 1)")
+    parser.add_argument("--parallel-requests", action="store_true",
+                        help="Send each group's independent grading requests at the same time")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="API requests per minute allowed by your quota (default: $GEMINI_RPM or 10)")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="API input tokens per minute allowed by your quota (default: $GEMINI_TPM or 250000)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the API instead of reusing cached responses for unchanged submissions")
+    parser.add_argument("--frame-selection", choices=SELECTION_MODES, default="interval",
+                        help="How video frames are picked: fixed 20s interval, or only frames where the scene changes")
+    parser.add_argument("--frame-budget", type=int, default=None,
+                        help="Maximum frames per video in scene selection mode (default: 12)")
+    parser.add_argument("--max-frame-edge", type=int, default=None,
+                        help="Downscale video frames so their longest side is at most this many pixels (default: 1280, 0 = keep source size)")
+    parser.add_argument("--frame-quality", type=int, default=None,
+                        help="Encoder quality 1-100 for video frames (default: 85 for JPEG, 80 for WebP)")
+    parser.add_argument("--frame-format", choices=list(IMAGE_FORMATS), default=None,
+                        help="Image format for video frames (default: jpeg)")
+    parser.add_argument("--code-token-budget", type=int, default=None,
+                        help="Estimated tokens of code sent for the coding assessment (default: 80000, 0 = no limit)")
+    parser.add_argument("--max-request-tokens", type=int, default=None,
+                        help="Token budget per API request; attachments beyond it are trimmed "
+                             "(default: $GEMINI_MAX_REQUEST_TOKENS or 200000, 0 = model context limit)")
+    parser.add_argument("--no-file-uploads", action="store_true",
+                        help="Send large PDFs inline with every request instead of uploading them once through the Files API")
+    parser.add_argument("--document-workers", type=int, default=None,
+                        help="Processes used to extract document text (default: number of CPU cores)")
+    parser.add_argument("--cohort-batch", action="store_true",
+                        help="Grade all groups through asynchronous Batch API jobs (slower turnaround, cheaper)")
+    parser.add_argument("--batch-endpoint", choices=["gemini", "local"], default="gemini",
+                        help="Where cohort batch jobs run: the Gemini Batch API, or an offline stand-in for testing")
+    parser.add_argument("--batch-poll-seconds", type=float, default=None,
+                        help="Seconds between batch job status checks (default: 30)")
+    parser.add_argument("--no-timings", action="store_true",
+                        help="Do not record per-stage timings (timings/ in the results folder)")
+    return parser.parse_args(argv)
+
+
+def grade_cohort_in_batches(client: genai.Client, available_groups: list, requeue: RequeueList, endpoint_name: str = "gemini",
+                            poll_seconds: float = None):
+    """
+    Grades every group that has no results yet (or has components queued for retry)
+    through asynchronous Batch API jobs instead of one API call at a time.
+    
+    Args:
+        client: The Gemini API client
+        available_groups: (group_name, group_folder) tuples
+        requeue: Shared list of components waiting for an API retry
+        endpoint_name: 'gemini' for the Batch API, 'local' for the offline stand-in
+        poll_seconds: Seconds between batch job status checks
+    """
+    groups_to_grade = []
+    previous_results = {}
+    for group_name, group_folder in available_groups:
+        action, previous, redo = plan_group_resume(group_name, requeue)
+        if action == "skip":
+            print(f"Cohort batch: Skipping {group_name} (results exist)")
+            continue
+        if action == "resume":
+            print(f"Cohort batch: Resuming {group_name}" + (f", grading again: {redo}" if redo else ""))
+            previous_results[group_name] = previous
+        groups_to_grade.append((group_name, group_folder))
+    
+    if not groups_to_grade:
+        print("All groups already have results.")
+        return
+    
+    if endpoint_name == "local":
+        # The offline endpoint lives with the other API stand-ins
+        from mock_gemini import LocalBatchEndpoint
+        endpoint = LocalBatchEndpoint()
+    else:
+        endpoint = GeminiBatchEndpoint(client, poll_seconds or DEFAULT_POLL_SECONDS)
+    
+    saved = run_cohort_batch(
+        groups_to_grade,
+        lambda name, folder: grade_single_group(client, folder, name, False, requeue, previous_results.get(name)),
+        save_grading_results,
+        endpoint,
+        MODEL_NAME,
+        RESULTS_DIR
+    )
+    
+    for group_name, results_file in saved.items():
+        if results_file:
+            display_grading_results(load_existing_results(group_name))
+
+
 def main():
     """
     Main function to orchestrate the grading process for all groups.
     """
+    args = parse_args()
+    
     print("=== AR PROJECT GRADING SYSTEM ===")
     print("Initializing...")
     
@@ -948,6 +1191,32 @@ def main():
     client = genai.Client(api_key=api_key)
     print("✓ Gemini API client initialized")
     
+    limiter = configure_rate_limiter(args.rpm, args.tpm)
+    print(f"✓ Rate limiter: {limiter.requests_per_minute:g} requests/min, {limiter.tokens_per_minute:g} tokens/min")
+    
+    # Cohort batch mode hands batch results back to the graders through the cache
+    cache = configure_response_cache(CACHE_DIR, enabled=not args.no_cache or args.cohort_batch)
+    print(f"✓ Response cache: {cache.cache_dir if cache.enabled else 'disabled (--no-cache)'}")
+    
+    configure_frame_selection(args.frame_selection, args.frame_budget)
+    configure_frame_encoding(args.max_frame_edge, args.frame_quality, args.frame_format)
+    configure_code_selection(args.code_token_budget)
+    configure_token_budget(args.max_request_tokens)
+    configure_file_uploads(enabled=not args.no_file_uploads)
+    configure_document_ingest(DOCUMENT_CACHE_DIR, args.document_workers)
+    configure_instrumentation(enabled=not args.no_timings, output_dir=RESULTS_DIR)
+    
+    # Components that failed after every API retry in an earlier run
+    requeue = RequeueList(RESULTS_DIR)
+    if len(requeue):
+        print(f"🔁 {len(requeue)} components queued for retry from earlier runs (groups: {requeue.groups()})")
+    
+    # Group and component status of earlier runs, so an interrupted run resumes where it stopped
+    ledger = configure_job_ledger(RESULTS_DIR)
+    print(f"✓ Job ledger: {ledger.path}")
+    if ledger.counts():
+        print("   Groups: " + ", ".join(f"{number} {status}" for status, number in sorted(ledger.counts().items())))
+    
     # Get available groups
     available_groups = get_available_groups()
     if not available_groups:
@@ -958,6 +1227,16 @@ def main():
     
     print(f"Found {len(available_groups)} groups: {[g[0] for g in available_groups]}")
     
+    if args.cohort_batch:
+        grade_cohort_in_batches(client, available_groups, requeue, args.batch_endpoint, args.batch_poll_seconds)
+        get_upload_manager().cleanup(client)
+        print_summary()
+        print(f"\n{'='*80}")
+        print("GRADING SESSION COMPLETE")
+        print(f"Results saved in: {RESULTS_DIR}/")
+        print(f"{'='*80}")
+        return
+    
     # Choose grading mode
     grading_mode = choose_grading_mode()
     if grading_mode == 'quit':
@@ -1026,13 +1305,62 @@ def main():
             print(f"❌ Failed to refine comments: {e}")
         return
     
+    # Batch mode with several workers grades groups concurrently
+    if grading_mode == 'batch' and args.workers > 1:
+        groups_to_grade = []
+        previous_results = {}
+        for group_name, group_folder in available_groups:
+            action, previous, redo = plan_group_resume(group_name, requeue)
+            if action == "skip":
+                print(f"Batch mode: Skipping {group_name} (results exist)")
+                continue
+            if action == "resume":
+                print(f"Batch mode: Resuming {group_name}" + (f", grading again: {redo}" if redo else ""))
+                previous_results[group_name] = previous
+            groups_to_grade.append((group_name, group_folder))
+        
+        try:
+            outcomes = grade_groups_concurrently(
+                groups_to_grade,
+                lambda name, folder: grade_single_group(client, folder, name, args.parallel_requests,
+                                                        requeue, previous_results.get(name)),
+                save_grading_results,
+                workers=args.workers
+            )
+        except KeyboardInterrupt:
+            print("Grading session ended by user.")
+            outcomes = []
+        
+        # Display reports in group order once every worker has finished
+        for group_name, results, error in outcomes:
+            if results is not None:
+                display_grading_results(results)
+        
+        failed = [group_name for group_name, results, error in outcomes if error is not None]
+        if failed:
+            print(f"\n⚠️  {len(failed)} groups failed and can be re-graded later: {failed}")
+        
+        get_upload_manager().cleanup(client)
+        print_summary()
+        print(f"\n{'='*80}")
+        print("GRADING SESSION COMPLETE")
+        print(f"Results saved in: {RESULTS_DIR}/")
+        print(f"{'='*80}")
+        return
+    
     # Process each group
     for group_name, group_folder in available_groups:
         print(f"\n{'='*80}")
         print(f"Processing Group: {group_name}")
         
         # Check if results already exist
-        if check_existing_results(group_name):
+        previous_results = None
+        action, previous, redo = plan_group_resume(group_name, requeue)
+        if action == "resume":
+            # Only unfinished components and those queued for retry are graded again
+            print(f"🔁 Resuming {group_name}" + (f", grading again: {redo}" if redo else ""))
+            previous_results = previous
+        elif action == "skip":
             print(f"⚠️  Results file already exists for {group_name}")
             if grading_mode == 'batch':
                 print(f"Batch mode: Skipping {group_name} (results exist)")
@@ -1048,14 +1376,17 @@ def main():
         
         try:
             # Grade the group
-            results = grade_single_group(client, group_folder, group_name)
+            # Time the group's stages, including the save
+            with group_timing(group_name), group_job(group_name):
+                results = grade_single_group(client, group_folder, group_name, args.parallel_requests,
+                                             requeue, previous_results)
+                
+                # Save results
+                results_file = save_grading_results(group_name, results)
             
             # Display results
             display_grading_results(results)
             
-            # Save results
-            results_file = save_grading_results(group_name, results)
-            
             print(f"\n✓ Successfully graded {group_name}")
             
             # Handle continuation based on mode
@@ -1079,6 +1410,8 @@ def main():
             else:  # batch mode
                 print(f"Batch mode: Continuing despite error...")
     
+    get_upload_manager().cleanup(client)
+    print_summary()
     print(f"\n{'='*80}")
     print("GRADING SESSION COMPLETE")
     print(f"Results saved in: {RESULTS_DIR}/")
@@ -1517,6 +1850,8 @@ FINAL VALIDATION CHECKLIST:
 
         print(f"   🤖 Sending collective normalization request to AI...")
         
+        get_rate_limiter().acquire(estimate_parts_tokens(prompt))
+        
         response = client.models.generate_content(
             model='gemini-2.0-flash-exp',
             contents=prompt,
@@ -10,18 +10,25 @@ import csv
 import time
 import base64
 import cv2
-import zipfile
+import sys
 import google.genai as genai
 from google.genai import types
 from dotenv import load_dotenv
 from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from code_extraction import iter_zip_code
+from rate_limiter import configure_rate_limiter, response_token_count
+from results_log import ResultsLog, compact_results_log, recover_results_logs
+from token_budget import estimate_parts_tokens, pack_request
+from video_frames import encode_frame
 
 # Load environment variables
 load_dotenv()
 
 class SimpleGrader:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    def __init__(self, client=None):
+        # A client can be passed in, e.g. the offline mock used for benchmarking
+        self.client = client or genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
         self.model_name = "gemini-2.5-flash-preview-05-20"
         self.course_config = {}
         self.results = []
@@ -31,6 +38,14 @@ class SimpleGrader:
         self.use_short_prompts = False  # Default to full prompts
         self.api_delay = 5  # Default API delay in seconds
         self.use_short_prompts = False  # Use full prompts by default
+        self.rate_limiter = None
+        self.results_log = None
+        self.set_api_delay(self.api_delay)
+        
+    def set_api_delay(self, delay):
+        """Set the average spacing between API calls and rebuild the rate limiter to match."""
+        self.api_delay = delay
+        self.rate_limiter = configure_rate_limiter(requests_per_minute=60.0 / delay)
         
     def show_menu(self):
         """Display main menu and handle user choices."""
@@ -423,7 +438,7 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
 }"""
     
     def extract_video_frames(self, video_path, max_frames=3):
-        """Extract frames from video file."""
+        """Extract frames from video file as downscaled JPEG bytes, encoded in memory."""
         try:
             cap = cv2.VideoCapture(video_path)
             frames = []
@@ -439,10 +454,8 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
                 cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
                 ret, frame = cap.read()
                 if ret:
-                    # Save frame temporarily
-                    temp_path = f"temp_frame_{i}.jpg"
-                    cv2.imwrite(temp_path, frame)
-                    frames.append(temp_path)
+                    data, _, _ = encode_frame(frame, image_format="jpeg")
+                    frames.append(data)
             
             cap.release()
             return frames
@@ -460,24 +473,15 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
             return None
     
     def extract_zip_content(self, zip_path):
-        """Extract text content from ZIP files."""
-        content = []
+        """Extract text content from ZIP files, streamed within size caps and skipping vendored folders."""
         try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                for file_info in zip_ref.infolist():
-                    if not file_info.is_dir():
-                        file_ext = os.path.splitext(file_info.filename)[1].lower()
-                        if file_ext in ['.txt', '.cs', '.py', '.js', '.cpp', '.h']:
-                            try:
-                                with zip_ref.open(file_info) as f:
-                                    text = f.read().decode('utf-8', errors='ignore')
-                                    content.append(f"=== {file_info.filename} ===\n{text}\n")
-                            except:
-                                pass
+            content = "".join(iter_zip_code(zip_path, code_extensions=('.txt', '.cs', '.py', '.js', '.cpp', '.h'),
+                                            header_format="=== {name} ===\n"))
         except Exception as e:
             print(f"Error extracting ZIP {zip_path}: {e}")
+            content = ""
         
-        return "\n".join(content) if content else "No readable content in ZIP file"
+        return content if content else "No readable content in ZIP file"
     
     def call_gemini_api(self, prompt, files):
         """Call Gemini API with files."""
@@ -486,7 +490,8 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
         
         for attempt in range(max_retries):
             try:
-                content = [prompt]
+                # (category, part) pairs, packed into the request token budget below
+                attachments = []
                 
                 # Process files
                 for file_path in files:
@@ -499,51 +504,47 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
                         # Image file
                         encoded = self.encode_image_to_base64(file_path)
                         if encoded:
-                            content.append({
+                            attachments.append(("frame", {
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
                                     "media_type": "image/jpeg",
                                     "data": encoded
                                 }
-                            })
+                            }))
                     elif file_ext == '.zip':
                         # ZIP file
                         zip_content = self.extract_zip_content(file_path)
-                        content.append(f"\n=== ZIP Content: {os.path.basename(file_path)} ===\n{zip_content}")
+                        attachments.append(("code", f"\n=== ZIP Content: {os.path.basename(file_path)} ===\n{zip_content}"))
                     elif file_ext in ['.mp4', '.avi', '.mov']:
                         # Video file - extract frames
                         frames = self.extract_video_frames(file_path)
                         for frame in frames:
-                            encoded = self.encode_image_to_base64(frame)
-                            if encoded:
-                                content.append({
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/jpeg",
-                                        "data": encoded
-                                    }
-                                })
-                            # Clean up temp frame
-                            try:
-                                os.remove(frame)
-                            except:
-                                pass
+                            attachments.append(("frame", {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/jpeg",
+                                    "data": base64.b64encode(frame).decode('utf-8')
+                                }
+                            }))
                     else:
-                        # Text file - limit size to avoid quota issues
+                        # Text file - sized against the request budget below instead of a fixed cut
                         try:
                             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                                 text = f.read()
-                                # Limit text size to 50KB to avoid quota issues
-                                if len(text) > 50000:
-                                    text = text[:50000] + "\n... [Content truncated to avoid quota limits] ..."
-                                content.append(f"\n=== File: {os.path.basename(file_path)} ===\n{text}")
+                                category = "code" if file_ext in ['.cs', '.py', '.js', '.cpp', '.h', '.java', '.kt', '.swift'] else "document"
+                                attachments.append((category, f"\n=== File: {os.path.basename(file_path)} ===\n{text}"))
                         except Exception as e:
                             print(f"Error reading {file_path}: {e}")
                 
-                # Add rate limiting before API call
-                time.sleep(3)  # 3 second delay between calls
+                # Documents first, then frames, then code, trimmed to fit the token budget
+                packed, _ = pack_request(prompt, attachments)
+                content = [prompt] + packed
+                
+                # Wait only as long as the request/token quota requires
+                estimated_tokens = estimate_parts_tokens(content)
+                self.rate_limiter.acquire(estimated_tokens)
                 
                 # Call API
                 response = self.client.models.generate_content(
@@ -555,6 +556,7 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
                         max_output_tokens=4096  # Reduced to save quota
                     )
                 )
+                self.rate_limiter.record_usage(estimated_tokens, response_token_count(response))
                 
                 return response.text
                 
@@ -864,7 +866,7 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
             print(f"   ... and {len(files_to_process) - 5} more")
         
         print(f"\n📄 Results will be saved in real-time to:")
-        print(f"   • JSON: {self.results_folder}/grading_results_{self.timestamp}.json")
+        print(f"   • JSON log: {self.results_folder}/grading_results_{self.timestamp}.jsonl (JSON at the end of the run)")
         print(f"   • CSV: {self.results_folder}/grading_report_{self.timestamp}.csv")
         print(f"💡 Open these files in another window to monitor progress!")
         
@@ -1086,8 +1088,8 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
     def configure_delay_settings(self):
         """Configure API delay settings."""
         print(f"\n⏱️ DELAY SETTINGS:")
-        print("Current delay between API calls: 5 seconds")
-        print("1. Keep current (5 seconds)")
+        print(f"Current average delay between API calls: {self.api_delay:g} seconds")
+        print("1. Default (5 seconds)")
         print("2. Longer delay (10 seconds) - safer for quota")
         print("3. Shorter delay (3 seconds) - faster but riskier")
         print("4. Custom delay")
@@ -1095,19 +1097,19 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
         while True:
             choice = input("Select delay option (1-4): ").strip()
             if choice == "1":
-                self.api_delay = 5
+                self.set_api_delay(5)
                 break
             elif choice == "2":
-                self.api_delay = 10
+                self.set_api_delay(10)
                 break
             elif choice == "3":
-                self.api_delay = 3
+                self.set_api_delay(3)
                 break
             elif choice == "4":
                 try:
                     custom_delay = float(input("Enter delay in seconds (1-60): "))
                     if 1 <= custom_delay <= 60:
-                        self.api_delay = custom_delay
+                        self.set_api_delay(custom_delay)
                         break
                     else:
                         print("❌ Delay must be between 1 and 60 seconds.")
@@ -1231,11 +1233,6 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
                     'raw_response': 'Failed to process file'
                 }
                 self.update_realtime_results(dummy_result, "error")
-            
-            # Use configured delay (only in automatic mode or if not last item)
-            if mode == "automatic" and i < len(files_to_process):
-                print(f"   ⏳ Waiting {self.api_delay} seconds to avoid rate limits...")
-                time.sleep(self.api_delay)
         
         # Restore original prompt
         self.course_config['prompt'] = original_prompt
@@ -1294,10 +1291,8 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
                         retry_choice = input("   Select option (1-3): ").strip()
                         
                         if retry_choice == "1":
-                            old_delay = self.api_delay
-                            self.api_delay = min(self.api_delay * 2, 30)  # Max 30 seconds
+                            self.set_api_delay(min(self.api_delay * 2, 30))  # Max 30 seconds
                             print(f"   ⏱️ Increased delay to {self.api_delay} seconds for retry")
-                            time.sleep(self.api_delay)
                             attempt += 1
                             continue
                         elif retry_choice == "2":
@@ -1421,7 +1416,9 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
             self.course_config['prompt'] = self.get_shorter_prompt()
             print("📝 Using shorter prompt to reduce token usage...")
         
-        delay = 10 if use_different_delay else 5
+        original_delay = self.api_delay
+        if use_different_delay:
+            self.set_api_delay(10)
         
         for i, assignment in enumerate(assignments_to_rerun, 1):
             print(f"\n🔄 [{i}/{len(assignments_to_rerun)}] Rerunning: {assignment['assignment_name'][:60]}...")
@@ -1447,14 +1444,12 @@ IMPORTANT: You must respond with ONLY a valid JSON object in this exact format.
                 }
                 self.update_realtime_results(dummy_result, "rerun_failed")
                 print(f"   ❌ Still failed")
-            
-            if i < len(assignments_to_rerun):
-                print(f"   ⏳ Waiting {delay} seconds...")
-                time.sleep(delay)
         
-        # Restore original prompt
+        # Restore original settings
         if use_shorter_prompt:
             self.course_config['prompt'] = original_prompt
+        if use_different_delay:
+            self.set_api_delay(original_delay)
         
         print(f"\n✅ Rerun completed!")
 
@@ -1523,36 +1518,31 @@ IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
         self.results_folder = f"{self.course_config['course']}_grading_results"
         os.makedirs(self.results_folder, exist_ok=True)
         
+        # A run that crashed before compacting its log still counts as previous results
+        recover_results_logs(self.results_folder)
+        
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Create initial files
+        # Results are appended to a JSONL log while grading and compacted into the JSON file at the end
         self.json_file = os.path.join(self.results_folder, f"grading_results_{self.timestamp}.json")
+        self.log_file = os.path.join(self.results_folder, f"grading_results_{self.timestamp}.jsonl")
         self.csv_file = os.path.join(self.results_folder, f"grading_report_{self.timestamp}.csv")
-        
-        # Initialize JSON file
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump([], f, indent=2)
+        self.results_log = ResultsLog(self.log_file)
         
         # Initialize CSV file with headers
         with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['Student Name', 'Assignment', 'Component', 'Score', 'Max Score', 'Comment'])
         
-        print(f"📄 Real-time JSON: {self.json_file}")
+        print(f"📄 Real-time log: {self.log_file}")
         print(f"📊 Real-time CSV: {self.csv_file}")
         print(f"💡 You can open these files in another window to monitor progress!")
     
     def update_realtime_results(self, result, status="completed"):
-        """Update JSON and CSV files immediately after each assignment."""
+        """Append the result to the JSONL log and the CSV file immediately after each assignment."""
         try:
-            # Update JSON file
-            with open(self.json_file, 'r', encoding='utf-8') as f:
-                current_results = json.load(f)
-            
-            current_results.append(result)
-            
-            with open(self.json_file, 'w', encoding='utf-8') as f:
-                json.dump(current_results, f, indent=2, ensure_ascii=False)
+            # Append-only, so the cost does not grow with the number of graded assignments
+            self.results_log.append(result)
             
             # Update CSV file
             with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
@@ -1586,14 +1576,19 @@ IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
             print(f"Warning: Failed to update real-time results: {e}")
 
     def save_results(self):
-        """Save final summary."""
-        if not self.results:
-            return
-        
+        """Compact the results log into the final JSON file and print a summary."""
         if not self.results_folder or not self.timestamp:
             print("Warning: Results folder or timestamp not set")
             return
         
+        if self.results_log is not None:
+            self.results_log.close()
+            # Every appended result is kept, as when results were appended to the JSON file directly
+            compact_results_log(self.log_file, self.json_file)
+        
+        if not self.results:
+            return
+        
         print(f"📄 Final results saved in: {self.results_folder}")
         print(f"   • JSON: grading_results_{self.timestamp}.json")
         print(f"   • CSV: grading_report_{self.timestamp}.csv")
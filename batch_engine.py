@@ -0,0 +1,130 @@
+"""
+Concurrent batch engine shared by the grading scripts.
+
+Grading a group spends almost all of its time waiting on the Gemini API, so
+batch mode can grade several groups at once on a thread pool. Results are
+saved as each group finishes and handed back in the original group order.
+"""
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+_print_lock = threading.Lock()
+
+
+def write_json_atomic(path: str, data) -> str:
+    """
+    Writes JSON to a temporary file next to `path` and renames it into place,
+    so a crash or a concurrent reader never sees a half-written file.
+
+    Args:
+        path (str): Destination JSON file
+        data: JSON-serialisable object
+
+    Returns:
+        str: The destination path
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    return path
+
+
+def grade_groups_concurrently(groups: list, grade_fn, save_fn, workers: int = 4):
+    """
+    Grades several groups at once and saves each result as soon as it is ready.
+
+    Args:
+        groups (list): (group_name, group_folder) tuples, in the order results should be returned
+        grade_fn: Callable (group_name, group_folder) -> results dict
+        save_fn: Callable (group_name, results) -> saved file path
+        workers (int): Number of groups graded at the same time
+
+    Returns:
+        list: (group_name, results, error) tuples in the same order as `groups`.
+              `results` is None and `error` holds the exception when a group failed.
+    """
+    if not groups:
+        return []
+
+    workers = max(1, min(workers, len(groups)))
+    total = len(groups)
+    finished = [0]
+
+    print(f"\n🚀 Grading {total} groups with {workers} concurrent workers...")
+
+    # Imported here because both modules use write_json_atomic from this one
+    from instrumentation import group_timing
+    from job_ledger import group_job
+
+    def run_one(group_name, group_folder):
+        try:
+            with group_timing(group_name), group_job(group_name):
+                results = grade_fn(group_name, group_folder)
+                save_fn(group_name, results)
+            error = None
+        except Exception as e:
+            results, error = None, e
+
+        with _print_lock:
+            finished[0] += 1
+            if error is None:
+                print(f"[{finished[0]}/{total}] ✓ Finished {group_name}: {results.get('total_score', 'N/A')}/100")
+            else:
+                print(f"[{finished[0]}/{total}] ❌ Error grading {group_name}: {error}")
+        return results, error
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grader")
+    futures = [executor.submit(run_one, name, folder) for name, folder in groups]
+
+    outcomes = []
+    try:
+        for (group_name, _), future in zip(groups, futures):
+            results, error = future.result()
+            outcomes.append((group_name, results, error))
+    except KeyboardInterrupt:
+        print("\n\nGrading interrupted by user - waiting for in-flight groups to finish...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+
+    executor.shutdown(wait=True)
+    return outcomes
+
+
+def run_in_parallel(*tasks):
+    """
+    Runs independent zero-argument callables at the same time.
+
+    Args:
+        *tasks: Callables taking no arguments
+
+    Returns:
+        list: The return value of each callable, in the order given.
+              The first exception raised by a task is re-raised.
+    """
+    if len(tasks) <= 1:
+        return [task() for task in tasks]
+
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="grader-fanout") as executor:
+        # Each task keeps the caller's context, e.g. which group its timings belong to
+        futures = [executor.submit(contextvars.copy_context().run, task) for task in tasks]
+        return [future.result() for future in futures]
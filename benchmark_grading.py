@@ -0,0 +1,433 @@
+"""
+Offline throughput benchmark for the grading pipeline.
+
+Builds synthetic submissions (video, code, documents) for a number of groups,
+grades them with the course grader's `grade_single_group`, refines the saved
+comments with `batch_refine_existing_results` and grades single-file
+assignments with `SimpleGrader.execute_grading_batch`. API calls go to
+MockGeminiClient, so no quota is used. Reports groups/hour, p50/p95 latency
+per stage, API errors and the bytes sent inline and uploaded, so concurrency
+or caching changes can be compared run against run.
+
+Usage:
+    python benchmark_grading.py --groups 8 --workers 4 --latency 1.5 --jitter 1 --rate-429 0.05
+    python benchmark_grading.py --course 7009 --stages grade refine
+    python benchmark_grading.py --record recordings/run1.jsonl   # real API, uses quota
+    python benchmark_grading.py --replay recordings/run1.jsonl   # offline replay of that run
+"""
+
+import argparse
+import functools
+import importlib
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from mock_gemini import MockGeminiClient, RecordingClient, prompt_components
+
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Course key -> (grader folder, grader module, comment refinement level)
+COURSES = {
+    "3702": ("3702ICT_AR_grading", "grader_3702ICT", "undergraduate"),
+    "7009": ("7009ICT_AdvancedInAR_grading", "grader_7009ICT", "graduate"),
+}
+STAGES = ("grade", "refine", "simple")
+
+# Grader functions timed as pipeline stages, when the course grader has them
+GRADER_STAGES = {
+    "extract_or_use_existing_frames": "frames",
+    "select_code_files": "code_selection",
+    "ingest_documents": "document_extraction",
+    "grade_video_presentation": "video_assessment",
+    "grade_coding_quality": "coding_assessment",
+    "grade_individual_contribution": "individual_assessment",
+    "grade_all_components": "component_assessment",
+    "call_gemini_api": "api_call",
+}
+
+WORDS = ("wayfinding campus marker anchor navigation prototype user testing iteration scene "
+         "unity component prefab asset design journal sprint feedback route overlay tracking").split()
+
+
+class StageTimer:
+    """
+    Collects wall-clock samples per stage from wrapped functions. Thread-safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, owner, name: str, stage: str):
+        """
+        Replaces `owner.name` with a version that records its duration under `stage`.
+        """
+        original = getattr(owner, name, None)
+        if original is None:
+            return
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+
+    def summary(self) -> dict:
+        """
+        Returns {stage: {"count", "p50", "p95", "total"}} in seconds.
+        """
+        with self.lock:
+            return {stage: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                            "total": sum(values)}
+                    for stage, values in self.samples.items()}
+
+
+def percentile(values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of numbers (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def _sentences(rng: random.Random, count: int) -> str:
+    return " ".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+                    for _ in range(count))
+
+
+def write_video(path: str, seconds: int, rng: random.Random, fps: int = 2, size=(640, 360)):
+    """
+    Writes a synthetic video whose scene changes every 15 seconds.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    color = None
+    for index in range(seconds * fps):
+        if index % (15 * fps) == 0:
+            color = [rng.randint(0, 255) for _ in range(3)]
+        frame = np.full((size[1], size[0], 3), color, dtype=np.uint8)
+        x = (index * 7) % (size[0] - 80)
+        cv2.rectangle(frame, (x, 120), (x + 80, 200), (255, 255, 255), -1)
+        cv2.putText(frame, f"Scene {index // (15 * fps) + 1}", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        writer.write(frame)
+    writer.release()
+
+
+def _csharp_script(name: str, rng: random.Random, methods: int) -> str:
+    body = "\n".join(
+        f"    void Step{i}()\n    {{\n        // {_sentences(rng, 1)}\n"
+        f"        transform.position += Vector3.forward * {rng.random():.2f}f;\n    }}\n"
+        for i in range(methods))
+    return f"using UnityEngine;\n\npublic class {name} : MonoBehaviour\n{{\n{body}}}\n"
+
+
+def write_code(folder: str, rng: random.Random, files: int = 10):
+    """
+    Writes Unity-style scripts plus a project ZIP holding copies, a vendored folder and scripts.
+    """
+    scripts = {f"Nav{i}": _csharp_script(f"Nav{i}", rng, rng.randint(3, 30)) for i in range(files)}
+    for name, text in scripts.items():
+        with open(os.path.join(folder, f"{name}.cs"), 'w', encoding='utf-8') as f:
+            f.write(text)
+    with zipfile.ZipFile(os.path.join(folder, "project.zip"), 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, text in scripts.items():
+            archive.writestr(f"Project/Assets/Scripts/{name}.cs", text)
+        archive.writestr("Project/Library/PackageCache/Vendor.cs", _csharp_script("Vendor", rng, 40))
+
+
+def write_pdf(path: str, pages: int, rng: random.Random):
+    """
+    Writes a minimal multi-page PDF with one line of text per page.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{3 + 2 * i} 0 R" for i in range(pages)), pages)]
+    for i in range(pages):
+        text = _sentences(rng, 1)[:80].replace("(", "").replace(")", "")
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build_workspace(root: str, groups: int, video_seconds: int, assignments: int, seed: int):
+    """
+    Creates synthetic organized group folders and single-file assignments.
+
+    Returns:
+        tuple: ((group_name, group_folder) list, assignment folder)
+    """
+    rng = random.Random(seed)
+    group_list = []
+    for index in range(1, groups + 1):
+        group_name = f"BENCH{index}"
+        group_folder = os.path.join(root, "organized_assignments", f"{group_name}_organized")
+        for sub in ("videos", "source_code", "documents"):
+            os.makedirs(os.path.join(group_folder, sub), exist_ok=True)
+        write_video(os.path.join(group_folder, "videos", "demo.mp4"), video_seconds, rng)
+        write_code(os.path.join(group_folder, "source_code"), rng)
+        with open(os.path.join(group_folder, "documents", "journal.md"), 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(f"## Week {week}\n{_sentences(rng, 12)}" for week in range(1, 11)))
+        write_pdf(os.path.join(group_folder, "documents", "report.pdf"), rng.randint(4, 12), rng)
+        group_list.append((group_name, group_folder))
+
+    assignment_folder = os.path.join(root, "assignments")
+    os.makedirs(assignment_folder, exist_ok=True)
+    for index in range(1, assignments + 1):
+        with open(os.path.join(assignment_folder, f"student{index}_report.txt"), 'w', encoding='utf-8') as f:
+            f.write(_sentences(rng, 80))
+    return group_list, assignment_folder
+
+
+def load_grader(course: str):
+    """
+    Imports a course grader module the same way running it from its folder would.
+    """
+    folder, module_name, level = COURSES[course]
+    sys.path.insert(0, os.path.join(ROOT_DIR, folder))
+    return importlib.import_module(module_name), level
+
+
+def run_grading_stage(client, grader, groups: list, workspace: str, timer: StageTimer, args) -> dict:
+    """
+    Grades every synthetic group with the course grader's grade_single_group.
+    """
+    from batch_engine import grade_groups_concurrently
+    from document_ingest import configure_document_ingest
+    from file_uploads import configure_file_uploads, get_upload_manager
+    from response_cache import configure_response_cache
+    from retry_policy import RequeueList
+
+    grader.RESULTS_DIR = os.path.join(workspace, "results")
+    configure_response_cache(os.path.join(workspace, "response_cache"), enabled=args.cache)
+    configure_document_ingest(os.path.join(workspace, "document_cache"), args.document_workers)
+    configure_file_uploads(enabled=not args.no_file_uploads, min_mb=args.upload_min_mb)
+    for name, stage in GRADER_STAGES.items():
+        timer.wrap(grader, name, stage)
+
+    requeue = RequeueList(grader.RESULTS_DIR)
+
+    def grade_group(group_name, group_folder):
+        start = time.perf_counter()
+        try:
+            return grader.grade_single_group(client, group_folder, group_name, parallel_requests=args.parallel_requests,
+                                             requeue=requeue)
+        finally:
+            timer.record("group", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    outcomes = grade_groups_concurrently(groups, grade_group, grader.save_grading_results, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    get_upload_manager().cleanup(client)
+
+    graded = sum(1 for _, results, error in outcomes if error is None)
+    return {"groups": len(groups), "graded": graded, "seconds": elapsed,
+            "groups_per_hour": graded / elapsed * 3600 if elapsed else 0.0,
+            "pending_components": sum(len(results.get("pending_components", [])) for _, results, _ in outcomes if results),
+            "results_dir": grader.RESULTS_DIR}
+
+
+def run_refine_stage(client, results_dir: str, level: str, timer: StageTimer) -> dict:
+    """
+    Refines the comments saved by the grading stage with batch_refine_existing_results.
+    """
+    import comment_refiner
+
+    timer.wrap(comment_refiner, "refine_comments_batch", "refine_request")
+    start = time.perf_counter()
+    comment_refiner.batch_refine_existing_results(client, results_dir, level)
+    elapsed = time.perf_counter() - start
+    timer.record("refine_all", elapsed)
+    return {"seconds": elapsed}
+
+
+def run_simple_stage(client, assignment_folder: str, workspace: str, timer: StageTimer) -> dict:
+    """
+    Grades the synthetic single-file assignments with SimpleGrader.execute_grading_batch.
+    """
+    sys.path.insert(0, os.path.join(ROOT_DIR, "assignment3"))
+    from rate_limiter import configure_rate_limiter
+    from simple_grader import SimpleGrader
+
+    timer.wrap(SimpleGrader, "grade_single_file", "simple_assignment")
+    timer.wrap(SimpleGrader, "call_gemini_api", "simple_api_call")
+
+    simple = SimpleGrader(client=client)
+    # Quota is the mock's business here; outliers are reported instead of prompting for reruns
+    simple.rate_limiter = configure_rate_limiter(0, 0)
+    simple.handle_problematic_assignments = lambda failed, problematic: timer.record("simple_failures", len(failed))
+    prompt = simple.get_3702_prompt()
+    simple.course_config = {'course': 'BENCH', 'folder': assignment_folder, 'min_score': 50, 'max_score': 90,
+                            'components': prompt_components(prompt), 'prompt': prompt}
+
+    files = sorted(os.listdir(assignment_folder))
+    previous_dir = os.getcwd()
+    os.chdir(workspace)
+    try:
+        simple.setup_realtime_results()
+        start = time.perf_counter()
+        simple.execute_grading_batch(files, assignment_folder, mode="automatic")
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(previous_dir)
+    return {"assignments": len(files), "seconds": elapsed,
+            "assignments_per_hour": len(files) / elapsed * 3600 if elapsed else 0.0}
+
+
+def print_report(report: dict):
+    """
+    Prints the benchmark summary table.
+    """
+    print(f"\n{'='*80}")
+    print("📊 BENCHMARK RESULTS")
+    print(f"{'='*80}")
+    mock = report["client"]
+    print(f"Client: {mock}")
+    grading = report["stages"].get("grade")
+    if grading:
+        print(f"Grading: {grading['graded']}/{grading['groups']} groups in {grading['seconds']:.1f}s "
+              f"-> {grading['groups_per_hour']:,.0f} groups/hour ({grading['pending_components']} components pending)")
+    refine = report["stages"].get("refine")
+    if refine:
+        print(f"Refinement: {refine['seconds']:.1f}s")
+    simple = report["stages"].get("simple")
+    if simple:
+        print(f"SimpleGrader: {simple['assignments']} assignments in {simple['seconds']:.1f}s "
+              f"-> {simple['assignments_per_hour']:,.0f} assignments/hour")
+
+    print(f"\n{'Stage':<24} {'Count':>7} {'p50 (s)':>10} {'p95 (s)':>10} {'Total (s)':>11}")
+    print("-" * 66)
+    for stage, stats in sorted(report["latency"].items()):
+        print(f"{stage:<24} {stats['count']:>7} {stats['p50']:>10.3f} {stats['p95']:>10.3f} {stats['total']:>11.2f}")
+
+    stats = report["api"]
+    if stats:
+        print(f"\nAPI calls: {stats['calls']} ({stats['errors_429']} x 429, {stats['errors_500']} x 500)")
+        print(f"Bytes sent inline: {stats['bytes_sent'] / (1024 * 1024):.2f} MB, "
+              f"uploaded: {stats['bytes_uploaded'] / (1024 * 1024):.2f} MB in {stats['files_uploaded']} files")
+        if stats["replay_hits"] or stats["replay_misses"]:
+            print(f"Replay: {stats['replay_hits']} recorded answers, {stats['replay_misses']} canned")
+
+
+def parse_args(argv=None):
+    """
+    Parses command-line options for the benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for the grading pipeline")
+    parser.add_argument("--course", choices=sorted(COURSES), default="3702", help="Course grader to drive (default: 3702)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+                        help="Pipeline stages to run (default: all)")
+    parser.add_argument("--groups", type=int, default=6, help="Synthetic groups to grade (default: 6)")
+    parser.add_argument("--assignments", type=int, default=6, help="Synthetic SimpleGrader assignments (default: 6)")
+    parser.add_argument("--video-seconds", type=int, default=120, help="Length of each synthetic video (default: 120)")
+    parser.add_argument("--workers", type=int, default=1, help="Groups graded concurrently (default: 1)")
+    parser.add_argument("--parallel-requests", action="store_true", help="Send each group's video and coding requests together")
+    parser.add_argument("--cache", action="store_true", help="Enable the response cache (off by default so every run calls the client)")
+    parser.add_argument("--no-file-uploads", action="store_true", help="Send PDFs inline instead of through the Files API")
+    parser.add_argument("--upload-min-mb", type=float, default=0.0, help="Smallest PDF uploaded through the Files API (default: 0)")
+    parser.add_argument("--document-workers", type=int, default=None, help="Processes used to extract documents")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds each mock API call takes (default: 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Extra random seconds per mock call (default: 0.5)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of mock calls failing with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of mock calls failing with 500")
+    parser.add_argument("--upload-mbps", type=float, default=50.0, help="Simulated upload bandwidth (default: 50)")
+    parser.add_argument("--replay", default=None, help="Answer recorded requests from this RecordingClient file")
+    parser.add_argument("--record", default=None,
+                        help="Use the real API (GEMINI_API_KEY, uses quota) and record its answers to this file")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for synthetic data and mock behaviour (default: 1)")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic workspace after the run")
+    parser.add_argument("--output", default=None,
+                        help="Report JSON path (default: benchmark_results/benchmark_<timestamp>.json)")
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    Runs the benchmark and writes its report.
+    """
+    args = parse_args()
+
+    if args.record:
+        import google.genai as genai
+        client = RecordingClient(genai.Client(api_key=os.environ.get("GEMINI_API_KEY")), args.record)
+        description = f"real Gemini API, recording to {args.record}"
+    else:
+        client = MockGeminiClient(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429, rate_500=args.rate_500,
+                                  upload_mbps=args.upload_mbps, replay_path=args.replay, seed=args.seed)
+        description = (f"mock, {args.latency:g}s +{args.jitter:g}s latency, {args.rate_429:.0%} 429s, {args.rate_500:.0%} 500s"
+                       + (f", replaying {args.replay}" if args.replay else ""))
+
+    workspace = tempfile.mkdtemp(prefix="grading_benchmark_")
+    print(f"🧪 Building {args.groups} synthetic groups in {workspace}...")
+    groups, assignment_folder = build_workspace(workspace, args.groups, args.video_seconds, args.assignments, args.seed)
+
+    grader, level = load_grader(args.course)
+    from instrumentation import configure_instrumentation
+    from rate_limiter import configure_rate_limiter
+    configure_rate_limiter(0, 0)
+    instrumentation = configure_instrumentation(enabled=True)
+
+    timer = StageTimer()
+    report = {"created_at": datetime.now().isoformat(), "course": args.course, "client": description,
+              "settings": vars(args), "stages": {}}
+    try:
+        if "grade" in args.stages or "refine" in args.stages:
+            report["stages"]["grade"] = run_grading_stage(client, grader, groups, workspace, timer, args)
+        if "refine" in args.stages:
+            report["stages"]["refine"] = run_refine_stage(client, report["stages"]["grade"]["results_dir"], level, timer)
+        if "simple" in args.stages:
+            report["stages"]["simple"] = run_simple_stage(client, assignment_folder, workspace, timer)
+    finally:
+        if args.keep:
+            print(f"Workspace kept in: {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report["latency"] = timer.summary()
+    report["api"] = dict(getattr(client, "stats", {}))
+    report["pipeline_stages"] = instrumentation.totals()
+    print_report(report)
+
+    output = args.output or os.path.join("benchmark_results", f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Report saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Streaming extraction of source code from submission ZIP archives.
+
+Zipped Unity projects often contain the whole Library/ cache and vendored
+packages, which used to be read into memory in full and sent to the API as
+one huge string. The generator below walks the archive member by member,
+skips vendored folders and binary files, and streams text in chunks under a
+per-file and a total byte budget, so memory use and request size stay bounded
+no matter how large the archive is.
+"""
+
+import codecs
+import os
+import zipfile
+
+
+DEFAULT_CODE_EXTENSIONS = ('.cs', '.py', '.js', '.ts', '.cpp', '.c', '.h', '.java', '.kt', '.swift', '.css', '.html')
+
+# Folders whose contents are generated or third-party, never student-authored code
+VENDORED_DIRECTORIES = ('library', 'packages', 'thirdparty', 'temp', 'logs', 'obj', 'node_modules', '__macosx')
+
+DEFAULT_MAX_FILE_BYTES = 200 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Share of control bytes in the first chunk above which a file is treated as binary
+BINARY_CONTROL_RATIO = 0.1
+_TEXT_CONTROL_BYTES = {7, 8, 9, 10, 12, 13, 27}
+
+
+def is_vendored_path(member_name: str) -> bool:
+    """
+    Returns True if an archive member lies inside a vendored or generated folder.
+    """
+    folders = member_name.replace('\\', '/').split('/')[:-1]
+    return any(folder.lower() in VENDORED_DIRECTORIES for folder in folders)
+
+
+def looks_binary(sample: bytes) -> bool:
+    """
+    Guesses from the first bytes of a file whether it is binary.
+    """
+    if not sample:
+        return False
+    if b'\x00' in sample:
+        return True
+    control = sum(1 for byte in sample if byte < 32 and byte not in _TEXT_CONTROL_BYTES)
+    return control / len(sample) > BINARY_CONTROL_RATIO
+
+
+def iter_zip_code(zip_path: str, code_extensions=DEFAULT_CODE_EXTENSIONS, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                  max_total_bytes: int = DEFAULT_MAX_TOTAL_BYTES, header_format: str = "// File: {name}\n"):
+    """
+    Streams the code files of a ZIP archive as text chunks.
+
+    Each file starts with `header_format` and is followed by its content,
+    decoded incrementally as UTF-8. Files in vendored folders, binary files
+    and other extensions are skipped. A file is cut off after `max_file_bytes`
+    and extraction stops once `max_total_bytes` have been yielded; a short
+    note at the end says what was left out.
+
+    Args:
+        zip_path (str): Path to the ZIP file
+        code_extensions (tuple): Lower-case file extensions to include
+        max_file_bytes (int): Byte budget per file
+        max_total_bytes (int): Byte budget for the whole archive
+        header_format (str): Header before each file, formatted with `name`
+
+    Yields:
+        str: Chunks of code text
+    """
+    total_bytes = 0
+    skipped_vendored = 0
+    skipped_binary = 0
+    truncated_files = 0
+    omitted_files = 0
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for file_info in zip_ref.infolist():
+            if file_info.is_dir() or os.path.splitext(file_info.filename)[1].lower() not in code_extensions:
+                continue
+            if is_vendored_path(file_info.filename):
+                skipped_vendored += 1
+                continue
+            if total_bytes >= max_total_bytes:
+                omitted_files += 1
+                continue
+
+            try:
+                with zip_ref.open(file_info) as f:
+                    chunk = f.read(min(CHUNK_SIZE, max_file_bytes))
+                    if looks_binary(chunk):
+                        skipped_binary += 1
+                        continue
+
+                    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+                    file_budget = min(max_file_bytes, max_total_bytes - total_bytes)
+                    file_bytes = 0
+
+                    yield header_format.format(name=file_info.filename)
+                    while chunk:
+                        chunk = chunk[:file_budget - file_bytes]
+                        file_bytes += len(chunk)
+                        yield decoder.decode(chunk)
+                        if file_bytes >= file_budget:
+                            break
+                        chunk = f.read(min(CHUNK_SIZE, file_budget - file_bytes))
+                    yield decoder.decode(b'', final=True)
+
+                    total_bytes += file_bytes
+                    if file_bytes < file_info.file_size:
+                        truncated_files += 1
+                        yield f"\n... [truncated after {file_bytes} of {file_info.file_size} bytes]"
+                    yield "\n\n"
+            except Exception as e:
+                print(f"Error reading {file_info.filename} from ZIP: {e}")
+
+    notes = []
+    if skipped_vendored:
+        notes.append(f"{skipped_vendored} files in vendored folders (Library/, Packages/, ThirdParty/, ...) skipped")
+    if skipped_binary:
+        notes.append(f"{skipped_binary} binary files skipped")
+    if truncated_files:
+        notes.append(f"{truncated_files} files truncated")
+    if omitted_files:
+        notes.append(f"{omitted_files} files omitted after the {max_total_bytes // 1024} KB archive budget")
+    if notes and total_bytes:
+        yield f"// Note: {'; '.join(notes)}.\n"
@@ -0,0 +1,216 @@
+"""
+Pre-selection of the code files sent for the coding quality assessment.
+
+The organizer copies source folders into `<group>-<folder>` and also collects
+loose files into `<group>-misc-source`, so the same script often appears two
+or three times, next to imported SDK code (TextMesh Pro, XR Interaction
+Toolkit samples, ...) the students did not write. Before grading, files are
+deduplicated by content hash, known third-party sources are dropped, and the
+remaining student files are ranked by how much they use the project's own
+namespaces and types and by size, then packed into a token budget.
+"""
+
+import math
+import os
+import re
+import threading
+import zipfile
+
+from code_extraction import DEFAULT_CODE_EXTENSIONS, DEFAULT_MAX_FILE_BYTES, DEFAULT_MAX_TOTAL_BYTES, VENDORED_DIRECTORIES, is_vendored_path
+from response_cache import file_digest
+from token_budget import CHARS_PER_TOKEN
+
+
+DEFAULT_CODE_TOKEN_BUDGET = 80000
+
+# Folders (lower-case) named after specific imported SDKs. Generic names such as
+# "XR", "Samples" or "Plugins" are left out: students keep their own scripts there
+SDK_DIRECTORIES = VENDORED_DIRECTORIES + (
+    'textmesh pro', 'textmeshpro', 'xr interaction toolkit', 'xri', 'standard assets',
+    'oculus', 'photon', 'vuforia', 'mrtk', 'mixedrealitytoolkit', 'arfoundation',
+)
+
+# Namespaces declared by vendor SDKs; matched as whole dotted prefixes
+SDK_NAMESPACES = (
+    'TMPro', 'UnityEngine.XR.Interaction.Toolkit', 'UnityEngine.XR.ARFoundation', 'UnityEngine.XR.ARSubsystems',
+    'Unity.XR.CoreUtils', 'Oculus', 'Meta.XR', 'Meta.WitAi', 'Photon', 'Vuforia',
+    'Microsoft.MixedReality', 'Niantic', 'GoogleARCore', 'Google.XR',
+)
+
+# License headers found at the top of vendored files
+SDK_HEADER_MARKERS = ('Unity Technologies', 'Unity Companion License', 'Oculus SDK License', 'Meta Platforms')
+
+# Only the start of a file is read to classify and rank it
+ANALYSIS_BYTES = 256 * 1024
+HEADER_BYTES = 2048
+
+_NAMESPACE_PATTERN = re.compile(r'^\s*namespace\s+([\w.]+)', re.MULTILINE)
+_USING_PATTERN = re.compile(r'^\s*using\s+(?:static\s+)?([\w.]+)\s*;', re.MULTILINE)
+_TYPE_PATTERN = re.compile(r'\b(?:class|struct|interface|enum|record)\s+([A-Za-z_]\w*)')
+_IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_]\w*')
+
+
+_token_budget = DEFAULT_CODE_TOKEN_BUDGET
+_settings_lock = threading.Lock()
+
+
+def configure_code_selection(token_budget: int = None):
+    """
+    Sets the token budget for the code sent with each coding assessment.
+
+    Args:
+        token_budget (int): Estimated tokens of code per request (0 = no limit)
+    """
+    global _token_budget
+    with _settings_lock:
+        _token_budget = DEFAULT_CODE_TOKEN_BUDGET if token_budget is None else max(0, token_budget)
+
+
+def _in_namespace(namespace: str, prefixes) -> bool:
+    return any(namespace == prefix or namespace.startswith(prefix + '.') for prefix in prefixes)
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'rb') as f:
+        return f.read(ANALYSIS_BYTES).decode('utf-8', errors='ignore')
+
+
+def is_sdk_source(path: str, text: str) -> bool:
+    """
+    Returns True if a code file looks like imported third-party or SDK code.
+
+    Args:
+        path (str): File path, checked for SDK folders
+        text (str): Start of the file, checked for SDK namespaces and license headers
+    """
+    folders = path.replace('\\', '/').lower().split('/')[:-1]
+    if any(folder in SDK_DIRECTORIES for folder in folders):
+        return True
+
+    declared = _NAMESPACE_PATTERN.findall(text)
+    if declared and all(_in_namespace(namespace, SDK_NAMESPACES) for namespace in declared):
+        return True
+
+    header = text[:HEADER_BYTES]
+    return any(marker in header for marker in SDK_HEADER_MARKERS)
+
+
+def estimate_zip_code_tokens(zip_path: str) -> int:
+    """
+    Estimates the tokens of code `extract_code_from_zip` would send for an archive.
+    """
+    total = 0
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for file_info in zip_ref.infolist():
+                if (file_info.is_dir() or is_vendored_path(file_info.filename) or
+                        os.path.splitext(file_info.filename)[1].lower() not in DEFAULT_CODE_EXTENSIONS):
+                    continue
+                total += min(file_info.file_size, DEFAULT_MAX_FILE_BYTES)
+    except (OSError, zipfile.BadZipFile):
+        return 0
+    return min(total, DEFAULT_MAX_TOTAL_BYTES) // CHARS_PER_TOKEN + 1
+
+
+def select_code_files(code_files: list, token_budget: int = None, base_dir: str = None) -> list:
+    """
+    Picks the code files worth sending for the coding quality assessment.
+
+    Duplicates (same content) and third-party sources are dropped. The rest
+    are scored by the number of references to the project's own namespaces
+    and types declared in other files, weighted by file size, and added in
+    score order while they fit in the token budget. ZIP archives follow the
+    loose files and are kept whenever they fit.
+
+    Args:
+        code_files (list): Candidate code and ZIP file paths
+        token_budget (int): Estimated tokens of code allowed (default: configured budget, 0 = no limit)
+        base_dir (str): Source directory; paths are classified and reported relative to it
+
+    Returns:
+        list: Selected file paths, in their original order
+    """
+    if token_budget is None:
+        token_budget = _token_budget
+
+    candidates = []
+    sdk_candidates = []
+    seen_digests = set()
+    duplicates = 0
+
+    for path in code_files:
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            print(f"Skipping unreadable code file {path}: {e}")
+            continue
+        if digest in seen_digests:
+            duplicates += 1
+            continue
+        seen_digests.add(digest)
+
+        if path.lower().endswith('.zip'):
+            candidates.append({"path": path, "tokens": estimate_zip_code_tokens(path), "zip": True})
+            continue
+
+        text = _read_text(path)
+        candidate = {
+            "path": path,
+            "tokens": os.path.getsize(path) // CHARS_PER_TOKEN + 1,
+            "zip": False,
+            "text": text,
+            "namespaces": set(_NAMESPACE_PATTERN.findall(text)),
+            "types": set(_TYPE_PATTERN.findall(text)),
+        }
+        # Folder names are only checked below the source directory
+        if is_sdk_source(os.path.relpath(path, base_dir) if base_dir else path, text):
+            sdk_candidates.append(candidate)
+            continue
+        candidates.append(candidate)
+
+    sdk_files = len(sdk_candidates)
+    if sdk_candidates and not any(not c["zip"] for c in candidates):
+        # Rather send code that looks like an SDK than grade the group as having no code
+        print(f"⚠️  All {sdk_files} code files look like SDK/third-party code; sending them anyway")
+        candidates.extend(sdk_candidates)
+        sdk_files = 0
+
+    # The project's own vocabulary: namespaces and types the students declared
+    sources = [c for c in candidates if not c["zip"]]
+    project_namespaces = set().union(*(c["namespaces"] for c in sources)) if sources else set()
+    project_types = set().union(*(c["types"] for c in sources)) if sources else set()
+
+    for candidate in sources:
+        used = set(_IDENTIFIER_PATTERN.findall(candidate["text"]))
+        imports = {namespace for namespace in _USING_PATTERN.findall(candidate["text"])
+                   if _in_namespace(namespace, project_namespaces)}
+        references = len(imports) + len((used & project_types) - candidate["types"])
+        # References dominate; size breaks ties and favours substantial scripts over stubs
+        candidate["score"] = (1 + references) * math.log2(2 + candidate["tokens"])
+        del candidate["text"]
+
+    # Archives usually repeat the loose scripts, so they come last; the first
+    # candidate is always kept so a group never ends up with no code at all
+    ranked = (sorted(sources, key=lambda c: c["score"], reverse=True) +
+              [c for c in candidates if c["zip"]])
+
+    selected = set()
+    used_tokens = 0
+    over_budget = 0
+    for candidate in ranked:
+        if token_budget and used_tokens + candidate["tokens"] > token_budget and selected:
+            over_budget += 1
+            continue
+        selected.add(candidate["path"])
+        used_tokens += candidate["tokens"]
+
+    result = [path for path in code_files if path in selected]
+
+    skipped = [f"{duplicates} duplicates", f"{sdk_files} SDK/third-party"]
+    if token_budget:
+        skipped.append(f"{over_budget} over the {token_budget:,}-token budget")
+    print(f"📦 Code selection: {len(result)}/{len(code_files)} files, ~{used_tokens:,} tokens ({', '.join(skipped)})")
+    if over_budget:
+        left_out = [c["path"] for c in ranked if c["path"] not in selected]
+        print(f"   Left out for size: {[os.path.relpath(p, base_dir) if base_dir else p for p in left_out]}")
+    return result
@@ -0,0 +1,395 @@
+"""
+Local text and image extraction for submitted documents.
+
+The graders used to describe a .docx/.xlsx/.pptx attachment to the model with
+a one-line "Document file: name" stub, so the documentation part of the
+rubric was graded without the documents. Each document is now converted once
+into compact text (paragraphs, tables, slides with speaker notes, sheet rows)
+plus a few downscaled images (embedded figures or rendered PDF pages). The
+result is cached on disk by content hash, and a group's documents are
+extracted in parallel before grading, on one process pool shared by every
+grading thread.
+
+Office formats are read with the standard library. PDFs need PyMuPDF
+(`pip install pymupdf`, text and page images) or pypdf (text only); without
+either, PDFs are sent to the model as before.
+"""
+
+import atexit
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from batch_engine import write_json_atomic
+from response_cache import file_digest
+from video_frames import configure_frame_encoding, extraction_settings, save_encoded_frame
+
+
+DOCUMENT_EXTENSIONS = ('.pdf', '.docx', '.xlsx', '.pptx')
+DEFAULT_DOCUMENT_CACHE_DIR = ".document_cache"
+
+# Bump when the extracted format changes so old cache entries are rebuilt
+INGEST_VERSION = 1
+CONTENT_FILENAME = "content.json"
+
+MAX_DOCUMENT_IMAGES = 6
+MIN_IMAGE_BYTES = 8 * 1024      # smaller embedded images are icons and bullets
+MAX_SHEET_ROWS = 200
+PDF_RENDER_ZOOM = 1.5
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+_S = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _compact(lines) -> str:
+    # Collapse runs of whitespace and drop empty lines
+    return "\n".join(line for line in (re.sub(r'[ \t\xa0]+', ' ', line).strip() for line in lines) if line)
+
+
+def _docx_text(zip_ref: zipfile.ZipFile) -> str:
+    body = ET.fromstring(zip_ref.read('word/document.xml')).find(f'{_W}body')
+    lines = []
+    for element in body if body is not None else []:
+        if element.tag == f'{_W}p':
+            lines.append(''.join(node.text or '' for node in element.iter(f'{_W}t')))
+        elif element.tag == f'{_W}tbl':
+            for row in element.iter(f'{_W}tr'):
+                cells = [''.join(node.text or '' for node in cell.iter(f'{_W}t')).strip() for cell in row.iter(f'{_W}tc')]
+                lines.append(' | '.join(cells))
+    return _compact(lines)
+
+
+def _numbered(names, pattern):
+    # Sort slide1.xml, slide2.xml, ..., slide10.xml numerically
+    numbered = [(int(match.group(1)), name) for name in names for match in [re.fullmatch(pattern, name)] if match]
+    return [name for _, name in sorted(numbered)]
+
+
+def _pptx_text(zip_ref: zipfile.ZipFile) -> str:
+    names = zip_ref.namelist()
+    lines = []
+    for number, slide in enumerate(_numbered(names, r'ppt/slides/slide(\d+)\.xml'), 1):
+        lines.append(f"## Slide {number}")
+        root = ET.fromstring(zip_ref.read(slide))
+        lines.extend(''.join(node.text or '' for node in paragraph.iter(f'{_A}t')) for paragraph in root.iter(f'{_A}p'))
+
+        notes = f"ppt/notesSlides/notesSlide{slide[len('ppt/slides/slide'):]}"
+        if notes in names:
+            note_text = ' '.join(node.text or '' for node in ET.fromstring(zip_ref.read(notes)).iter(f'{_A}t'))
+            # Notes slides repeat the slide number; keep only real notes
+            if note_text.strip() and not note_text.strip().isdigit():
+                lines.append(f"Notes: {note_text}")
+    return _compact(lines)
+
+
+def _xlsx_text(zip_ref: zipfile.ZipFile) -> str:
+    names = zip_ref.namelist()
+    shared = []
+    if 'xl/sharedStrings.xml' in names:
+        for item in ET.fromstring(zip_ref.read('xl/sharedStrings.xml')).iter(f'{_S}si'):
+            shared.append(''.join(node.text or '' for node in item.iter(f'{_S}t')))
+
+    targets = {}
+    if 'xl/_rels/workbook.xml.rels' in names:
+        for rel in ET.fromstring(zip_ref.read('xl/_rels/workbook.xml.rels')).iter(f'{_REL}Relationship'):
+            targets[rel.get('Id')] = 'xl/' + rel.get('Target').lstrip('/').replace('xl/', '', 1)
+
+    lines = []
+    for sheet in ET.fromstring(zip_ref.read('xl/workbook.xml')).iter(f'{_S}sheet'):
+        path = targets.get(sheet.get(f'{_R}id'))
+        if path not in names:
+            continue
+        lines.append(f"## Sheet: {sheet.get('name')}")
+        rows = ET.fromstring(zip_ref.read(path)).iter(f'{_S}row')
+        for count, row in enumerate(rows):
+            if count == MAX_SHEET_ROWS:
+                lines.append(f"... (rows after {MAX_SHEET_ROWS} omitted)")
+                break
+            values = []
+            for cell in row.iter(f'{_S}c'):
+                if cell.get('t') == 's':
+                    value = cell.find(f'{_S}v')
+                    values.append(shared[int(value.text)] if value is not None and value.text else '')
+                elif cell.get('t') == 'inlineStr':
+                    values.append(''.join(node.text or '' for node in cell.iter(f'{_S}t')))
+                else:
+                    value = cell.find(f'{_S}v')
+                    values.append(value.text if value is not None and value.text else '')
+            if any(value.strip() for value in values):
+                lines.append(' | '.join(values))
+    return _compact(lines)
+
+
+def _office_images(zip_ref: zipfile.ZipFile) -> list:
+    # Embedded pictures, largest first, decoded so they can be downscaled and re-encoded
+    media = [info for info in zip_ref.infolist()
+             if re.match(r'(word|ppt|xl)/media/', info.filename) and info.file_size >= MIN_IMAGE_BYTES]
+    images = []
+    for info in sorted(media, key=lambda info: info.file_size, reverse=True):
+        image = cv2.imdecode(np.frombuffer(zip_ref.read(info), np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+        if len(images) == MAX_DOCUMENT_IMAGES:
+            break
+    return images
+
+
+def _page_lines(number: int, text: str) -> list:
+    # Pages without a text layer (scans) add nothing, so a scanned PDF ends up with no text
+    if not text or not text.strip():
+        return []
+    return [f"## Page {number}"] + text.splitlines()
+
+
+def _pdf_content(path: str):
+    """
+    Returns (text, images) for a PDF, or None if no PDF library is installed.
+    """
+    try:
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf  # releases before 1.24
+
+        with pymupdf.open(path) as pdf:
+            lines = []
+            for number, page in enumerate(pdf, 1):
+                lines.extend(_page_lines(number, page.get_text()))
+
+            # Render pages spread across the document for figures and layout
+            count = min(MAX_DOCUMENT_IMAGES, pdf.page_count)
+            pages = sorted({round(i * (pdf.page_count - 1) / max(1, count - 1)) for i in range(count)})
+            images = []
+            for number in pages:
+                pixmap = pdf[number].get_pixmap(matrix=pymupdf.Matrix(PDF_RENDER_ZOOM, PDF_RENDER_ZOOM))
+                image = cv2.imdecode(np.frombuffer(pixmap.tobytes('png'), np.uint8), cv2.IMREAD_COLOR)
+                if image is not None:
+                    images.append(image)
+        return _compact(lines), images
+    except ImportError:
+        pass
+
+    try:
+        from pypdf import PdfReader
+
+        lines = []
+        for number, page in enumerate(PdfReader(path).pages, 1):
+            lines.extend(_page_lines(number, page.extract_text()))
+        return _compact(lines), []
+    except ImportError:
+        return None
+
+
+def pdf_text_available() -> bool:
+    """
+    Returns True if a PDF library (PyMuPDF or pypdf) is installed.
+    """
+    return any(importlib.util.find_spec(module) is not None for module in ('pymupdf', 'fitz', 'pypdf'))
+
+
+def extract_document(path: str):
+    """
+    Extracts the text and images of one document.
+
+    Returns:
+        tuple or None: (text, list of BGR images), or None if the format cannot be read here
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.pdf':
+        return _pdf_content(path)
+
+    readers = {'.docx': _docx_text, '.pptx': _pptx_text, '.xlsx': _xlsx_text}
+    if extension not in readers:
+        return None
+    with zipfile.ZipFile(path, 'r') as zip_ref:
+        return readers[extension](zip_ref), _office_images(zip_ref)
+
+
+def _entry_dir(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, digest[:2], digest)
+
+
+def _read_entry(entry_dir: str):
+    try:
+        with open(os.path.join(entry_dir, CONTENT_FILENAME), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if entry.get("version") != INGEST_VERSION:
+        return None
+    entry["images"] = [os.path.join(entry_dir, name) for name in entry["images"]]
+    return entry
+
+
+def ingest_document(path: str, cache_dir: str = DEFAULT_DOCUMENT_CACHE_DIR):
+    """
+    Returns the extracted content of a document, from the cache when its contents were seen before.
+
+    Returns:
+        dict or None: {"source", "text", "images" (paths of encoded images)},
+                      or None if the document cannot be read here
+    """
+    entry_dir = _entry_dir(cache_dir, file_digest(path))
+    entry = _read_entry(entry_dir)
+    if entry is not None:
+        return entry
+
+    try:
+        content = extract_document(path)
+    except Exception as e:
+        print(f"Warning: could not extract text from {os.path.basename(path)}: {e}")
+        return None
+    if content is None:
+        return None
+
+    text, images = content
+    os.makedirs(entry_dir, exist_ok=True)
+    image_names = [os.path.basename(save_encoded_frame(image, entry_dir, f"image_{index:02d}"))
+                   for index, image in enumerate(images)]
+    write_json_atomic(os.path.join(entry_dir, CONTENT_FILENAME), {
+        "version": INGEST_VERSION,
+        "source": os.path.basename(path),
+        "text": text,
+        "images": image_names,
+    })
+    return _read_entry(entry_dir)
+
+
+def document_images(document: dict) -> list:
+    """
+    Returns the encoded images of an extracted document as (bytes, mime type) pairs.
+    """
+    images = []
+    for image_path in document["images"]:
+        mime_type = 'image/webp' if image_path.endswith('.webp') else 'image/jpeg'
+        with open(image_path, 'rb') as f:
+            images.append((f.read(), mime_type))
+    return images
+
+
+def _init_worker(encoding: dict):
+    # Spawned workers start from the defaults, so the parent's image encoding is applied here.
+    # One OpenCV thread per process; the pool already uses every core
+    cv2.setNumThreads(1)
+    configure_frame_encoding(encoding["max_long_edge"], encoding["quality"], encoding["format"])
+
+
+def _ingest_worker(path: str, cache_dir: str):
+    return ingest_document(path, cache_dir) is not None
+
+
+_settings = {"cache_dir": DEFAULT_DOCUMENT_CACHE_DIR, "workers": os.cpu_count() or 1}
+_settings_lock = threading.Lock()
+
+
+def configure_document_ingest(cache_dir: str = None, workers: int = None):
+    """
+    Sets the document cache folder and the number of extraction processes.
+    """
+    with _settings_lock:
+        if cache_dir is not None:
+            _settings["cache_dir"] = cache_dir
+        if workers is not None:
+            _settings["workers"] = max(1, workers)
+
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the extraction pool shared by every grading thread, starting it on first use
+    (or again if the number of workers or the image encoding changed).
+    """
+    global _pool, _pool_key
+    settings = extraction_settings()
+    encoding = {key: settings[key] for key in ("max_long_edge", "quality", "format")}
+    key = (workers, tuple(sorted(encoding.items())))
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Spawned rather than forked workers: this runs inside grading threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(encoding,))
+            _pool_key = key
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    # A broken pool cannot take new work; the next call starts a fresh one
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_key = None, None
+
+
+def shutdown_document_pool():
+    """
+    Stops the extraction processes. Runs at exit; the pool is started again if needed.
+    """
+    global _pool, _pool_key
+    with _pool_lock:
+        pool, _pool, _pool_key = _pool, None, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_document_pool)
+
+
+def load_document(path: str):
+    """
+    Returns the extracted content of a document using the configured cache (see ingest_document).
+    """
+    if os.path.splitext(path)[1].lower() not in DOCUMENT_EXTENSIONS:
+        return None
+    return ingest_document(path, _settings["cache_dir"])
+
+
+def ingest_documents(paths: list):
+    """
+    Extracts every document not yet in the cache, in parallel on a process pool.
+
+    Args:
+        paths (list): Document paths; other file types are ignored
+    """
+    cache_dir = _settings["cache_dir"]
+    extensions = DOCUMENT_EXTENSIONS if pdf_text_available() else tuple(e for e in DOCUMENT_EXTENSIONS if e != '.pdf')
+    pending = [path for path in paths
+               if os.path.splitext(path)[1].lower() in extensions
+               and _read_entry(_entry_dir(cache_dir, file_digest(path))) is None]
+    if not pending:
+        return
+
+    workers = min(_settings["workers"], len(pending))
+    print(f"📄 Extracting text from {len(pending)} documents with {workers} processes...")
+    if workers == 1:
+        for path in pending:
+            ingest_document(path, cache_dir)
+        return
+
+    pool = _get_pool(_settings["workers"])
+    try:
+        for path, ok in zip(pending, pool.map(_ingest_worker, pending, [cache_dir] * len(pending))):
+            if not ok:
+                print(f"   {os.path.basename(path)}: no text extracted, sent as before")
+    except BrokenProcessPool as e:
+        # Whatever the pool did not finish is extracted on first use instead
+        print(f"Warning: document extraction pool failed ({e}); extracting in this process")
+        _discard_pool(pool)
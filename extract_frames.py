@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Pre-extracts video frames for every group before grading.
+
+Finds each <group>_organized/videos folder under organized_assignments and
+extracts frames for all groups at once on a process pool, writing them into
+each group's video_frames folder. The graders then find the frames already
+in place and skip extraction.
+
+Usage:
+    python extract_frames.py                      # search the usual organized_assignments locations
+    python extract_frames.py path/to/organized_assignments --jobs 16
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from video_frames import IMAGE_FORMATS, SELECTION_MODES, configure_frame_encoding, configure_frame_selection, extract_video_frames, load_cached_frames
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv')
+
+# Same locations the graders search, relative to the current directory
+DEFAULT_SEARCH_PATHS = [
+    "organized_assignments",
+    os.path.join("3702ICT_AR", "3702ICT_AR", "organized_assignments"),
+    os.path.join("7009ICT_AdvancedInAR", "7009ICT_AdvancedInAR", "organized_assignments"),
+    os.path.join("..", "3702ICT_AR", "3702ICT_AR", "organized_assignments"),
+    os.path.join("..", "7009ICT_AdvancedInAR", "7009ICT_AdvancedInAR", "organized_assignments"),
+]
+
+
+def find_group_videos(organized_dirs: list) -> list:
+    """
+    Finds the video each group will be graded on.
+
+    Args:
+        organized_dirs (list): organized_assignments directories to scan
+
+    Returns:
+        list: (group_name, video_path, video_frames_dir) tuples
+    """
+    jobs = []
+    for organized_dir in organized_dirs:
+        for item in sorted(os.listdir(organized_dir)):
+            group_folder = os.path.join(organized_dir, item)
+            if not item.endswith('_organized') or not os.path.isdir(group_folder):
+                continue
+
+            video_folder = os.path.join(group_folder, "videos")
+            if not os.path.isdir(video_folder):
+                continue
+
+            # The graders use the first video listed in the folder
+            video_files = [f for f in os.listdir(video_folder) if f.lower().endswith(VIDEO_EXTENSIONS)]
+            if not video_files:
+                continue
+
+            video_path = os.path.join(video_folder, video_files[0])
+            if os.path.getsize(video_path) == 0:
+                continue
+
+            group_name = item.replace('_organized', '')
+            jobs.append((group_name, video_path, os.path.join(group_folder, "video_frames")))
+    return jobs
+
+
+def apply_settings(settings: dict):
+    """
+    Applies the frame selection and encoding options in the current process.
+    """
+    configure_frame_selection(settings["frame_selection"], settings["frame_budget"])
+    configure_frame_encoding(settings["max_frame_edge"], settings["frame_quality"], settings["frame_format"])
+
+
+def extract_group_frames(video_path: str, video_frames_dir: str, frame_interval_seconds: float, settings: dict):
+    """
+    Worker: extracts one video's frames. Runs in a separate process, so the
+    selection and encoding settings are passed in and applied here.
+
+    Returns:
+        tuple: (number of frames or None on failure, seconds taken)
+    """
+    # One decoder thread per process; the pool already uses every core
+    cv2.setNumThreads(1)
+    apply_settings(settings)
+
+    start = time.time()
+    frames = extract_video_frames(video_path, video_frames_dir, frame_interval_seconds)
+    return (len(frames) if frames is not None else None), time.time() - start
+
+
+def extract_all_frames(jobs: list, workers: int, frame_interval_seconds: float, settings: dict) -> dict:
+    """
+    Extracts frames for every job on a process pool, printing progress as each video finishes.
+
+    Returns:
+        dict: group_name -> number of frames (None if the video could not be read)
+    """
+    results = {}
+    total = len(jobs)
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(extract_group_frames, video_path, frames_dir, frame_interval_seconds, settings): group_name
+            for group_name, video_path, frames_dir in jobs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            group_name = futures[future]
+            try:
+                frame_count, seconds = future.result()
+            except Exception as e:
+                print(f"[{done}/{total}] ❌ {group_name}: {e}")
+                results[group_name] = None
+                continue
+
+            results[group_name] = frame_count
+            if frame_count is None:
+                print(f"[{done}/{total}] ❌ {group_name}: could not read video")
+            else:
+                print(f"[{done}/{total}] ✓ {group_name}: {frame_count} frames ({seconds:.1f}s)")
+
+    print(f"\nExtracted frames for {sum(1 for c in results.values() if c is not None)}/{total} videos "
+          f"in {time.time() - start:.1f}s")
+    return results
+
+
+def parse_args(argv=None):
+    """
+    Parses command-line options for the frame pre-pass.
+
+    Returns:
+        argparse.Namespace: Parsed options
+    """
+    parser = argparse.ArgumentParser(description="Extract video frames for all groups before grading")
+    parser.add_argument("organized_dirs", nargs="*",
+                        help="organized_assignments directories (default: search the usual locations)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of videos processed at the same time (default: number of CPU cores)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-extract frames even if a group's saved frames are still valid")
+    parser.add_argument("--interval", type=float, default=20,
+                        help="Seconds between frames in interval mode (default: 20, same as the graders)")
+    parser.add_argument("--frame-selection", choices=SELECTION_MODES, default="interval",
+                        help="How video frames are picked: fixed interval, or only frames where the scene changes")
+    parser.add_argument("--frame-budget", type=int, default=None,
+                        help="Maximum frames per video in scene selection mode (default: 12)")
+    parser.add_argument("--max-frame-edge", type=int, default=None,
+                        help="Longest side of saved frames in pixels (default: 1280, 0 = keep source size)")
+    parser.add_argument("--frame-quality", type=int, default=None,
+                        help="Encoder quality 1-100 (default: 85 for JPEG, 80 for WebP)")
+    parser.add_argument("--frame-format", choices=list(IMAGE_FORMATS), default=None,
+                        help="Image format for saved frames (default: jpeg)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    organized_dirs = args.organized_dirs or [path for path in DEFAULT_SEARCH_PATHS if os.path.isdir(path)]
+    organized_dirs = [path for path in organized_dirs if os.path.isdir(path)]
+    if not organized_dirs:
+        print("No organized_assignments directory found. Run the assignment organizer first or pass the path.")
+        return
+
+    print(f"Scanning: {organized_dirs}")
+    jobs = find_group_videos(organized_dirs)
+
+    settings = {
+        "frame_selection": args.frame_selection,
+        "frame_budget": args.frame_budget,
+        "max_frame_edge": args.max_frame_edge,
+        "frame_quality": args.frame_quality,
+        "frame_format": args.frame_format,
+    }
+    apply_settings(settings)
+
+    # Frames whose manifest matches the current video and settings are kept
+    if not args.force:
+        skipped = [job for job in jobs if load_cached_frames(job[1], job[2], args.interval)]
+        if skipped:
+            print(f"Skipping {len(skipped)} groups with up-to-date frames (use --force to re-extract): "
+                  f"{[group_name for group_name, _, _ in skipped]}")
+        jobs = [job for job in jobs if job not in skipped]
+
+    if not jobs:
+        print("No videos need frame extraction.")
+        return
+
+    workers = max(1, min(args.jobs, len(jobs)))
+    print(f"🎬 Extracting frames from {len(jobs)} videos with {workers} processes...")
+    extract_all_frames(jobs, workers, args.interval, settings)
+
+
+if __name__ == "__main__":
+    main()
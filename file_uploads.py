@@ -0,0 +1,165 @@
+"""
+Upload-once handling of large attachments through the Gemini Files API.
+
+The same project documents are attached to several requests per group (in
+7009ICT the document assessment and the individual contribution assessment
+both send them), and used to be re-read and re-sent inline every time. Large
+files are instead uploaded once per run and remembered by content hash;
+later requests only reference the returned file URI, which keeps request
+bodies small.
+"""
+
+import os
+import re
+import threading
+import time
+
+from google.genai import types
+
+from response_cache import file_digest
+from retry_policy import call_with_retry
+
+
+# File types the model reads directly, by extension
+UPLOAD_MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.mp4': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.avi': 'video/x-msvideo',
+    '.wmv': 'video/x-ms-wmv',
+}
+
+# Files smaller than this are sent inline instead of being uploaded
+DEFAULT_UPLOAD_MIN_MB = 1
+
+# Largest request the API accepts with inline file data
+INLINE_LIMIT_BYTES = 20 * 1024 * 1024
+
+# Uploaded videos are processed before they can be used
+PROCESSING_POLL_SECONDS = 2
+PROCESSING_TIMEOUT_SECONDS = 300
+
+# The model reads a PDF as roughly this many tokens per page
+PDF_PAGE_TOKENS = 258
+
+_PDF_PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def estimate_document_tokens(path: str) -> int:
+    """
+    Estimates the input tokens of a PDF from its page count.
+    """
+    with open(path, 'rb') as f:
+        pages = len(_PDF_PAGE_PATTERN.findall(f.read()))
+    return max(1, pages) * PDF_PAGE_TOKENS
+
+
+class UploadManager:
+    """
+    Uploads each distinct file once and hands out Parts referencing it.
+    Safe to share between concurrent grading workers.
+    """
+
+    def __init__(self, enabled: bool = True, min_bytes: int = DEFAULT_UPLOAD_MIN_MB * 1024 * 1024):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.lock = threading.Lock()
+        self.uploads = {}        # content hash -> (uploaded File, estimated tokens)
+        self.digest_locks = {}
+        self.uploaded = 0
+        self.reused = 0
+
+    def _digest_lock(self, digest: str) -> threading.Lock:
+        with self.lock:
+            return self.digest_locks.setdefault(digest, threading.Lock())
+
+    def _upload(self, client, path: str, mime_type: str):
+        uploaded = call_with_retry(
+            lambda: client.files.upload(file=path, config=types.UploadFileConfig(
+                mime_type=mime_type, display_name=os.path.basename(path))),
+            description=f"Upload of {os.path.basename(path)}"
+        )
+
+        # Videos stay in PROCESSING for a while before they can be referenced
+        waited = 0
+        while uploaded.state == types.FileState.PROCESSING and waited < PROCESSING_TIMEOUT_SECONDS:
+            time.sleep(PROCESSING_POLL_SECONDS)
+            waited += PROCESSING_POLL_SECONDS
+            uploaded = client.files.get(name=uploaded.name)
+        if uploaded.state != types.FileState.ACTIVE:
+            raise RuntimeError(f"File {os.path.basename(path)} was not processed by the Files API (state: {uploaded.state})")
+        return uploaded
+
+    def get_part(self, client, path: str, mime_type: str = None):
+        """
+        Returns a Part for a file, uploading it the first time its contents are seen.
+
+        Args:
+            client (genai.Client): The Gemini API client instance
+            path (str): File to attach
+            mime_type (str): MIME type (default: from UPLOAD_MIME_TYPES)
+
+        Returns:
+            tuple: (types.Part, estimated tokens) or None if the file should be sent inline
+        """
+        mime_type = mime_type or UPLOAD_MIME_TYPES.get(os.path.splitext(path)[1].lower())
+        if not self.enabled or mime_type is None or os.path.getsize(path) < self.min_bytes:
+            return None
+
+        digest = file_digest(path)
+        with self._digest_lock(digest):
+            if digest in self.uploads:
+                uploaded, tokens = self.uploads[digest]
+                with self.lock:
+                    self.reused += 1
+                print(f"📎 Reusing uploaded {os.path.basename(path)}")
+            else:
+                print(f"⬆️  Uploading {os.path.basename(path)} ({os.path.getsize(path) / (1024 * 1024):.1f} MB) to the Files API...")
+                uploaded = self._upload(client, path, mime_type)
+                tokens = estimate_document_tokens(path) if mime_type == 'application/pdf' else 0
+                self.uploads[digest] = (uploaded, tokens)
+                with self.lock:
+                    self.uploaded += 1
+
+        return types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type or mime_type), tokens
+
+    def cleanup(self, client):
+        """
+        Deletes this run's uploads (they would otherwise expire after 48 hours).
+        """
+        for uploaded, _ in list(self.uploads.values()):
+            try:
+                client.files.delete(name=uploaded.name)
+            except Exception as e:
+                print(f"Warning: could not delete uploaded file {uploaded.name}: {e}")
+        if self.uploads:
+            print(f"📎 Files API: {self.uploaded} uploads, {self.reused} reused; removed {len(self.uploads)} uploaded files")
+        self.uploads.clear()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def configure_file_uploads(enabled: bool = True, min_mb: float = None) -> UploadManager:
+    """
+    Replaces the shared upload manager. The size threshold falls back to the
+    GEMINI_UPLOAD_MIN_MB environment variable and then to the default.
+    """
+    global _manager
+
+    if min_mb is None:
+        min_mb = float(os.environ.get("GEMINI_UPLOAD_MIN_MB", DEFAULT_UPLOAD_MIN_MB))
+
+    with _manager_lock:
+        _manager = UploadManager(enabled, int(min_mb * 1024 * 1024))
+    return _manager
+
+
+def get_upload_manager() -> UploadManager:
+    """
+    Returns the upload manager shared by all API calls in this process.
+    """
+    if _manager is None:
+        configure_file_uploads()
+    return _manager
@@ -0,0 +1,206 @@
+"""
+Lightweight timing and byte-count instrumentation for the grading pipeline.
+
+Pipeline stages are wrapped in `span()` context managers and sizes are
+recorded with `count()`. Both are attributed to the group being graded (set
+with `group_timing()`), or to the session when no group is active. Each
+group's stage timings are written to `<group>_timing.json` when it finishes,
+and `print_summary()` shows where a whole run spent its time.
+
+Spans may nest (an API request includes its rate-limit wait), so stage totals
+are not meant to add up to the wall-clock time.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from batch_engine import write_json_atomic
+
+
+SESSION_GROUP = "_session"
+TIMINGS_DIRNAME = "timings"
+
+_current_group = contextvars.ContextVar("instrumentation_group", default=SESSION_GROUP)
+
+
+def _new_record() -> dict:
+    return {"seconds": 0.0, "spans": {}, "counters": {}}
+
+
+class Instrumentation:
+    """
+    Thread-safe store of span timings and counters, per group.
+    """
+
+    def __init__(self, enabled: bool = True, output_dir: str = None):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.groups = {}
+        self.started = time.perf_counter()
+
+    def add_span(self, name: str, seconds: float, group: str = None):
+        if not self.enabled:
+            return
+        with self.lock:
+            record = self.groups.setdefault(group or _current_group.get(), _new_record())
+            stats = record["spans"].setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def add_count(self, name: str, amount: float = 1, group: str = None):
+        if not self.enabled:
+            return
+        with self.lock:
+            counters = self.groups.setdefault(group or _current_group.get(), _new_record())["counters"]
+            counters[name] = counters.get(name, 0) + amount
+
+    def group_record(self, group: str) -> dict:
+        with self.lock:
+            record = self.groups.get(group, _new_record())
+            return {"seconds": record["seconds"],
+                    "spans": {name: dict(stats) for name, stats in record["spans"].items()},
+                    "counters": dict(record["counters"])}
+
+    def totals(self) -> dict:
+        """
+        Returns the spans and counters of all groups and the session combined.
+        """
+        spans, counters = {}, {}
+        with self.lock:
+            for record in self.groups.values():
+                for name, stats in record["spans"].items():
+                    total = spans.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+                    total["count"] += stats["count"]
+                    total["seconds"] += stats["seconds"]
+                    total["max_seconds"] = max(total["max_seconds"], stats["max_seconds"])
+                for name, value in record["counters"].items():
+                    counters[name] = counters.get(name, 0) + value
+        return {"spans": spans, "counters": counters}
+
+    def write_group(self, group: str):
+        """
+        Writes one group's timings to <output_dir>/timings/<group>_timing.json.
+        """
+        if not self.enabled or not self.output_dir:
+            return None
+        path = os.path.join(self.output_dir, TIMINGS_DIRNAME, f"{group}_timing.json")
+        record = self.group_record(group)
+        record.update({"group_name": group, "written_at": datetime.now().isoformat()})
+        return write_json_atomic(path, record)
+
+    def write_session(self):
+        """
+        Writes the whole run's totals and per-group timings to a timestamped session file.
+        """
+        if not self.enabled or not self.output_dir:
+            return None
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.output_dir, TIMINGS_DIRNAME, f"session_{stamp}.json")
+        with self.lock:
+            groups = list(self.groups)
+        summary = self.totals()
+        summary.update({"wall_seconds": time.perf_counter() - self.started,
+                        "groups": {group: self.group_record(group) for group in groups}})
+        return write_json_atomic(path, summary)
+
+
+_instrumentation = Instrumentation(enabled=False)
+_instrumentation_lock = threading.Lock()
+
+
+def configure_instrumentation(enabled: bool = True, output_dir: str = None) -> Instrumentation:
+    """
+    Starts a new instrumentation session. Timing files are written under
+    `output_dir` (normally the results folder); without one nothing is written.
+    """
+    global _instrumentation
+    with _instrumentation_lock:
+        _instrumentation = Instrumentation(enabled, output_dir)
+    return _instrumentation
+
+
+def get_instrumentation() -> Instrumentation:
+    """
+    Returns the current instrumentation session (disabled until configured).
+    """
+    return _instrumentation
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times the enclosed block as pipeline stage `name`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _instrumentation.add_span(name, time.perf_counter() - start)
+
+
+def count(name: str, amount: float = 1):
+    """
+    Adds `amount` to counter `name` (e.g. bytes read or frames extracted).
+    """
+    _instrumentation.add_count(name, amount)
+
+
+@contextmanager
+def group_timing(group_name: str):
+    """
+    Attributes spans and counters in the enclosed block to a group and writes
+    the group's timing file when the block ends. The block may be entered
+    again for the same group; its timings then accumulate.
+    """
+    token = _current_group.set(group_name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_group.reset(token)
+        instrumentation = _instrumentation
+        if instrumentation.enabled:
+            with instrumentation.lock:
+                instrumentation.groups.setdefault(group_name, _new_record())["seconds"] += time.perf_counter() - start
+            try:
+                instrumentation.write_group(group_name)
+            except OSError as e:
+                print(f"Warning: could not write timings for {group_name}: {e}")
+
+
+def _format_count(name: str, value: float) -> str:
+    if name.endswith("_bytes"):
+        return f"{value / (1024 * 1024):,.2f} MB" if value >= 1024 * 1024 else f"{value / 1024:,.1f} KB"
+    return f"{value:,.0f}"
+
+
+def print_summary():
+    """
+    Prints where the session's time went, slowest stage first, followed by the counters.
+    """
+    instrumentation = _instrumentation
+    if not instrumentation.enabled:
+        return
+    totals = instrumentation.totals()
+    if not totals["spans"]:
+        return
+
+    wall = time.perf_counter() - instrumentation.started
+    print(f"\n⏱️  STAGE TIMINGS (wall clock {wall:.1f}s)")
+    print(f"{'Stage':<22} {'Calls':>7} {'Total (s)':>11} {'Mean (s)':>10} {'Max (s)':>9}")
+    print("-" * 63)
+    for name, stats in sorted(totals["spans"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{name:<22} {stats['count']:>7} {stats['seconds']:>11.2f} "
+              f"{stats['seconds'] / stats['count']:>10.3f} {stats['max_seconds']:>9.2f}")
+    if totals["counters"]:
+        print("   " + ", ".join(f"{name}: {_format_count(name, value)}" for name, value in sorted(totals["counters"].items())))
+
+    path = instrumentation.write_session()
+    if path:
+        print(f"   Timings saved to: {os.path.dirname(path)}/")
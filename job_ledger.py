@@ -0,0 +1,309 @@
+"""
+Crash-safe job ledger for grading runs.
+
+The ledger is a SQLite file in the results folder with one row per group
+job and per grading component. Each row holds the job's status (pending,
+running, done, failed or retryable), its attempts, its timing and, for
+finished components, the result itself. Every change is committed as it
+happens, so a run that is interrupted (Ctrl+C, a crash, a closed laptop)
+can be resumed exactly where it stopped:
+
+- groups whose job finished are skipped;
+- components finished before the interruption are reused from the ledger,
+  even if the group's results file was never written;
+- components that failed, were left running or were saved with an API
+  failure comment ("Gemini API call failed", ...) are graded again.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from cohort_batch import DEFERRED_COMMENT
+
+
+LEDGER_FILENAME = "job_ledger.sqlite3"
+GROUP_JOB = "group"     # component name of the row tracking a whole group
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+RETRYABLE = "retryable"
+UNFINISHED_STATUSES = (PENDING, RUNNING, FAILED, RETRYABLE)
+
+# Comment saved in place of a grade when a component is queued for the next run (see retry_policy)
+PENDING_COMMENT = "Pending: the API was unavailable after several retries. This component is queued and will be graded on the next run."
+
+# Comments saved in place of a grade when the API call itself failed: from call_gemini_api,
+# the quota placeholder of older runs and the pending placeholder above
+FAILED_RESULT_MARKERS = ("Gemini API call failed", "API returned non-JSON", "Empty response from API",
+                         "API quota exceeded", PENDING_COMMENT)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    group_name TEXT NOT NULL,
+    component TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT,
+    finished_at TEXT,
+    seconds REAL,
+    error TEXT,
+    result TEXT,
+    PRIMARY KEY (group_name, component)
+)
+"""
+
+
+def _comments(result) -> list:
+    items = result if isinstance(result, list) else [result]
+    return [str(item.get("comment", "")) for item in items if isinstance(item, dict)]
+
+
+def result_failure(result):
+    """
+    Returns the failure comment of a component result that holds no real grade, or None.
+    """
+    for comment in _comments(result):
+        if comment.startswith(FAILED_RESULT_MARKERS):
+            return comment
+    return None
+
+
+def failed_components(results: dict) -> list:
+    """
+    Returns the components of saved group results that were stored with an API failure comment.
+    """
+    return [key for key, value in results.items()
+            if isinstance(value, (dict, list)) and result_failure(value)]
+
+
+class JobLedger:
+    """
+    SQLite-backed status of every group and component job. Safe to share between grading threads.
+    """
+
+    def __init__(self, results_dir: str):
+        os.makedirs(results_dir, exist_ok=True)
+        self.path = os.path.join(results_dir, LEDGER_FILENAME)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(_SCHEMA)
+
+    def _write(self, sql: str, params: tuple):
+        with self.lock, self.connection:
+            self.connection.execute(sql, params)
+
+    def _rows(self, sql: str, params: tuple = ()) -> list:
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def start(self, group_name: str, component: str = GROUP_JOB):
+        """
+        Marks a job as running and counts the attempt.
+        """
+        self._write(
+            "INSERT INTO jobs (group_name, component, status, attempts, started_at) VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (group_name, component) DO UPDATE SET status = excluded.status, "
+            "attempts = attempts + 1, started_at = excluded.started_at, error = NULL",
+            (group_name, component, RUNNING, datetime.now().isoformat()))
+
+    def set_status(self, group_name: str, component: str, status: str, error: str = None,
+                   seconds: float = None, result=None):
+        """
+        Records how a job ended. `result` is stored for finished components so they can be reused.
+        """
+        self._write(
+            "INSERT INTO jobs (group_name, component, status, finished_at, seconds, error, result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (group_name, component) DO UPDATE SET status = excluded.status, "
+            "finished_at = excluded.finished_at, seconds = COALESCE(excluded.seconds, seconds), "
+            "error = excluded.error, result = COALESCE(excluded.result, result)",
+            (group_name, component, status, datetime.now().isoformat(), seconds, error,
+             json.dumps(result) if result is not None else None))
+
+    def record_result(self, group_name: str, component: str, result, seconds: float = None):
+        """
+        Records a graded component: done, or retryable if the result is an API failure
+        placeholder, or pending while it waits for a cohort batch job.
+        """
+        failure = result_failure(result)
+        if failure:
+            self.set_status(group_name, component, RETRYABLE, failure, seconds)
+        elif DEFERRED_COMMENT in _comments(result):
+            self.set_status(group_name, component, PENDING, None, seconds)
+        else:
+            self.set_status(group_name, component, DONE, None, seconds, result)
+
+    def finish_group(self, group_name: str, results: dict):
+        """
+        Closes a group's job once its results are saved. Groups saved with
+        components queued for retry or with failed components stay retryable.
+        """
+        unfinished = list(results.get("pending_components", [])) + failed_components(results)
+        if unfinished:
+            self.set_status(group_name, GROUP_JOB, RETRYABLE, f"Unfinished components: {unfinished}")
+        else:
+            self.set_status(group_name, GROUP_JOB, DONE)
+
+    def status(self, group_name: str, component: str = GROUP_JOB):
+        """
+        Returns the job's status, or None if it was never started.
+        """
+        rows = self._rows("SELECT status FROM jobs WHERE group_name = ? AND component = ?", (group_name, component))
+        return rows[0][0] if rows else None
+
+    def unfinished_components(self, group_name: str) -> list:
+        """
+        Returns the group's components that did not finish in an earlier run.
+        """
+        placeholders = ", ".join("?" * len(UNFINISHED_STATUSES))
+        rows = self._rows(f"SELECT component FROM jobs WHERE group_name = ? AND component != ? "
+                          f"AND status IN ({placeholders})", (group_name, GROUP_JOB) + UNFINISHED_STATUSES)
+        return [component for component, in rows]
+
+    def component_results(self, group_name: str) -> dict:
+        """
+        Returns {component: result} for the group's finished components.
+        """
+        rows = self._rows("SELECT component, result FROM jobs WHERE group_name = ? AND component != ? "
+                          "AND status = ? AND result IS NOT NULL", (group_name, GROUP_JOB, DONE))
+        return {component: json.loads(result) for component, result in rows}
+
+    def recover_interrupted(self) -> list:
+        """
+        Marks jobs left running by an interrupted run as retryable.
+
+        Returns:
+            list: Names of the groups that were interrupted
+        """
+        rows = self._rows("SELECT DISTINCT group_name FROM jobs WHERE status = ?", (RUNNING,))
+        self._write("UPDATE jobs SET status = ?, error = ? WHERE status = ?",
+                    (RETRYABLE, "Interrupted before finishing", RUNNING))
+        return [group_name for group_name, in rows]
+
+    def reset_group(self, group_name: str):
+        """
+        Forgets every job of a group, so it is graded from scratch.
+        """
+        self._write("DELETE FROM jobs WHERE group_name = ?", (group_name,))
+
+    def counts(self) -> dict:
+        """
+        Returns the number of group jobs in each status.
+        """
+        return dict(self._rows("SELECT status, COUNT(*) FROM jobs WHERE component = ? GROUP BY status", (GROUP_JOB,)))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def configure_job_ledger(results_dir: str) -> JobLedger:
+    """
+    Opens the job ledger of a results folder and recovers jobs an interrupted run left running.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is not None:
+            _ledger.close()
+        _ledger = JobLedger(results_dir)
+    interrupted = _ledger.recover_interrupted()
+    if interrupted:
+        print(f"🔁 Resuming groups interrupted in an earlier run: {interrupted}")
+    return _ledger
+
+
+def get_job_ledger():
+    """
+    Returns the configured job ledger, or None when no ledger is in use.
+    """
+    return _ledger
+
+
+@contextmanager
+def group_job(group_name: str):
+    """
+    Tracks one attempt at a group in the ledger. An exception marks the group
+    failed; a successful attempt is closed by `finish_group` when its results are saved.
+    """
+    ledger = _ledger
+    if ledger is None:
+        yield
+        return
+    ledger.start(group_name)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        ledger.set_status(group_name, GROUP_JOB, FAILED, str(e) or type(e).__name__, time.perf_counter() - start)
+        raise
+
+
+def finish_group(group_name: str, results: dict):
+    """
+    Closes a group's job in the ledger, if one is configured.
+    """
+    if _ledger is not None:
+        _ledger.finish_group(group_name, results)
+
+
+def plan_group(group_name: str, results_file: str, requeued=()) -> tuple:
+    """
+    Decides how a run picks up a group, from the ledger and its saved results.
+
+    Args:
+        group_name (str): Name of the group
+        results_file (str): Path of the group's saved results
+        requeued: Components of the group on the requeue list
+
+    Returns:
+        tuple: (action, previous_results, redo) where action is 'skip' (finished),
+               'resume' (grade only `redo` and the components missing from
+               `previous_results`) or 'grade' (nothing to reuse)
+    """
+    saved = None
+    if os.path.exists(results_file):
+        try:
+            with open(results_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  Could not load existing results for {group_name}: {e}")
+
+    ledger = _ledger
+    group_status = ledger.status(group_name) if ledger is not None else None
+    group_unfinished = group_status in UNFINISHED_STATUSES
+    if saved is None and group_status == DONE:
+        # The results of a finished group were deleted: grade it again from scratch
+        print(f"🔄 Results of {group_name} were removed, regrading it")
+        ledger.reset_group(group_name)
+        return "grade", None, []
+
+    redo = set(requeued)
+    if ledger is not None:
+        redo.update(ledger.unfinished_components(group_name))
+    if saved is not None:
+        redo.update(failed_components(saved))
+        if not redo and not group_unfinished:
+            return "skip", None, []
+
+    # Components finished after the results were last saved are newer than the saved ones;
+    # they are only reused while the group's own job is still unfinished
+    previous = dict(saved or {})
+    if group_unfinished:
+        previous.update(ledger.component_results(group_name))
+    previous = {key: value for key, value in previous.items() if key not in redo}
+    if saved is None and not previous:
+        return "grade", None, []
+    return "resume", previous, sorted(redo)
@@ -0,0 +1,375 @@
+"""
+Offline stand-in for `genai.Client`, for benchmarking the grading pipeline without quota.
+
+MockGeminiClient answers `models.generate_content`, the Files API calls and
+the Batch API calls the graders use. It can simulate latency and 429/500
+errors at configurable rates. Answers are canned JSON of the shape each
+grading prompt asks for, or a replay of real responses that RecordingClient
+saved from an earlier run. Calls, errors and bytes sent or uploaded are
+counted in `client.stats`. LocalBatchEndpoint answers cohort batch files
+offline for `--batch-endpoint local`.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from google.genai import errors, types
+
+from cohort_batch import parse_batch_output
+from token_budget import IMAGE_TOKEN_ESTIMATE, estimate_text_tokens
+
+
+# Criterion headings of the grading prompts, e.g. "### 2. XR/Game Dev Process (/10)" or "## 2. Testing & Validation (/10 pts)"
+_CRITERION_PATTERN = re.compile(r'^\s*#{2,3}\s*\d+\.\s*(.+?)\s*\(/(\d+(?:\.\d+)?)(?:\s*pts)?\)', re.MULTILINE)
+_MAX_SCORE_PATTERN = re.compile(r'\(/(\d+(?:\.\d+)?)(?:\s*pts)?\)')
+# Component skeleton of the SimpleGrader prompts: "Design": { "score": 0.0, "max_score": 20, ...
+_COMPONENT_PATTERN = re.compile(r'"([^"]+)":\s*\{\s*"score":\s*[\d.]+,\s*"max_score":\s*(\d+(?:\.\d+)?)')
+_REFINE_COUNT_PATTERN = re.compile(r'respond with exactly (\d+) refined comments', re.IGNORECASE)
+
+CANNED_SCORE_FRACTION = 0.75
+CANNED_COMMENT = "Mock assessment: the submission meets most of the criteria with room for improvement."
+
+
+def prompt_components(prompt: str) -> dict:
+    """
+    Returns {component: max score} from the JSON skeleton of a SimpleGrader prompt.
+    """
+    return {name: float(max_score) for name, max_score in _COMPONENT_PATTERN.findall(prompt)}
+
+
+def canned_response(prompt: str) -> str:
+    """
+    Returns a made-up answer in the format a grading prompt asks for.
+
+    Covers the graders' score/comment objects and component lists, the
+    SimpleGrader component report and the comment refiner's single and
+    batched formats. Scores are a fixed fraction of each maximum.
+    """
+    batch_refine = _REFINE_COUNT_PATTERN.search(prompt)
+    if batch_refine:
+        return "\n\n".join(f"REFINED COMMENT {i}:\n{CANNED_COMMENT}" for i in range(1, int(batch_refine.group(1)) + 1))
+    if "ONLY the refined comment text" in prompt:
+        return CANNED_COMMENT
+
+    components = prompt_components(prompt)
+    if components and '"total_score"' in prompt:
+        answer = {"student_name": "Mock Student", "components": {}}
+        for name, max_score in components.items():
+            answer["components"][name] = {"score": round(max_score * CANNED_SCORE_FRACTION, 1),
+                                          "max_score": max_score, "comment": CANNED_COMMENT}
+        answer["total_score"] = round(sum(c["score"] for c in answer["components"].values()), 1)
+        answer["max_total_score"] = 100
+        return json.dumps(answer, indent=2)
+
+    if "list of dictionaries" in prompt:
+        criteria = _CRITERION_PATTERN.findall(prompt) or [("Mock component", "10")]
+        answer = [{"component": name, "score": round(float(max_score) * CANNED_SCORE_FRACTION, 1), "comment": CANNED_COMMENT}
+                  for name, max_score in criteria]
+    else:
+        max_score = _MAX_SCORE_PATTERN.search(prompt)
+        answer = {"score": round(float(max_score.group(1)) * CANNED_SCORE_FRACTION, 1) if max_score else 10,
+                  "comment": CANNED_COMMENT}
+        if "evidence_found" in prompt:
+            answer["evidence_found"] = ["Mock document, team roles section"]
+    # Fenced like the model's own answers
+    return f"```json\n{json.dumps(answer, indent=2)}\n```"
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return str(value)
+
+
+def request_digest(model: str, contents) -> str:
+    """
+    Identifies a request by its model and contents, for recording and replay.
+    """
+    payload = json.dumps([model, contents], default=_jsonable, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _request_content(contents):
+    # (prompt text, number of inline images, payload bytes) of any contents shape the graders send
+    texts, images = [], 0
+    pending = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    while pending:
+        item = pending.pop(0)
+        if isinstance(item, str):
+            texts.append(item)
+        elif isinstance(item, dict):
+            if item.get("text"):
+                texts.append(item["text"])
+            if item.get("type") == "image" or "inlineData" in item or "inline_data" in item:
+                images += 1
+            pending[:0] = item.get("parts", [])
+        elif isinstance(item, types.Content):
+            pending[:0] = item.parts or []
+        elif isinstance(item, types.Part):
+            if item.text:
+                texts.append(item.text)
+            if item.inline_data is not None or item.file_data is not None:
+                images += 1
+    size = len(json.dumps(contents, default=_jsonable).encode('utf-8'))
+    return "\n".join(texts), images, size
+
+
+def _make_response(text: str, prompt_tokens: int) -> types.GenerateContentResponse:
+    output_tokens = estimate_text_tokens(text)
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]),
+                                    finish_reason=types.FinishReason.STOP)],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens)
+    )
+
+
+class _MockModels:
+    def __init__(self, client):
+        self.client = client
+
+    def generate_content(self, *, model: str, contents, config=None):
+        mock = self.client
+        prompt, images, size = _request_content(contents)
+        mock._count("calls")
+        mock._count("bytes_sent", size)
+        mock._wait(mock.latency, mock.jitter)
+        mock._maybe_fail()
+
+        text = None
+        if mock.replay is not None:
+            entry = mock.replay.get(request_digest(model, contents))
+            mock._count("replay_hits" if entry else "replay_misses")
+            text = entry["text"] if entry else None
+        if text is None:
+            text = mock.responder(prompt)
+        return _make_response(text, estimate_text_tokens(prompt) + images * IMAGE_TOKEN_ESTIMATE)
+
+
+class _MockFiles:
+    def __init__(self, client):
+        self.client = client
+        self.files = {}          # name -> (types.File, bytes)
+
+    def upload(self, *, file, config=None):
+        mock = self.client
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as f:
+                data = f.read()
+            display_name = os.path.basename(file)
+        else:
+            data = file.read()
+            display_name = "upload"
+        mock._count("files_uploaded")
+        mock._count("bytes_uploaded", len(data))
+        mock._wait(mock.latency + len(data) / mock.upload_bytes_per_second, 0)
+        mock._maybe_fail()
+
+        with mock.lock:
+            name = f"files/mock-{len(self.files) + 1}"
+            uploaded = types.File(
+                name=name, uri=f"https://mock.local/v1beta/{name}", display_name=getattr(config, "display_name", None) or display_name,
+                mime_type=getattr(config, "mime_type", None), size_bytes=len(data), state=types.FileState.ACTIVE)
+            self.files[name] = (uploaded, data)
+        return uploaded
+
+    def get(self, *, name: str, config=None):
+        return self.files[name][0]
+
+    def delete(self, *, name: str, config=None):
+        self.files.pop(name, None)
+
+    def download(self, *, file, config=None) -> bytes:
+        name = file if isinstance(file, str) else file.name
+        return self.files[name][1]
+
+
+class _MockBatches:
+    def __init__(self, client):
+        self.client = client
+        self.jobs = {}
+
+    def create(self, *, model: str, src, config=None):
+        # The whole job is answered at once; each line goes through generate_content without errors
+        mock = self.client
+        lines = mock.files.download(file=src).decode('utf-8').splitlines()
+        output = []
+        for line in filter(None, (line.strip() for line in lines)):
+            entry = json.loads(line)
+            prompt, images, _ = _request_content(entry["request"]["contents"])
+            output.append(json.dumps({"key": entry["key"], "response": {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": mock.responder(prompt)}]}}]}}))
+        mock._count("batch_requests", len(output))
+
+        with mock.lock:
+            name = f"batches/mock-{len(self.jobs) + 1}"
+            result_name = f"files/mock-batch-{len(self.jobs) + 1}"
+            mock.files.files[result_name] = (types.File(name=result_name), ("\n".join(output) + "\n").encode('utf-8'))
+            job = types.BatchJob(name=name, model=model, state=types.JobState.JOB_STATE_SUCCEEDED,
+                                 dest=types.BatchJobDestination(file_name=result_name))
+            self.jobs[name] = job
+        return job
+
+    def get(self, *, name: str, config=None):
+        return self.jobs[name]
+
+
+class MockGeminiClient:
+    """
+    Drop-in replacement for `genai.Client` that never leaves the machine.
+
+    Args:
+        latency (float): Seconds every call takes
+        jitter (float): Extra random seconds added to each call
+        rate_429 (float): Fraction of calls failing with 429 RESOURCE_EXHAUSTED
+        rate_500 (float): Fraction of calls failing with 500 INTERNAL
+        retry_delay (float): Retry delay the simulated 429 errors ask for
+        upload_mbps (float): Simulated upload bandwidth for the Files API
+        responder: Callable (prompt text) -> response text (default: canned_response)
+        replay_path (str): JSONL file written by RecordingClient; recorded requests get their recorded answers
+        seed (int): Seed for the random latency and errors, for repeatable runs
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, rate_500: float = 0.0,
+                 retry_delay: float = 1.0, upload_mbps: float = 50.0, responder=None, replay_path: str = None,
+                 seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.retry_delay = retry_delay
+        self.upload_bytes_per_second = upload_mbps * 125000
+        self.responder = responder or canned_response
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "errors_429": 0, "errors_500": 0, "bytes_sent": 0,
+                      "files_uploaded": 0, "bytes_uploaded": 0, "batch_requests": 0,
+                      "replay_hits": 0, "replay_misses": 0}
+        self.replay = load_recording(replay_path) if replay_path else None
+
+        self.models = _MockModels(self)
+        self.files = _MockFiles(self)
+        self.batches = _MockBatches(self)
+
+    def _count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _wait(self, seconds: float, jitter: float):
+        with self.lock:
+            seconds += self.random.uniform(0, jitter) if jitter else 0
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _maybe_fail(self):
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.rate_429:
+            self._count("errors_429")
+            raise errors.ClientError(429, {"error": {
+                "code": 429, "status": "RESOURCE_EXHAUSTED",
+                "message": "Resource has been exhausted (simulated by the mock client).",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{self.retry_delay:g}s"}]}})
+        if roll < self.rate_429 + self.rate_500:
+            self._count("errors_500")
+            raise errors.ServerError(500, {"error": {
+                "code": 500, "status": "INTERNAL", "message": "Internal error (simulated by the mock client)."}})
+
+
+def load_recording(path: str) -> dict:
+    """
+    Loads a RecordingClient file into {request digest: entry}.
+    """
+    recording = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recording[entry["key"]] = entry
+    print(f"🎞️  Loaded {len(recording)} recorded responses from {path}")
+    return recording
+
+
+class _RecordingModels:
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def generate_content(self, *, model: str, contents, config=None):
+        response = self.recorder.client.models.generate_content(model=model, contents=contents, config=config)
+        usage = getattr(response, "usage_metadata", None)
+        entry = {"key": request_digest(model, contents), "model": model, "text": response.text,
+                 "total_tokens": getattr(usage, "total_token_count", None)}
+        with self.recorder.lock:
+            with open(self.recorder.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+        return response
+
+
+class RecordingClient:
+    """
+    Wraps a real `genai.Client` and appends every generate_content answer to a
+    JSONL file, so the run can later be replayed with MockGeminiClient(replay_path=...).
+    Other attributes (files, batches) are passed through unchanged.
+    """
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.models = _RecordingModels(self)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class LocalBatchEndpoint:
+    """
+    Offline stand-in for the Batch API with the same run() interface.
+
+    Each request is answered by `client.models.generate_content` when a
+    client is given (e.g. a local mock), otherwise by `responder(request)`,
+    otherwise with a canned answer of the expected shape. The
+    output file is written in the Batch API format.
+    """
+
+    def __init__(self, client=None, responder=None):
+        self.client = client
+        self.responder = responder
+
+    def _answer(self, model: str, request: dict) -> str:
+        if self.client is not None:
+            response = self.client.models.generate_content(model=model, contents=request["contents"])
+            return response.text
+        if self.responder is not None:
+            return self.responder(request)
+
+        prompt = " ".join(part.get("text", "") for part in request["contents"][0]["parts"])
+        return canned_response(prompt)
+
+    def run(self, jsonl_path: str, model: str, display_name: str) -> dict:
+        print(f"🚚 Running batch {display_name} on the local stand-in endpoint")
+        output_lines = []
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                try:
+                    text = self._answer(model, entry["request"])
+                    output = {"key": entry["key"], "response": {
+                        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}}
+                except Exception as e:
+                    output = {"key": entry["key"], "error": {"message": str(e)}}
+                output_lines.append(json.dumps(output))
+
+        with open(jsonl_path.replace('.jsonl', '_results.jsonl'), 'w', encoding='utf-8') as f:
+            f.write("\n".join(output_lines) + "\n")
+        return parse_batch_output(output_lines)
@@ -4,6 +4,11 @@ Simple script to run the assignment organizer on the course zip file.
 Edit the ZIP_FILE_PATH variable below to point to your zip file.
 """
 
+import argparse
+import atexit
+import fnmatch
+import functools
+import hashlib
 import os
 import zipfile
 import shutil
@@ -11,93 +16,437 @@ import glob
 import re
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+
+# Limits for zips inside group folders. Nested archives are normal in submissions;
+# archives that expand by orders of magnitude (zip bombs) are left unextracted.
+MAX_ZIP_DEPTH = 10
+MAX_COMPRESSION_RATIO = 200
+MIN_RATIO_CHECK_BYTES = 10 * 1024 * 1024  # small files (e.g. blank text) may compress extremely well
+MAX_GROUP_EXTRACTED_BYTES = 20 * 1024 ** 3
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+# How organized copies are made: 'auto' tries a copy-on-write clone, then a real copy.
+# Hardlinks are only made on request ('hardlink'): they share their data with the
+# original, so an edit to an organized file would change the student's file too.
+# are made read-only to keep an edit to either one from changing both.
+PLACEMENT_MODES = ("auto", "hardlink", "reflink", "copy")
+FICLONE = 0x40049409  # Linux ioctl that clones a file on Btrfs, XFS and other CoW filesystems
+
+# Presentation to PDF conversion: converted PDFs are kept by the presentation's content hash
+PDF_CACHE_DIRNAME = ".presentation_pdf_cache"
+DEFAULT_CONVERTERS = 2              # LibreOffice instances converting at the same time
+LIBREOFFICE_START_TIMEOUT = 120     # seconds allowed for a LibreOffice run to start up...
+LIBREOFFICE_TIMEOUT_PER_FILE = 120  # ...plus this much per presentation in its batch
+LIBREOFFICE_CANDIDATES = ('soffice', 'libreoffice', '/Applications/LibreOffice.app/Contents/MacOS/soffice')
+
+
+class ZipBombError(Exception):
+    """Raised when an archive would expand far beyond what a real submission needs."""
+
+
+def safe_member_path(member_name: str) -> Optional[Path]:
+    """Return an archive member's path relative to the extraction folder.
+
+    Like ZipFile.extract, drive letters and '..' components are dropped so a member
+    can never be written outside the folder. Returns None if nothing is left.
+    """
+    parts = [part for part in member_name.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    if parts and parts[0].endswith(':'):
+        parts = parts[1:]
+    return Path(*parts) if parts else None
+
+
+def _reflink(source: Path, dest: Path) -> bool:
+    """Clone source to dest without copying its data, where the filesystem supports it."""
+    if sys.platform.startswith('linux'):
+        import fcntl
+        try:
+            with open(source, 'rb') as src, open(dest, 'xb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dest.unlink(missing_ok=True)
+            return False
+        shutil.copystat(source, dest)
+        return True
+    if sys.platform == 'darwin':
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.clonefile(os.fsencode(source), os.fsencode(dest), 0) == 0
+    return False
+
+
+def place_file(source: Path, dest: Path, mode: str = "auto") -> str:
+    """Put a copy of source at dest, replacing any existing file, as cheaply as `mode` allows.
+
+    'hardlink' and 'reflink' fall back to a real copy when the link or clone is not
+    possible (e.g. a different filesystem); 'auto' tries a clone. Only 'hardlink'
+    makes a hardlink, which is the same file as the source, not a copy of it.
+
+    Returns:
+        str: How the file was placed: 'hardlink', 'reflink' or 'copy'
+    """
+    if dest.exists() or dest.is_symlink():
+        dest.unlink()
+    
+    if mode in ("auto", "reflink") and _reflink(Path(source), Path(dest)):
+        return "reflink"
+    if mode == "hardlink":
+        try:
+            os.link(source, dest)
+            return "hardlink"
+        except OSError:
+            pass
+    
+    shutil.copy2(source, dest)
+    return "copy"
+
+
+@functools.lru_cache(maxsize=None)
+def find_libreoffice() -> Optional[str]:
+    """Locate the LibreOffice binary once per process, or None if it is not installed."""
+    for candidate in LIBREOFFICE_CANDIDATES:
+        found = shutil.which(candidate)
+        if found:
+            return found
+    return None
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(EXTRACT_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PresentationConverter:
+    """Converts presentations to PDF with LibreOffice, many files per LibreOffice start.
+
+    Presentations are converted in batches: one headless `--convert-to` run takes
+    a whole list of files, and up to `workers` runs go at the same time, each with
+    its own user profile that stays warm until the converter is closed (at the
+    latest when the process exits). Converted
+    PDFs are kept in `cache_dir` under the presentation's content hash, so an
+    unchanged deck (or the same template in several groups) is converted once.
+    """
+
+    def __init__(self, cache_dir: Path, workers: int = DEFAULT_CONVERTERS):
+        self.cache_dir = Path(cache_dir)
+        self.workers = max(1, workers)
+        self.profile_root = None    # temporary folder of the LibreOffice profiles, made on first use
+
+    def close(self) -> None:
+        """Delete the LibreOffice profiles; a later conversion creates fresh ones."""
+        if self.profile_root is not None:
+            shutil.rmtree(self.profile_root, ignore_errors=True)
+            self.profile_root = None
+
+    def convert(self, paths: List[Path]) -> Dict[Path, Optional[Path]]:
+        """Convert presentations to PDF.
+
+        Returns:
+            Dict[Path, Optional[Path]]: The cached PDF of each presentation, or None if it could not be converted
+        """
+        digests = {}
+        for path in paths:
+            try:
+                digests[path] = file_digest(path)
+            except OSError as e:
+                print(f"    ⚠ Could not read {path.name}: {e}")
+        
+        missing = {}
+        for path, digest in digests.items():
+            if not (self.cache_dir / f"{digest}.pdf").exists():
+                missing.setdefault(digest, path)
+        
+        if missing and find_libreoffice():
+            print(f"    Converting {len(missing)} presentations with LibreOffice "
+                  f"({len(digests) - len(missing)} reused from the cache or duplicates)...")
+            self._convert_missing(missing)
+        
+        results = {}
+        for path in paths:
+            pdf = self.cache_dir / f"{digests[path]}.pdf" if path in digests else None
+            results[path] = pdf if pdf is not None and pdf.exists() else None
+        return results
+
+    def _convert_missing(self, missing: Dict[str, Path]) -> None:
+        staging = Path(tempfile.mkdtemp(prefix="organizer_convert_"))
+        try:
+            # Inputs are staged under their hash so every output lands on a unique, cacheable name
+            staged = []
+            for digest, path in missing.items():
+                staged_path = staging / f"{digest}{path.suffix.lower()}"
+                place_file(path, staged_path, "reflink")
+                staged.append(staged_path)
+            
+            batches = [staged[slot::self.workers] for slot in range(self.workers) if staged[slot::self.workers]]
+            if self.profile_root is None:
+                self.profile_root = Path(tempfile.mkdtemp(prefix="organizer_libreoffice_"))
+                atexit.register(self.close)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+                list(executor.map(lambda item: self._run_batch(item[0], item[1], staging), enumerate(batches)))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _run_batch(self, slot: int, files: List[Path], staging: Path) -> None:
+        """Convert a list of files in one LibreOffice run; on a crash or timeout, retry them one by one."""
+        outdir = staging / f"out_{slot}"
+        outdir.mkdir(exist_ok=True)
+        profile = self.profile_root / f"slot_{slot}"
+        cmd = [find_libreoffice(), f"-env:UserInstallation={profile.as_uri()}", '--headless', '--norestore',
+               '--convert-to', 'pdf', '--outdir', str(outdir)] + [str(f) for f in files]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    timeout=LIBREOFFICE_START_TIMEOUT + LIBREOFFICE_TIMEOUT_PER_FILE * len(files))
+            succeeded = result.returncode == 0
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError):
+            succeeded = False
+        
+        # Move finished PDFs into the cache in one step so a half-written PDF is never cached
+        remaining = []
+        for staged_path in files:
+            output = outdir / f"{staged_path.stem}.pdf"
+            if output.exists() and output.stat().st_size > 0:
+                os.replace(output, self.cache_dir / output.name)
+            else:
+                remaining.append(staged_path)
+        
+        if remaining and not succeeded and len(files) > 1:
+            for staged_path in remaining:
+                self._run_batch(slot, [staged_path], staging)
+
+
+class IndexEntry(NamedTuple):
+    path: Path
+    name: str
+    suffix: str     # lower-case
+    size: int       # 0 for directories
+    is_dir: bool
+
+
+class DirectoryIndex:
+    """Every file and folder below a group folder, listed with one os.scandir walk.
+
+    Project detection, categorizing and source code collection all query this
+    index instead of walking the tree again with glob/rglob. Entries are listed
+    in the same order rglob("*") yields them: each folder's contents, then its
+    subfolders in turn. The index is not updated, so it must be built after the
+    group's zips are extracted.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.entries: List[IndexEntry] = []
+        self.children: Dict[Path, List[IndexEntry]] = {}
+        self.by_suffix: Dict[str, List[IndexEntry]] = {}
+        self.names = set()
+        self.total_size = 0
+
+        pending = [self.root]
+        while pending:
+            folder = pending.pop()
+            listed = []
+            try:
+                with os.scandir(folder) as scan:
+                    for item in scan:
+                        is_dir = item.is_dir(follow_symlinks=False)
+                        try:
+                            size = 0 if is_dir else item.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            size = 0
+                        path = folder / item.name
+                        entry = IndexEntry(path, item.name, path.suffix.lower(), size, is_dir)
+                        listed.append(entry)
+                        self.by_suffix.setdefault(entry.suffix, []).append(entry)
+                        self.names.add(item.name)
+                        self.total_size += size
+            except OSError as e:
+                print(f"  Warning: could not list {folder}: {e}")
+            self.children[folder] = listed
+            self.entries.extend(listed)
+            pending.extend(entry.path for entry in reversed(listed) if entry.is_dir)
+
+    def files(self) -> List[IndexEntry]:
+        return [entry for entry in self.entries if not entry.is_dir]
+
+    def with_suffix(self, *suffixes: str) -> List[IndexEntry]:
+        """Entries whose lower-case suffix is one of `suffixes`."""
+        return [entry for suffix in suffixes for entry in self.by_suffix.get(suffix, [])]
+
+    def has_name(self, *names: str) -> bool:
+        return any(name in self.names for name in names)
+
+    def walk(self, folder: Path) -> Iterator[IndexEntry]:
+        """Entries below `folder`, in the order folder.rglob("*") yields them."""
+        pending = [Path(folder)]
+        while pending:
+            listed = self.children.get(pending.pop(), [])
+            yield from listed
+            pending.extend(entry.path for entry in reversed(listed) if entry.is_dir)
+
+    def match(self, pattern: str, folder: Path = None) -> List[IndexEntry]:
+        """Entries whose name matches a glob pattern, directly in `folder` if given, else anywhere."""
+        candidates = self.children.get(Path(folder), []) if folder is not None else self.entries
+        return [entry for entry in candidates if fnmatch.fnmatchcase(entry.name, pattern)]
+
+
+def prepare_group(base_path: str, group_folder: str, course_dir: str, extract: bool = True,
+                  placement: str = "auto") -> list:
+    """Extract a group's zip files and organize the group. Runs in a worker process with --jobs.
+
+    Returns:
+        list: The group's presentations, left for the parent process to convert in one batch
+    """
+    organizer = AssignmentOrganizer(base_path, placement=placement)
+    organizer.deferred_presentations = []
+    if extract:
+        organizer.extract_group_zips(Path(group_folder))
+    organizer.organize_group_folder(Path(group_folder), Path(course_dir))
+    return organizer.deferred_presentations
 
 
 class AssignmentOrganizer:
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, placement: str = "auto", converters: int = DEFAULT_CONVERTERS):
         self.base_path = Path(base_path)
         self.extracted_folders = []
+        self.placement = placement
+        self.placement_counts = {}
+        self.converter = PresentationConverter(self.base_path / PDF_CACHE_DIRNAME, converters)
+        # A list while presentations are collected to be converted together after all groups
+        self.deferred_presentations = None
+    
+    def place_file(self, source: Path, dest: Path, mode: Optional[str] = None) -> None:
+        """Place an organized copy of a file using `mode`, or the configured placement mode."""
+        method = place_file(source, dest, mode or self.placement)
+        self.placement_counts[method] = self.placement_counts.get(method, 0) + 1
         
     def extract_group_zips(self, group_folder: Path) -> None:
-        """Recursively extract all zip files within a group folder."""
+        """Recursively extract all zip files within a group folder.
+
+        The folder is walked once to fill a work stack of archives. Each archive is
+        streamed member by member straight to its final place next to the archive,
+        and any zip it contained is pushed onto the stack, so nested archives are
+        handled depth-first without re-scanning the folder.
+        """
         print(f"Processing group folder: {group_folder.name}")
         
-        # Recursively extract all zip files until no more are found
+        found = [Path(root) / name for root, dirs, files in os.walk(group_folder)
+                 for name in files if name.lower().endswith('.zip')]
+        stack = [(zip_file, 1) for zip_file in reversed(found)]
+        remaining_bytes = MAX_GROUP_EXTRACTED_BYTES
         extracted_count = 0
-        max_iterations = 10  # Prevent infinite loops
-        iteration = 0
+        deepest = 0
         
-        while iteration < max_iterations:
-            # Find all zip files in the group folder (including subdirectories)
-            zip_files = list(group_folder.rglob("*.zip"))
+        while stack:
+            zip_file, depth = stack.pop()
+            if depth > MAX_ZIP_DEPTH:
+                print(f"    Warning: {zip_file.name} is nested more than {MAX_ZIP_DEPTH} levels deep, left as is")
+                continue
             
-            if not zip_files:
-                break  # No more zip files to extract
-                
-            iteration += 1
-            print(f"  Extraction iteration {iteration}: Found {len(zip_files)} zip files")
+            print(f"    Extracting: {zip_file.name}")
+            try:
+                written, nested, size = self._extract_zip_in_place(zip_file, remaining_bytes)
+            except zipfile.BadZipFile:
+                print(f"    Warning: {zip_file.name} is not a valid zip file")
+                continue
+            except ZipBombError as e:
+                print(f"    Warning: {zip_file.name} was not extracted: {e}")
+                continue
+            except Exception as e:
+                print(f"    Error extracting {zip_file.name}: {e}")
+                continue
             
-            for zip_file in zip_files:
-                print(f"    Extracting: {zip_file.name}")
-                try:
-                    # Create a temporary extraction directory
-                    temp_extract_dir = zip_file.parent / f"temp_extract_{zip_file.stem}"
-                    temp_extract_dir.mkdir(exist_ok=True)
-                    
-                    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                        # Extract to temporary directory
-                        zip_ref.extractall(temp_extract_dir)
-                    
-                    # Move all contents from temp directory to the zip file's location
-                    self.move_extracted_contents(temp_extract_dir, zip_file.parent)
-                    
-                    # Clean up temp directory
-                    shutil.rmtree(temp_extract_dir)
-                    
-                    # Delete the zip file after extraction
-                    zip_file.unlink()
-                    print(f"    Deleted: {zip_file.name}")
-                    extracted_count += 1
-                    
-                except zipfile.BadZipFile:
-                    print(f"    Warning: {zip_file.name} is not a valid zip file")
-                except Exception as e:
-                    print(f"    Error extracting {zip_file.name}: {e}")
+            # Delete the zip file after extraction
+            zip_file.unlink()
+            print(f"    Deleted: {zip_file.name} ({len(written)} files extracted)")
+            remaining_bytes -= size
+            extracted_count += 1
+            deepest = max(deepest, depth)
+            stack.extend((path, depth + 1) for path in reversed(nested))
         
         if extracted_count > 0:
-            print(f"  Total extracted: {extracted_count} zip files in {iteration} iterations")
+            print(f"  Total extracted: {extracted_count} zip files, nested up to {deepest} levels deep")
         else:
             print(f"  No zip files found in {group_folder.name}")
     
-    def move_extracted_contents(self, source_dir: Path, target_dir: Path) -> None:
-        """Move all contents from source directory to target directory."""
-        for item in source_dir.rglob("*"):
-            if item.is_file():
-                # Calculate relative path from source_dir
-                relative_path = item.relative_to(source_dir)
-                target_path = target_dir / relative_path
-                
-                # Create parent directories if they don't exist
-                target_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Handle file name conflicts
-                counter = 1
-                original_target = target_path
-                while target_path.exists():
-                    name_part = original_target.stem
-                    suffix_part = original_target.suffix
-                    target_path = original_target.parent / f"{name_part}_{counter}{suffix_part}"
-                    counter += 1
-                
-                # Move the file
-                shutil.move(str(item), str(target_path))
-                print(f"    Moved: {relative_path} → {target_path.name}")
+    def _extract_zip_in_place(self, zip_file: Path, byte_budget: int):
+        """Extract a zip file into its own folder, renaming files that would overwrite others.
+
+        Returns the extracted files, the zip files among them and the number of bytes
+        written. Raises ZipBombError, before anything is written, if the archive would
+        expand beyond `byte_budget` or a member is compressed implausibly well.
+        """
+        target_dir = zip_file.parent
+        written = []
+        nested = []
+        
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            members = zip_ref.infolist()
+            total_size = sum(info.file_size for info in members)
+            if total_size > byte_budget:
+                raise ZipBombError(f"it would expand to {total_size / 1024 ** 2:,.0f} MB, "
+                                   f"over the {byte_budget / 1024 ** 2:,.0f} MB left for this group")
+            for info in members:
+                if (info.file_size > MIN_RATIO_CHECK_BYTES
+                        and info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1)):
+                    raise ZipBombError(f"{info.filename} expands {info.file_size // max(info.compress_size, 1)}x "
+                                       f"(limit {MAX_COMPRESSION_RATIO}x)")
+            
+            try:
+                for info in members:
+                    relative_path = safe_member_path(info.filename)
+                    if relative_path is None:
+                        continue
+                    if info.is_dir():
+                        (target_dir / relative_path).mkdir(parents=True, exist_ok=True)
+                        continue
+                    
+                    target_path = self._stream_member(zip_ref, info, target_dir / relative_path)
+                    written.append(target_path)
+                    if target_path.suffix.lower() == '.zip':
+                        nested.append(target_path)
+            except BaseException:
+                # Leave the folder as it was so the archive can be retried
+                for path in written:
+                    path.unlink(missing_ok=True)
+                raise
+        
+        return written, nested, total_size
     
-    def find_source_code_items(self, directory: Path) -> List[Path]:
+    def _stream_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, target_path: Path) -> Path:
+        """Copy one archive member to target_path (or name_1, name_2, ... if taken) in chunks."""
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Exclusive creation claims the name in one step instead of probing with exists()
+        candidate = target_path
+        counter = 1
+        while True:
+            try:
+                output = open(candidate, 'xb')
+                break
+            except FileExistsError:
+                candidate = target_path.parent / f"{target_path.stem}_{counter}{target_path.suffix}"
+                counter += 1
+        
+        try:
+            with output, zip_ref.open(info) as source:
+                shutil.copyfileobj(source, output, EXTRACT_CHUNK_SIZE)
+        except BaseException:
+            candidate.unlink(missing_ok=True)
+            raise
+        return candidate
+    
+    def find_source_code_items(self, directory: Path, index: Optional[DirectoryIndex] = None) -> List[Path]:
         """Find source code files and folders."""
-        source_items = []
+        index = index or DirectoryIndex(directory)
         
         # Common patterns for source code
         code_patterns = [
@@ -106,20 +455,15 @@ class AssignmentOrganizer:
             "*.h", "*.hpp", "*.unity", "*.meta"
         ]
         
+        # A dict keeps the first-found order while dropping duplicates in constant time
+        unique_items = {}
         for pattern in code_patterns:
-            items = list(directory.glob(pattern))
-            items.extend(directory.rglob(pattern))
-            source_items.extend(items)
-        
-        # Remove duplicates and ensure they're within the directory
-        unique_items = []
-        for item in source_items:
-            if item not in unique_items and directory in item.parents or item.parent == directory:
-                unique_items.append(item)
+            for entry in index.match(pattern):
+                unique_items.setdefault(entry.path, None)
         
-        return unique_items
+        return list(unique_items)
     
-    def identify_file_types(self, directory: Path) -> Dict[str, List[Path]]:
+    def identify_file_types(self, directory: Path, index: Optional[DirectoryIndex] = None) -> Dict[str, List[Path]]:
         """Categorize files by type."""
         file_types = {
             'pdf': [],
@@ -139,10 +483,8 @@ class AssignmentOrganizer:
         }
         
         # Get all files in directory and subdirectories
-        all_files = []
-        for item in directory.rglob("*"):
-            if item.is_file() and not item.name.startswith('.'):
-                all_files.append(item)
+        index = index or DirectoryIndex(directory)
+        all_files = [entry.path for entry in index.files() if not entry.name.startswith('.')]
         
         # Categorize files
         for file_path in all_files:
@@ -269,22 +611,30 @@ class AssignmentOrganizer:
         for subdir in subdirs.values():
             subdir.mkdir(exist_ok=True)
         
+        # List the group's files once; every step below queries this index
+        index = DirectoryIndex(group_folder)
+        print(f"  Indexed {len(index.entries)} items ({index.total_size / 1024 ** 2:,.1f} MB)")
+        
         # Detect project type and generate report
-        project_type = self.detect_project_type(group_folder)
+        project_type = self.detect_project_type(group_folder, index)
         print(f"  Detected project type: {project_type}")
         
         # Identify and categorize files
-        file_types = self.identify_file_types(group_folder)
+        file_types = self.identify_file_types(group_folder, index)
         
         # Move and rename files
         self.move_categorized_files(file_types, subdirs, group_name, group_folder)
         
         # Handle source code folders
-        self.handle_source_code_folders(group_folder, subdirs['source_code'], group_name)
+        self.handle_source_code_folders(group_folder, subdirs['source_code'], group_name, index)
         
         # Generate organization report
         self.generate_organization_report(organized_path, group_name, file_types, project_type)
         
+        if self.placement_counts:
+            print("  Placed files: " + ", ".join(f"{number} by {method}" for method, number in sorted(self.placement_counts.items())))
+            self.placement_counts = {}
+        
         print(f"✓ Organized {group_name} → organized_assignments/{organized_path.name}")
     
     def move_categorized_files(self, file_types: Dict[str, List[Path]], 
@@ -321,58 +671,69 @@ class AssignmentOrganizer:
                             dest_path = dest_folder / f"{name_part}_{counter}{suffix_part}"
                             counter += 1
                         
-                        shutil.copy2(file_path, dest_path)
+                        self.place_file(file_path, dest_path)
                         print(f"  Copied: {file_path.name} → {dest_path.name}")
                         
                     except Exception as e:
                         print(f"  Error copying {file_path.name}: {e}")
         
         # Handle presentations - convert to PDF and put in documents folder
-        if 'presentation' in file_types and file_types['presentation']:
-            documents_folder = subdirs['documents']
-            
-            for presentation_path in file_types['presentation']:
-                # Skip files that are already in the organized folder
-                if 'organized' in str(presentation_path):
-                    continue
-                
-                print(f"  Converting presentation: {presentation_path.name}")
+        # (skipping files that are already in the organized folder)
+        presentations = [(presentation_path, subdirs['documents'], group_name)
+                         for presentation_path in file_types.get('presentation', [])
+                         if 'organized' not in str(presentation_path)]
+        if self.deferred_presentations is not None:
+            for presentation_path, _, _ in presentations:
+                print(f"  Queued presentation for conversion: {presentation_path.name}")
+            self.deferred_presentations.extend(presentations)
+        else:
+            self.convert_presentations(presentations)
+    
+    def convert_presentations(self, presentations: list) -> None:
+        """Convert (presentation, documents folder, group name) items to PDF with as few LibreOffice runs as possible."""
+        if not presentations:
+            return
+        converted = self.converter.convert([presentation_path for presentation_path, _, _ in presentations])
+        
+        for presentation_path, documents_folder, group_name in presentations:
+            print(f"  Converting presentation: {presentation_path.name}")
+            try:
+                # Convert presentation to PDF and save in documents folder
+                self.convert_presentation_to_pdf(presentation_path, documents_folder, group_name, converted)
+            except Exception as e:
+                print(f"  Error processing presentation {presentation_path.name}: {e}")
+                # Fallback: copy original file to documents folder with group prefix
                 try:
-                    # Convert presentation to PDF and save in documents folder
-                    converted_file = self.convert_presentation_to_pdf(
-                        presentation_path, documents_folder, group_name
-                    )
+                    fallback_name = self.rename_with_group_prefix(presentation_path, group_name)
+                    fallback_path = documents_folder / fallback_name
                     
-                except Exception as e:
-                    print(f"  Error processing presentation {presentation_path.name}: {e}")
-                    # Fallback: copy original file to documents folder with group prefix
-                    try:
-                        fallback_name = self.rename_with_group_prefix(presentation_path, group_name)
-                        fallback_path = documents_folder / fallback_name
-                        
-                        counter = 1
-                        while fallback_path.exists():
-                            name_part = fallback_path.stem
-                            suffix_part = fallback_path.suffix
-                            fallback_path = documents_folder / f"{name_part}_{counter}{suffix_part}"
-                            counter += 1
-                        
-                        shutil.copy2(presentation_path, fallback_path)
-                        print(f"  Copied original: {presentation_path.name} → {fallback_path.name}")
-                    except Exception as copy_error:
-                        print(f"  Failed to copy original presentation: {copy_error}")
-    
+                    counter = 1
+                    while fallback_path.exists():
+                        name_part = fallback_path.stem
+                        suffix_part = fallback_path.suffix
+                        fallback_path = documents_folder / f"{name_part}_{counter}{suffix_part}"
+                        counter += 1
+                    
+                    self.place_file(presentation_path, fallback_path)
+                    print(f"  Copied original: {presentation_path.name} → {fallback_path.name}")
+                except Exception as copy_error:
+                    print(f"  Failed to copy original presentation: {copy_error}")
+
     def handle_source_code_folders(self, group_folder: Path, 
-                                 source_dest: Path, group_name: str) -> None:
+                                 source_dest: Path, group_name: str,
+                                 index: Optional[DirectoryIndex] = None) -> None:
         """Handle source code folders and files, copying only assessment-useful files."""
+        index = index or DirectoryIndex(group_folder)
         
         # Look for folders that might contain source code
         code_folder_patterns = ['*script*', '*code*', '*src*', '*source*']
         code_folders = []
         
         for pattern in code_folder_patterns:
-            folders = list(group_folder.glob(pattern))
-            code_folders.extend([f for f in folders if f.is_dir() and 'organized' not in str(f)])
+            for entry in index.match(pattern, group_folder):
+                # A folder matching several patterns (e.g. "source_code") is copied once
+                if entry.is_dir and 'organized' not in str(entry.path) and entry.path not in code_folders:
+                    code_folders.append(entry.path)
         
         # Copy source code folders selectively (excluding .meta files and other unnecessary files)
         for folder in code_folders:
@@ -385,16 +746,16 @@ class AssignmentOrganizer:
                 dest_path.mkdir(parents=True, exist_ok=True)
                 
                 # Copy only useful files
-                self.copy_source_code_selectively(folder, dest_path, group_name)
+                self.copy_source_code_selectively(folder, dest_path, group_name, index)
                 print(f"  Copied source folder: {folder.name} → {dest_folder_name}")
             except Exception as e:
                 print(f"  Error copying source folder {folder.name}: {e}")
         
         # Copy individual assessment-useful source files
         individual_files = []
-        for item in group_folder.rglob("*"):
-            if (item.is_file() and 
-                self.is_source_code_file(item) and 
+        for entry in index.files():
+            item = entry.path
+            if (self.is_source_code_file(item) and 
                 'organized' not in str(item) and
                 not any(str(item).startswith(str(folder)) for folder in code_folders)):
                 individual_files.append(item)
@@ -414,7 +775,7 @@ class AssignmentOrganizer:
                         dest_file = misc_folder / f"{stem}_{counter}{suffix}"
                         counter += 1
                     
-                    shutil.copy2(file_path, dest_file)
+                    self.place_file(file_path, dest_file)
                 except Exception as e:
                     print(f"  Error copying individual file {file_path.name}: {e}")
             
@@ -423,7 +784,7 @@ class AssignmentOrganizer:
         # Clean up any existing unnecessary files in the destination
         self.clean_unnecessary_files(source_dest)
     
-    def process_course_zip(self, zip_file_path: str) -> None:
+    def process_course_zip(self, zip_file_path: str, jobs: int = 1) -> None:
         """Main method to process a course assignment zip file."""
         zip_path = Path(zip_file_path)
         
@@ -466,18 +827,73 @@ class AssignmentOrganizer:
             for folder in non_group_folders:
                 print(f"  - {folder.name}")
         
-        # Process each group folder
-        for group_folder in group_folders:
-            self.extract_group_zips(group_folder)
+        # Extract and organize each group folder
+        errors = self.prepare_groups(group_folders, course_path, jobs)
         
-        print(f"\n✅ Extraction complete! Processed {len(group_folders)} groups.")
+        print(f"\n✅ Extraction and organization complete! Processed {len(group_folders)} groups.")
         print(f"Files extracted to: {course_dir}")
-        
-        # Now organize the extracted files
-        self.organize_all_groups(course_path)
+        print(f"Organized files are in: {course_path / 'organized_assignments'}")
+        if errors:
+            print(f"⚠️  {len(errors)} groups failed and should be checked: {sorted(errors)}")
         print("Each group folder now contains all extracted files from any zip files that were inside.")
     
-    def convert_presentation_to_pdf(self, presentation_path: Path, output_dir: Path, group_name: str) -> Path:
+    def prepare_groups(self, group_folders: List[Path], course_dir: Path, jobs: int = 1,
+                       extract: bool = True) -> Dict[str, str]:
+        """Extract and organize group folders, several at a time in worker processes when jobs > 1.
+
+        Groups are independent of each other, so with jobs > 1 each group's extraction,
+        categorizing, copying and presentation conversion runs in its own process.
+
+        Returns:
+            Dict[str, str]: Error message for each group that failed
+        """
+        errors = {}
+        total = len(group_folders)
+        # Presentations of every group are converted together at the end, so
+        # LibreOffice starts a few times per cohort instead of once per file
+        presentations = []
+        
+        if jobs <= 1 or total <= 1:
+            self.deferred_presentations = presentations
+            try:
+                for group_folder in group_folders:
+                    try:
+                        if extract:
+                            self.extract_group_zips(group_folder)
+                        self.organize_group_folder(group_folder, course_dir)
+                    except Exception as e:
+                        print(f"Error organizing group {group_folder.name}: {e}")
+                        errors[group_folder.name] = str(e)
+            finally:
+                self.deferred_presentations = None
+        else:
+            workers = min(jobs, total)
+            print(f"\n🚀 Preparing {total} groups with {workers} worker processes...")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(prepare_group, str(self.base_path), str(group_folder), str(course_dir), extract,
+                                    self.placement): group_folder.name
+                    for group_folder in group_folders
+                }
+                for finished, future in enumerate(as_completed(futures), 1):
+                    group_name = futures[future]
+                    try:
+                        presentations.extend(future.result())
+                        print(f"[{finished}/{total}] ✓ Finished {group_name}")
+                    except Exception as e:
+                        print(f"[{finished}/{total}] ❌ Error organizing group {group_name}: {e}")
+                        errors[group_name] = str(e)
+        
+        if presentations:
+            print(f"\n🔄 Converting {len(presentations)} presentations from {total} groups to PDF...")
+            try:
+                self.convert_presentations(presentations)
+            finally:
+                self.converter.close()
+        return errors
+    
+    def convert_presentation_to_pdf(self, presentation_path: Path, output_dir: Path, group_name: str,
+                                    converted: Optional[Dict[Path, Optional[Path]]] = None) -> Path:
         """
         Convert presentation files to PDF format.
         
@@ -485,6 +901,7 @@ class AssignmentOrganizer:
             presentation_path (Path): Path to the presentation file
             output_dir (Path): Directory to save the converted PDF
             group_name (str): Group name for file naming
+            converted (dict): Results of an earlier PresentationConverter batch; converted now if not given
             
         Returns:
             Path: Path to the converted PDF file, or original file path if conversion fails
@@ -502,9 +919,14 @@ class AssignmentOrganizer:
             # Try different conversion methods based on the system
             success = False
             
-            # Method 1: Try LibreOffice (cross-platform)
-            if not success:
-                success = self._convert_with_libreoffice(presentation_path, output_dir, pdf_output_path)
+            # Method 1: Try LibreOffice (cross-platform), through the batching and caching converter
+            if converted is None:
+                converted = self.converter.convert([presentation_path])
+            libreoffice_pdf = converted.get(presentation_path)
+            if libreoffice_pdf is not None:
+                # Never hardlinked: the cached PDF is shared by every group that submitted the same deck
+                self.place_file(libreoffice_pdf, pdf_output_path, "copy" if self.placement == "copy" else "reflink")
+                success = True
             
             # Method 2: Try using Python-pptx for basic conversion (fallback)
             if not success and file_ext in ['.pptx', '.ppt']:
@@ -521,7 +943,7 @@ class AssignmentOrganizer:
                 print(f"    ⚠ Could not convert {presentation_path.name} to PDF, copying original file")
                 # Copy original file to documents folder with group prefix
                 original_copy = output_dir / f"{group_name}-{presentation_path.name}"
-                shutil.copy2(presentation_path, original_copy)
+                self.place_file(presentation_path, original_copy)
                 return original_copy
                 
         except Exception as e:
@@ -529,54 +951,12 @@ class AssignmentOrganizer:
             # Copy original file as fallback
             try:
                 original_copy = output_dir / f"{group_name}-{presentation_path.name}"
-                shutil.copy2(presentation_path, original_copy)
+                self.place_file(presentation_path, original_copy)
                 return original_copy
             except Exception as copy_error:
                 print(f"    ⚠ Error copying original file: {copy_error}")
                 return presentation_path
     
-    def _convert_with_libreoffice(self, input_path: Path, output_dir: Path, pdf_path: Path) -> bool:
-        """Try to convert using LibreOffice headless mode."""
-        try:
-            # Check if LibreOffice is available (try both commands)
-            soffice_cmd = None
-            for cmd in ['soffice', 'libreoffice']:
-                try:
-                    result = subprocess.run([cmd, '--version'], 
-                                          capture_output=True, text=True, timeout=10)
-                    if result.returncode == 0:
-                        soffice_cmd = cmd
-                        break
-                except FileNotFoundError:
-                    continue
-            
-            if not soffice_cmd:
-                return False
-            
-            # Convert using LibreOffice
-            cmd = [
-                soffice_cmd,
-                '--headless',
-                '--convert-to', 'pdf',
-                '--outdir', str(output_dir),
-                str(input_path)
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                # LibreOffice creates PDF with same name as input file
-                default_pdf = output_dir / f"{input_path.stem}.pdf"
-                if default_pdf.exists():
-                    # Rename to our desired filename
-                    default_pdf.rename(pdf_path)
-                    return True
-            
-            return False
-            
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError, FileNotFoundError):
-            return False
-    
     def _convert_with_python_libs(self, input_path: Path, pdf_path: Path) -> bool:
         """Try to convert using Python libraries (basic conversion)."""
         try:
@@ -667,33 +1047,31 @@ class AssignmentOrganizer:
         except (subprocess.TimeoutExpired, subprocess.SubprocessError):
             return False
     
-    def detect_project_type(self, group_folder: Path) -> str:
+    def detect_project_type(self, group_folder: Path, index: Optional[DirectoryIndex] = None) -> str:
         """Detect the type of project based on files and folders."""
+        index = index or DirectoryIndex(group_folder)
+        
         # Check for Unity project
-        if list(group_folder.rglob("*.unity")) or list(group_folder.rglob("Assets")):
+        if index.with_suffix(".unity") or index.has_name("Assets"):
             return "Unity Project"
         
         # Check for AR/VR project indicators
         ar_indicators = ["ar", "vr", "xr", "augmented", "virtual", "mixed reality"]
-        for item in group_folder.rglob("*"):
-            if any(indicator in item.name.lower() for indicator in ar_indicators):
+        for name in index.names:
+            if any(indicator in name.lower() for indicator in ar_indicators):
                 return "AR/VR Project"
         
         # Check for web project
-        if (list(group_folder.rglob("*.html")) or 
-            list(group_folder.rglob("package.json")) or
-            list(group_folder.rglob("index.js"))):
+        if index.with_suffix(".html") or index.has_name("package.json", "index.js"):
             return "Web Project"
         
         # Check for mobile project
-        if (list(group_folder.rglob("*.xcodeproj")) or 
-            list(group_folder.rglob("*.apk")) or
-            list(group_folder.rglob("AndroidManifest.xml"))):
+        if index.with_suffix(".xcodeproj", ".apk") or index.has_name("AndroidManifest.xml"):
             return "Mobile Project"
         
         # Check for source code project
         source_code_exts = {'.cs', '.py', '.js', '.ts', '.cpp', '.c', '.java', '.swift'}
-        if any(list(group_folder.rglob(f"*{ext}")) for ext in source_code_exts):
+        if index.with_suffix(*source_code_exts):
             return "Source Code Project"
         
         return "Document Project"
@@ -750,16 +1128,19 @@ class AssignmentOrganizer:
         if files_removed > 0:
             print(f"  ✓ Cleaned {files_removed} unnecessary files from organized folder")
 
-    def copy_source_code_selectively(self, source_folder: Path, dest_folder: Path, group_name: str) -> None:
+    def copy_source_code_selectively(self, source_folder: Path, dest_folder: Path, group_name: str,
+                                     index: Optional[DirectoryIndex] = None) -> None:
         """Copy only assessment-useful source code files, excluding Unity metadata."""
         if not source_folder.exists():
             return
+        index = index or DirectoryIndex(source_folder)
             
         copied_files = 0
         skipped_files = 0
         
-        for file_path in source_folder.rglob("*"):
-            if file_path.is_file() and self.is_source_code_file(file_path):
+        for entry in index.walk(source_folder):
+            file_path = entry.path
+            if not entry.is_dir and self.is_source_code_file(file_path):
                 # Calculate relative path from source folder
                 relative_path = file_path.relative_to(source_folder)
                 dest_file_path = dest_folder / relative_path
@@ -768,16 +1149,16 @@ class AssignmentOrganizer:
                 dest_file_path.parent.mkdir(parents=True, exist_ok=True)
                 
                 try:
-                    shutil.copy2(file_path, dest_file_path)
+                    self.place_file(file_path, dest_file_path)
                     copied_files += 1
                 except Exception as e:
                     print(f"  Warning: Could not copy {file_path.name}: {e}")
-            elif file_path.is_file():
+            elif not entry.is_dir:
                 skipped_files += 1
                 
         print(f"  ✓ Copied {copied_files} source files, skipped {skipped_files} unnecessary files")
     
-    def organize_all_groups(self, course_dir: Path) -> None:
+    def organize_all_groups(self, course_dir: Path, jobs: int = 1) -> None:
         """Organize all group folders found in the course directory."""
         print(f"\n🗂 Now organizing groups in: {course_dir}")
         
@@ -790,14 +1171,11 @@ class AssignmentOrganizer:
         print(f"Found {len(group_folders)} groups to organize: {[f.name for f in group_folders]}")
         
         # Organize each group
-        for group_folder in group_folders:
-            try:
-                self.organize_group_folder(group_folder, course_dir)
-            except Exception as e:
-                print(f"Error organizing group {group_folder.name}: {e}")
-                continue
+        errors = self.prepare_groups(group_folders, course_dir, jobs, extract=False)
         
-        print(f"\n✅ Organization complete! Organized {len(group_folders)} groups.")
+        print(f"\n✅ Organization complete! Organized {len(group_folders) - len(errors)} groups.")
+        if errors:
+            print(f"⚠️  {len(errors)} groups failed: {sorted(errors)}")
         print(f"Organized files are in: {course_dir / 'organized_assignments'}")
 
 # CONFIGURATION - Edit this path to point to your zip file
@@ -903,8 +1281,24 @@ def find_group_folders_directory(extracted_dir: str) -> str:
     print(f"Using course directory: {result}")
     return result
 
+def parse_args(argv=None):
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Extract and organize a course's group submissions")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Groups extracted and organized at the same time, each in its own process (default: 1)")
+    parser.add_argument("--converters", type=int, default=DEFAULT_CONVERTERS,
+                        help=f"LibreOffice instances converting presentations at the same time (default: {DEFAULT_CONVERTERS})")
+    parser.add_argument("--placement", choices=PLACEMENT_MODES, default="auto",
+                        help="How organized files are made: reflink (copy-on-write clone), hardlink or copy; "
+                             "'auto' tries a reflink, then a copy (default: auto). Hardlinked files share their "
+                             "data with the extracted originals: editing one changes the other")
+    return parser.parse_args(argv)
+
+
 def main():
     """Run the assignment organizer on the specified zip file."""
+    args = parse_args()
+    
     # Get the current directory
     current_dir = os.getcwd()
     print(f"Working directory: {current_dir}")
@@ -916,8 +1310,8 @@ def main():
         return
     
     # Create organizer and process the zip file
-    organizer = AssignmentOrganizer(current_dir)
-    organizer.process_course_zip(ZIP_FILE_PATH)
+    organizer = AssignmentOrganizer(current_dir, placement=args.placement, converters=args.converters)
+    organizer.process_course_zip(ZIP_FILE_PATH, args.jobs)
     
     # After extraction, find the extracted folder and organize groups
     zip_name = os.path.splitext(os.path.basename(ZIP_FILE_PATH))[0]  # Get just the filename without path
@@ -936,16 +1330,11 @@ def main():
         
         print(f"Found {len(group_folders)} groups to organize: {group_folders}")
         
-        # Extract and organize each group
-        from pathlib import Path
-        for group_name in group_folders:
-            group_path = Path(course_dir) / group_name
-            
-            # First extract any zip files in the group folder
-            organizer.extract_group_zips(group_path)
-            
-            # Now organize the extracted files - organized folders will be created in course_dir
-            organizer.organize_group_folder(group_path, Path(course_dir))
+        # Extract any zip files in each group folder, then organize it - organized folders
+        # will be created in course_dir
+        errors = organizer.prepare_groups([Path(course_dir) / name for name in group_folders], Path(course_dir), args.jobs)
+        if errors:
+            print(f"⚠️  {len(errors)} groups failed and should be checked: {sorted(errors)}")
     else:
         print(f"Warning: Extracted directory not found at {extracted_dir}")
     
@@ -974,7 +1363,7 @@ def main():
     print("\n🗜️ RECURSIVE ZIP EXTRACTION:")
     print("     - All zip files extracted recursively until no more zip files found")
     print("     - Handles nested zip files (zip files inside zip files)")
-    print("     - Up to 10 extraction iterations to ensure complete extraction")
+    print(f"     - Nested zip files extracted depth-first, up to {MAX_ZIP_DEPTH} levels deep")
     print("\nAll files have been renamed with group prefixes!")
     print("Original extracted files are preserved in the course folder.")
     print("Organized files are in 'organized_assignments/' directory with separate folders for each group.")
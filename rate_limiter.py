@@ -0,0 +1,146 @@
+"""
+Token-bucket rate limiting for Gemini API calls.
+
+Every grader used to sleep for a fixed time around each request. The limiter
+below instead tracks the request and token quota per minute and only blocks
+when the next request would actually exceed it, so calls go out as fast as
+the quota allows.
+
+Limits are read from the environment (GEMINI_RPM, GEMINI_TPM) and can be
+overridden with configure_rate_limiter(), e.g. from command-line options.
+"""
+
+import os
+import threading
+import time
+
+
+# Default quota for the Gemini Flash models on the free tier
+DEFAULT_REQUESTS_PER_MINUTE = 10
+DEFAULT_TOKENS_PER_MINUTE = 250000
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills continuously up to `capacity`.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Blocks until `amount` tokens are available and takes them.
+
+        Requests larger than the bucket are clamped to its capacity so they
+        wait for a full bucket instead of blocking forever.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait_time = (amount - self.tokens) / self.refill_per_second
+
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def charge(self, amount: float):
+        """
+        Takes tokens without waiting. The bucket may go negative, which makes
+        later acquire() calls wait until the debt is repaid.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Combines a requests-per-minute bucket and a tokens-per-minute bucket.
+    A limit of None or 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60.0) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens: int = 0) -> float:
+        """
+        Waits until one more request of roughly `estimated_tokens` input tokens fits the quota.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        if self.request_bucket:
+            waited += self.request_bucket.acquire(1)
+        if self.token_bucket and estimated_tokens:
+            waited += self.token_bucket.acquire(estimated_tokens)
+        if waited >= 1:
+            print(f"⏳ Rate limiter waited {waited:.1f}s for API quota")
+        return waited
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Charges the difference when a response reports more tokens than were estimated.
+        """
+        if self.token_bucket and actual_tokens and actual_tokens > estimated_tokens:
+            self.token_bucket.charge(actual_tokens - estimated_tokens)
+
+
+def response_token_count(response) -> int:
+    """
+    Returns the total token count reported by a generate_content response, or 0 if unavailable.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or 0
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def configure_rate_limiter(requests_per_minute: float = None, tokens_per_minute: float = None) -> RateLimiter:
+    """
+    Replaces the shared limiter. Missing values fall back to the environment
+    and then to the defaults; pass 0 to disable a limit.
+    """
+    global _limiter
+
+    if requests_per_minute is None:
+        requests_per_minute = float(os.environ.get("GEMINI_RPM", DEFAULT_REQUESTS_PER_MINUTE))
+    if tokens_per_minute is None:
+        tokens_per_minute = float(os.environ.get("GEMINI_TPM", DEFAULT_TOKENS_PER_MINUTE))
+
+    with _limiter_lock:
+        _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    return _limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the limiter shared by all API calls in this process.
+    """
+    if _limiter is None:
+        configure_rate_limiter()
+    return _limiter
@@ -0,0 +1,195 @@
+"""
+Content-addressed on-disk cache for Gemini grading responses.
+
+A response is stored under a hash of everything that determines it: the
+model name, the prompt text, the bytes of every attached file and the
+generation config. Re-grading an unchanged submission is then answered from
+disk without spending any quota. The cache is bounded in size and evicts the
+least recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from batch_engine import write_json_atomic
+
+
+DEFAULT_CACHE_DIR = ".response_cache"
+DEFAULT_MAX_CACHE_MB = 200
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the SHA-256 of a file's bytes, read in chunks.
+
+    Digests are remembered per (path, size, mtime) so files attached to
+    several requests in one run are only read once.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        if memo_key in _digest_memo:
+            return _digest_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of response texts, one JSON file per entry.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_MB * 1024 * 1024,
+                 enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = self._current_size() if enabled else 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _entries(self) -> list:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith('.json') and not entry.name.startswith('.tmp_')]
+
+    def _current_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def make_key(self, model: str, prompt: str, files=None, config: dict = None) -> str:
+        """
+        Builds the cache key for a request.
+
+        Args:
+            model (str): Model name
+            prompt (str): Prompt text
+            files (list): Attached file paths; their contents (not names) are hashed
+            config (dict): Generation config, if any
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        file_hashes = []
+        for file_path in files or []:
+            data = getattr(file_path, 'data', None)
+            if data is not None:
+                # Frame encoded in memory: hash its bytes without reading the file back
+                file_hashes.append([os.path.splitext(file_path)[1].lower(), hashlib.sha256(data).hexdigest()])
+            elif os.path.exists(file_path):
+                file_hashes.append([os.path.splitext(file_path)[1].lower(), file_digest(file_path)])
+            else:
+                file_hashes.append([file_path, None])
+
+        payload = json.dumps([model, prompt, file_hashes, config], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached response text for `key`, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return entry.get("text")
+
+    def put(self, key: str, text: str, model: str = None):
+        """
+        Stores a response text and evicts old entries if the cache is over its size limit.
+        """
+        if not self.enabled or text is None:
+            return
+
+        path = self._entry_path(key)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        write_json_atomic(path, {"model": model, "cached_at": datetime.now().isoformat(), "text": text})
+
+        with self.lock:
+            self.total_bytes += os.path.getsize(path) - previous_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Oldest access time first; stop once the cache is back under 90% of its limit
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        total = sum(entry.stat().st_size for entry in entries)
+        removed = 0
+
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+
+        self.total_bytes = total
+        if removed:
+            print(f"🧹 Response cache: evicted {removed} least recently used entries")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def configure_response_cache(cache_dir: str = None, max_mb: float = None, enabled: bool = True) -> ResponseCache:
+    """
+    Replaces the shared response cache. The size limit falls back to the
+    GEMINI_CACHE_MAX_MB environment variable and then to the default.
+    """
+    global _cache
+
+    if cache_dir is None:
+        cache_dir = DEFAULT_CACHE_DIR
+    if max_mb is None:
+        max_mb = float(os.environ.get("GEMINI_CACHE_MAX_MB", DEFAULT_MAX_CACHE_MB))
+
+    with _cache_lock:
+        _cache = ResponseCache(cache_dir, int(max_mb * 1024 * 1024), enabled)
+    return _cache
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the response cache shared by all API calls in this process.
+    """
+    if _cache is None:
+        configure_response_cache()
+    return _cache
@@ -0,0 +1,142 @@
+"""
+Append-only JSONL log for results that arrive one at a time.
+
+Rewriting a whole JSON array after every result costs O(n) per result and
+O(n²) over a run, and a crash halfway through a rewrite loses every earlier
+result. A results log instead appends one JSON line per result, so each
+update costs the same whatever the cohort size. Lines are flushed at once
+and fsynced in batches (every few records or seconds), which bounds what a
+power cut can lose without paying for a disk sync per result. At the end of
+the run `compact_results_log` turns the log into the usual JSON array.
+
+A log left behind by a crashed run is still readable: only a partially
+written last line can be lost, and `read_results_log` skips it.
+"""
+
+import json
+import os
+import threading
+import time
+
+from batch_engine import write_json_atomic
+
+
+DEFAULT_SYNC_EVERY = 10        # records appended between fsyncs
+DEFAULT_SYNC_SECONDS = 5.0     # longest time an appended record waits for an fsync
+
+
+class ResultsLog:
+    """
+    Append-only JSONL file of result records. The file is created on the first append.
+    """
+
+    def __init__(self, path: str, sync_every: int = DEFAULT_SYNC_EVERY,
+                 sync_seconds: float = DEFAULT_SYNC_SECONDS):
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.sync_seconds = sync_seconds
+        self.lock = threading.Lock()
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.records = 0
+
+    def append(self, record: dict):
+        """
+        Writes one record as a JSON line and fsyncs once enough records have built up.
+        """
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(line)
+            self.file.flush()
+            self.records += 1
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_seconds:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def sync(self):
+        """
+        Forces every appended record to disk.
+        """
+        with self.lock:
+            if self.file is not None and self.unsynced:
+                self._sync()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                if self.unsynced:
+                    self._sync()
+                self.file.close()
+                self.file = None
+
+
+def read_results_log(path: str) -> list:
+    """
+    Reads the records of a results log, skipping a truncated or corrupt line.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"⚠️ Skipping unreadable line {number} of {os.path.basename(path)}")
+    return records
+
+
+def compact_results_log(log_path: str, json_path: str, key: str = None, remove_log: bool = True) -> int:
+    """
+    Writes the records of a results log to a JSON array file.
+
+    Args:
+        log_path (str): The JSONL results log
+        json_path (str): Destination JSON file (written atomically)
+        key (str): If given, only the last record for each value of this field is
+                   kept (a rerun replaces the earlier result), in first-seen order
+        remove_log (bool): Delete the log once the JSON file is written
+
+    Returns:
+        int: Number of records written
+    """
+    records = read_results_log(log_path) if os.path.exists(log_path) else []
+    if key:
+        latest = {}
+        for record in records:
+            latest[record.get(key)] = record
+        records = list(latest.values())
+
+    write_json_atomic(json_path, records)
+    if remove_log and os.path.exists(log_path):
+        os.remove(log_path)
+    return len(records)
+
+
+def recover_results_logs(folder: str, key: str = None) -> list:
+    """
+    Compacts logs left behind by runs that stopped before their final compaction.
+
+    Returns:
+        list: Paths of the JSON files written
+    """
+    recovered = []
+    if not os.path.isdir(folder):
+        return recovered
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.jsonl'):
+            log_path = os.path.join(folder, name)
+            json_path = log_path[:-len('.jsonl')] + '.json'
+            count = compact_results_log(log_path, json_path, key)
+            print(f"♻️ Recovered {count} results from an interrupted run into {os.path.basename(json_path)}")
+            recovered.append(json_path)
+    return recovered
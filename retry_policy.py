@@ -0,0 +1,279 @@
+"""
+Retry and requeue handling for Gemini API calls.
+
+Transient API failures (429 RESOURCE_EXHAUSTED, 5xx, timeouts) are retried
+with exponential backoff plus jitter, honouring any retry-after hint the API
+sends back. If a call still fails once the retries are used up, the grading
+component it belonged to is recorded on a persistent requeue list instead of
+being saved as a zero score, so the next run only repeats that component.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from batch_engine import write_json_atomic
+from job_ledger import FAILED, PENDING_COMMENT, RETRYABLE, get_job_ledger
+
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 2.0    # seconds before the first retry
+DEFAULT_MAX_DELAY = 60.0    # cap for the exponential backoff
+
+REQUEUE_FILENAME = "requeue.json"
+
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+TRANSIENT_STATUS_NAMES = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL")
+
+# Errors without a status code are matched on the status their message starts with, e.g. "503 UNAVAILABLE. {...}"
+_STATUS_PREFIX_PATTERN = re.compile(r"^\s*(?:(\d{3})\b|([A-Z_]+)\b)")
+
+_RETRY_AFTER_PATTERNS = (
+    re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s"),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+)
+
+
+class RetryExhaustedError(Exception):
+    """
+    Raised when a transient API error persists after every retry attempt.
+    """
+
+    def __init__(self, message: str, last_error: Exception = None):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Returns True for errors worth retrying: quota exhaustion, server errors and timeouts.
+
+    The HTTP status code of the error decides when it has one. Otherwise only a
+    status at the start of the message counts, so a "503" or "429" inside a file
+    name or a token count does not make an unrelated error retryable.
+    """
+    for code in (getattr(error, "code", None), getattr(error, "status_code", None),
+                 getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(code, int) and not isinstance(code, bool):
+            return code in TRANSIENT_STATUS_CODES
+
+    message = str(error)
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__ or "timed out" in message:
+        return True
+
+    match = _STATUS_PREFIX_PATTERN.match(message)
+    if match is None:
+        return False
+    number, name = match.groups()
+    return int(number) in TRANSIENT_STATUS_CODES if number else name in TRANSIENT_STATUS_NAMES
+
+
+def retry_after_seconds(error: Exception):
+    """
+    Extracts the server's retry hint from an API error, if it sent one.
+
+    Checks a Retry-After response header first, then the retryDelay field
+    Gemini includes in RESOURCE_EXHAUSTED error details.
+
+    Returns:
+        float or None: Seconds to wait before retrying
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        try:
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+
+    message = str(error)
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY) -> float:
+    """
+    Exponential backoff with jitter for the given retry attempt (0-based).
+
+    Half of the delay is fixed and half is random, so concurrent workers that
+    hit the quota together do not all retry at the same moment.
+    """
+    ceiling = min(max_delay, base_delay * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def call_with_retry(fn, max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                    max_delay: float = DEFAULT_MAX_DELAY, description: str = "API call"):
+    """
+    Calls `fn` and retries it on transient API errors.
+
+    Args:
+        fn: Callable taking no arguments
+        max_attempts (int): Total number of attempts, including the first
+        base_delay (float): Backoff before the first retry, doubled each time
+        max_delay (float): Upper bound for the backoff (a longer retry-after hint is still honoured)
+        description (str): Name used in progress messages
+
+    Returns:
+        The return value of `fn`
+
+    Raises:
+        RetryExhaustedError: If every attempt failed with a transient error.
+        Non-transient errors are re-raised immediately.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if not is_transient_error(e):
+                raise
+            if attempt == max_attempts - 1:
+                raise RetryExhaustedError(f"{description} failed after {max_attempts} attempts: {e}", e) from e
+
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            hint = retry_after_seconds(e)
+            if hint is not None:
+                delay = max(delay, hint)
+
+            print(f"⚠️  {description} failed with a transient error ({str(e)[:80]}). "
+                  f"Retrying in {delay:.1f}s (attempt {attempt + 2}/{max_attempts})...")
+            time.sleep(delay)
+
+
+class RequeueList:
+    """
+    Persistent list of (group, component) pairs whose API calls failed after
+    every retry. Safe to share between concurrent grading workers.
+    """
+
+    def __init__(self, results_dir: str):
+        self.path = os.path.join(results_dir, REQUEUE_FILENAME)
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, list) else []
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  Could not read requeue list {self.path}: {e}")
+            return []
+
+    def _save(self):
+        write_json_atomic(self.path, self.entries)
+
+    def add(self, group_name: str, component: str, error: str):
+        """
+        Queues a component for the next run, counting repeated failures.
+        """
+        with self.lock:
+            for entry in self.entries:
+                if entry["group_name"] == group_name and entry["component"] == component:
+                    entry["attempts"] = entry.get("attempts", 1) + 1
+                    entry["error"] = error
+                    entry["queued_at"] = datetime.now().isoformat()
+                    break
+            else:
+                self.entries.append({
+                    "group_name": group_name,
+                    "component": component,
+                    "error": error,
+                    "attempts": 1,
+                    "queued_at": datetime.now().isoformat()
+                })
+            self._save()
+        print(f"🔁 Queued {group_name} / {component} for retry on the next run")
+
+    def remove(self, group_name: str, component: str):
+        """
+        Drops a component from the list once it has been graded.
+        """
+        with self.lock:
+            remaining = [entry for entry in self.entries
+                         if not (entry["group_name"] == group_name and entry["component"] == component)]
+            if len(remaining) != len(self.entries):
+                self.entries = remaining
+                self._save()
+
+    def components_for(self, group_name: str) -> list:
+        """
+        Returns the queued components of one group.
+        """
+        with self.lock:
+            return [entry["component"] for entry in self.entries if entry["group_name"] == group_name]
+
+    def groups(self) -> list:
+        """
+        Returns the names of groups with at least one queued component, in queue order.
+        """
+        with self.lock:
+            names = []
+            for entry in self.entries:
+                if entry["group_name"] not in names:
+                    names.append(entry["group_name"])
+            return names
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def run_component(requeue: RequeueList, group_name: str, component: str, assess_fn, placeholder,
+                  previous_results: dict = None):
+    """
+    Grades one component of a group, reusing a saved result when possible.
+
+    When `previous_results` holds this component and it is not queued for
+    retry, the saved result is returned without calling the API. Otherwise
+    `assess_fn` is called; if its API calls keep failing, the component is
+    queued and `placeholder` is returned in its place. When a job ledger is
+    configured, every attempt and its outcome is recorded there.
+
+    Args:
+        requeue (RequeueList): The persistent requeue list
+        group_name (str): Name of the group being graded
+        component (str): Results key of the component (e.g. 'video_assessment')
+        assess_fn: Callable taking no arguments that grades the component
+        placeholder: Result stored while the component waits for a retry
+        previous_results (dict): Previously saved results for the group, if any
+
+    Returns:
+        tuple: (result, pending) where `pending` is True if the component was queued
+    """
+    ledger = get_job_ledger()
+    if previous_results and component in previous_results and component not in requeue.components_for(group_name):
+        print(f"♻️  Reusing saved {component} for {group_name}")
+        if ledger is not None and ledger.status(group_name, component) is None:
+            ledger.record_result(group_name, component, previous_results[component])
+        return previous_results[component], False
+
+    if ledger is not None:
+        ledger.start(group_name, component)
+    start = time.perf_counter()
+    try:
+        result = assess_fn()
+    except RetryExhaustedError as e:
+        requeue.add(group_name, component, str(e))
+        if ledger is not None:
+            ledger.set_status(group_name, component, RETRYABLE, str(e), time.perf_counter() - start)
+        return placeholder, True
+    except BaseException as e:
+        if ledger is not None:
+            ledger.set_status(group_name, component, FAILED, str(e) or type(e).__name__, time.perf_counter() - start)
+        raise
+
+    requeue.remove(group_name, component)
+    if ledger is not None:
+        ledger.record_result(group_name, component, result, time.perf_counter() - start)
+    return result, False
@@ -0,0 +1,56 @@
+"""
+Resume planning for groups whose saved results hold placeholder scores instead of grades.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import job_ledger
+from job_ledger import PENDING_COMMENT, configure_job_ledger, failed_components, plan_group
+
+
+QUOTA_COMMENT = "API quota exceeded - partial grading completed"
+
+
+def saved_results(coding_comment: str) -> dict:
+    return {
+        "group_name": "GC4_1",
+        "total_score": 66.1,
+        "video_assessment": {"score": 24.6, "comment": "Clear demonstration of the AR navigation system."},
+        "coding_assessment": {"score": 0, "comment": coding_comment},
+        "component_assessments": [{"component": "XR/Game App Overview", "score": 7.6, "comment": "Well explained."}],
+    }
+
+
+@pytest.fixture
+def results_dir(tmp_path):
+    yield str(tmp_path)
+    if job_ledger._ledger is not None:
+        job_ledger._ledger.close()
+        job_ledger._ledger = None
+
+
+@pytest.mark.parametrize("comment", [QUOTA_COMMENT, PENDING_COMMENT])
+@pytest.mark.parametrize("with_ledger", [False, True])
+def test_placeholder_component_is_queued_for_regrading(results_dir, comment, with_ledger):
+    results_file = os.path.join(results_dir, "GC4_1_grading_results.json")
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump(saved_results(comment), f)
+    if with_ledger:
+        configure_job_ledger(results_dir)
+
+    action, previous, redo = plan_group("GC4_1", results_file)
+
+    assert action == "resume"
+    assert redo == ["coding_assessment"]
+    assert "coding_assessment" not in previous
+    assert previous["video_assessment"]["score"] == 24.6
+
+
+def test_real_grades_are_not_failures():
+    assert failed_components(saved_results("Well structured scripts with clear separation of concerns.")) == []
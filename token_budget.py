@@ -0,0 +1,310 @@
+"""
+Token estimation and request packing for Gemini API calls.
+
+The graders used to find out a request was too large only when the API
+rejected it, after a full round trip and a quota-related wait. The helpers
+below size text and image parts before sending and fit a request's
+attachments into a per-call token budget, filling it in priority order
+(documents, then video frames, then code) and printing a size report.
+"""
+
+import base64
+import math
+import os
+import struct
+import threading
+
+
+# Input context of the Gemini Flash models
+MODEL_CONTEXT_TOKENS = 1048576
+DEFAULT_REQUEST_TOKEN_BUDGET = 200000
+
+# Roughly four characters of English or code per token; other scripts cost about one token per character
+CHARS_PER_TOKEN = 4
+
+# Gemini bills an image up to 384 px on both sides as 258 tokens and
+# larger images as 258 tokens per 768x768 tile
+IMAGE_TOKEN_ESTIMATE = 258
+IMAGE_SMALL_EDGE = 384
+IMAGE_TILE_EDGE = 768
+
+# Attachment categories, highest priority first
+PRIORITY_ORDER = ("document", "frame", "code")
+
+# A text part is shortened rather than dropped only if this much of it still fits
+MIN_TRUNCATED_TOKENS = 500
+TRUNCATION_NOTE = "\n... [truncated to fit the request token budget] ..."
+
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    Estimates the tokens of a text string.
+    """
+    if not text:
+        return 0
+    non_ascii = len(text) - len(text.encode('ascii', errors='ignore'))
+    return (len(text) - non_ascii) // CHARS_PER_TOKEN + non_ascii + 1
+
+
+def image_dimensions(data: bytes):
+    """
+    Reads the width and height from PNG, GIF, JPEG or WebP image bytes.
+
+    Returns:
+        tuple or None: (width, height), or None if the format is not recognised
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3fff, height & 0x3fff
+        if chunk == b'VP8L':
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+    if data[:2] == b'\xff\xd8':
+        # Walk the JPEG segments up to the start-of-frame marker
+        offset = 2
+        while offset + 9 < len(data):
+            if data[offset] != 0xff:
+                offset += 1
+                continue
+            marker = data[offset + 1]
+            if marker in (0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf):
+                height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+                return width, height
+            if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+                offset += 2
+                continue
+            offset += 2 + struct.unpack('>H', data[offset + 2:offset + 4])[0]
+    return None
+
+
+def estimate_image_tokens(data: bytes) -> int:
+    """
+    Estimates the tokens of an inline image from its dimensions.
+    """
+    size = image_dimensions(data) if data else None
+    if size is None:
+        return IMAGE_TOKEN_ESTIMATE
+    width, height = size
+    if width <= IMAGE_SMALL_EDGE and height <= IMAGE_SMALL_EDGE:
+        return IMAGE_TOKEN_ESTIMATE
+    return math.ceil(width / IMAGE_TILE_EDGE) * math.ceil(height / IMAGE_TILE_EDGE) * IMAGE_TOKEN_ESTIMATE
+
+
+def estimate_part_tokens(part) -> int:
+    """
+    Estimates the tokens of one request part.
+
+    Args:
+        part: A string, a dict with base64 image 'data' under 'source', or a google.genai Part
+
+    Returns:
+        int: Estimated token count
+    """
+    if isinstance(part, str):
+        return estimate_text_tokens(part)
+    if isinstance(part, dict):
+        if part.get("type") == "image":
+            # Only the header is needed for the dimensions
+            encoded = part.get("source", {}).get("data", "")
+            try:
+                return estimate_image_tokens(base64.b64decode(encoded[:65536]))
+            except ValueError:
+                return IMAGE_TOKEN_ESTIMATE
+        return estimate_text_tokens(str(part))
+    if getattr(part, "text", None):
+        return estimate_text_tokens(part.text)
+    inline_data = getattr(part, "inline_data", None)
+    if inline_data is not None:
+        return estimate_image_tokens(getattr(inline_data, "data", None))
+    return 0
+
+
+def estimate_parts_tokens(parts) -> int:
+    """
+    Estimates the input tokens of a request.
+
+    Args:
+        parts: A prompt string, or a list of parts accepted by estimate_part_tokens()
+
+    Returns:
+        int: Estimated token count
+    """
+    if isinstance(parts, str):
+        return estimate_text_tokens(parts)
+    return sum(estimate_part_tokens(part) for part in parts or [])
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shortens a text to about `max_tokens`, marking where it was cut.
+    """
+    tokens = estimate_text_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(0, max_tokens - estimate_text_tokens(TRUNCATION_NOTE))
+    return text[:len(text) * keep // tokens] + TRUNCATION_NOTE
+
+
+def fit_texts(texts: list, max_tokens: int) -> list:
+    """
+    Shortens a list of texts to fit `max_tokens` together, cutting the longest ones first.
+
+    Short texts are kept whole and the remaining budget is shared evenly
+    among the long ones.
+    """
+    sizes = [estimate_text_tokens(text) for text in texts]
+    if sum(sizes) <= max_tokens:
+        return list(texts)
+
+    remaining = max_tokens
+    cap = remaining // max(1, len(texts))
+    for count, size in enumerate(sorted(sizes)):
+        share = remaining // (len(texts) - count)
+        if size > share:
+            cap = share
+            break
+        remaining -= size
+    return [truncate_to_tokens(text, cap) for text in texts]
+
+
+_request_budget = None
+_settings_lock = threading.Lock()
+
+
+def configure_token_budget(max_request_tokens: int = None):
+    """
+    Sets the per-request token budget. Falls back to the GEMINI_MAX_REQUEST_TOKENS
+    environment variable and then to the default; capped at the model context.
+    """
+    global _request_budget
+
+    if max_request_tokens is None:
+        max_request_tokens = int(os.environ.get("GEMINI_MAX_REQUEST_TOKENS", DEFAULT_REQUEST_TOKEN_BUDGET))
+    with _settings_lock:
+        _request_budget = min(max_request_tokens, MODEL_CONTEXT_TOKENS) if max_request_tokens > 0 else MODEL_CONTEXT_TOKENS
+
+
+def get_token_budget() -> int:
+    """
+    Returns the per-request token budget.
+    """
+    if _request_budget is None:
+        configure_token_budget()
+    return _request_budget
+
+
+def packing_settings() -> dict:
+    """
+    Returns the settings that decide which parts of a request pack_request keeps,
+    so cached answers are only reused for requests packed the same way.
+    """
+    return {
+        "request_token_budget": get_token_budget(),
+        "priority_order": list(PRIORITY_ORDER),
+        "chars_per_token": CHARS_PER_TOKEN,
+        "min_truncated_tokens": MIN_TRUNCATED_TOKENS,
+    }
+
+
+def _spread(count: int, keep: int) -> list:
+    # Evenly spaced indices, so dropped video frames thin out the whole video
+    if keep >= count:
+        return list(range(count))
+    if keep <= 1:
+        return [0][:keep]
+    return sorted({round(i * (count - 1) / (keep - 1)) for i in range(keep)})
+
+
+def pack_request(prompt_parts, attachments: list, budget: int = None, description: str = "Request size"):
+    """
+    Fits a request's attachments into the per-call token budget.
+
+    The prompt is always sent in full. Attachments are added by category in
+    PRIORITY_ORDER: documents and code that do not fit are shortened (or
+    dropped if only a sliver would remain), and video frames are thinned
+    evenly across the video. A one-line size report is printed.
+
+    Args:
+        prompt_parts: Prompt string or list of parts that must be sent
+        attachments (list): (category, part) or (category, part, estimated tokens) tuples;
+            text parts are plain strings
+        budget (int): Token budget for the whole request (default: configured budget)
+        description (str): Name of the request in the report
+
+    Returns:
+        tuple: (list of attachment parts to send, in their original order, report dict)
+    """
+    if budget is None:
+        budget = get_token_budget()
+
+    prompt_tokens = estimate_parts_tokens(prompt_parts)
+    used = prompt_tokens
+    report = {"description": description, "budget": budget, "prompt_tokens": prompt_tokens, "categories": {}}
+    packed = {}
+
+    categories = list(PRIORITY_ORDER) + sorted({attachment[0] for attachment in attachments} - set(PRIORITY_ORDER))
+    for category in categories:
+        items = [(index, attachment) for index, attachment in enumerate(attachments) if attachment[0] == category]
+        if not items:
+            continue
+        # A third tuple element is a size estimate the caller already has (e.g. for uploaded files)
+        sizes = [attachment[2] if len(attachment) > 2 else estimate_part_tokens(attachment[1]) for _, attachment in items]
+        items = [(index, attachment[1]) for index, attachment in items]
+        stats = {"items": len(items), "tokens": 0, "dropped": 0, "truncated": 0}
+
+        if category == "frame":
+            keep = len(items)
+            while keep and sum(sizes[i] for i in _spread(len(items), keep)) > budget - used:
+                keep -= 1
+            chosen = _spread(len(items), keep)
+            for i in chosen:
+                packed[items[i][0]] = items[i][1]
+                stats["tokens"] += sizes[i]
+            stats["dropped"] = len(items) - len(chosen)
+        else:
+            for (index, part), size in zip(items, sizes):
+                available = budget - used - stats["tokens"]
+                if size <= available:
+                    packed[index] = part
+                    stats["tokens"] += size
+                elif isinstance(part, str) and available >= MIN_TRUNCATED_TOKENS:
+                    packed[index] = truncate_to_tokens(part, available)
+                    stats["tokens"] += estimate_text_tokens(packed[index])
+                    stats["truncated"] += 1
+                else:
+                    stats["dropped"] += 1
+
+        used += stats["tokens"]
+        report["categories"][category] = stats
+
+    report["total_tokens"] = used
+    print_size_report(report)
+    return [packed[index] for index in sorted(packed)], report
+
+
+def print_size_report(report: dict):
+    """
+    Prints the estimated size of a packed request, one line per request.
+    """
+    pieces = [f"prompt {report['prompt_tokens']:,}"]
+    changes = []
+    for category, stats in report["categories"].items():
+        pieces.append(f"{category} {stats['tokens']:,} ({stats['items'] - stats['dropped']}/{stats['items']})")
+        if stats["truncated"]:
+            changes.append(f"{stats['truncated']} {category} truncated")
+        if stats["dropped"]:
+            changes.append(f"{stats['dropped']} {category} dropped")
+
+    line = (f"📏 {report['description']}: ~{report['total_tokens']:,}/{report['budget']:,} tokens "
+            f"[{', '.join(pieces)}]")
+    if changes:
+        line += f" - {', '.join(changes)} to fit the budget"
+    print(line)